@@ -1,23 +1,67 @@
+import time
+
 from flask import Flask
 from app.config import Config
 from flask_migrate import Migrate
 from app.extensions import db, migrate
+from app.cache import response_cache
+from app.flags import flags
+from app.limits import limiter
+from app import fastjson, metrics, replicas
 
 
 def create_app():
     """Application factory."""
+    started = time.perf_counter()
     app = Flask(__name__)
     app.config.from_object(Config)
 
     # init db + migrations
     db.init_app(app)
     migrate.init_app(app, db)
+    flags.init_app(app)
+    replicas.init_app(app)   # no-op without DATABASE_REPLICA_URLS
+    response_cache.init_app(app)
+    limiter.init_app(app)
+    fastjson.init_app(app)
+    metrics.init_app(app)   # after fastjson: wraps the installed JSON provider
 
     # register all blueprints
-    from app.routes import cars_bp, rentals_bp
+    from app.routes import cars_bp, rentals_bp, analytics_bp, ops_bp, reservations_bp, batch_bp
+    from app import auth
     from app.auth import auth_bp
+    auth.init_app(app)
     app.register_blueprint(auth_bp, url_prefix="/auth")
     app.register_blueprint(cars_bp,   url_prefix="/cars")
     app.register_blueprint(rentals_bp, url_prefix="/rentals")
+    app.register_blueprint(analytics_bp, url_prefix="/analytics")
+    app.register_blueprint(reservations_bp, url_prefix="/reservations")
+    app.register_blueprint(ops_bp)
+    app.register_blueprint(batch_bp)
+
+    # opt-in availability index; warms from the database when enabled
+    from app import availability
+    availability.init_app(app)
+
+    # optional in-process outbox dispatcher (normally: flask outbox dispatch)
+    from app import outbox
+    outbox.init_app(app)
+
+    # CLI commands (flask <group> ...)
+    from app.fees import fees_cli
+    from app.fleet import fleet_cli
+    from app.outbox import outbox_cli
+    from app.partitions import partitions_cli
+    from app.plans import plans_cli
+    from app.rollups import rollups_cli
+    from app.seeding import seed_command
+    app.cli.add_command(fees_cli)
+    app.cli.add_command(fleet_cli)
+    app.cli.add_command(outbox_cli)
+    app.cli.add_command(partitions_cli)
+    app.cli.add_command(plans_cli)
+    app.cli.add_command(rollups_cli)
+    app.cli.add_command(seed_command)
 
+    metrics.record_startup("create_app", time.perf_counter() - started)
     return app
@@ -0,0 +1,274 @@
+"""
+Async (ASGI) serving mode.
+
+The read-heavy listing endpoints are served natively on an asyncio event loop
+with SQLAlchemy's asyncio extension over asyncpg, so one process keeps many
+requests in flight while they wait on Postgres. Every other route, including all
+writes, is delegated to the regular Flask app through a WSGI adapter. Each
+write-side invariant (rollups, cache invalidation, ...) therefore has exactly
+one implementation. Paths, auth and JSON bodies are the same as the sync app.
+
+    uvicorn app.asgi:app --workers 2
+
+Needs the optional async requirements (starlette, uvicorn, asyncpg, a2wsgi).
+"""
+import base64
+import contextlib
+import hashlib
+from urllib.parse import urlencode
+
+import sqlalchemy as sa
+from a2wsgi import WSGIMiddleware
+from sqlalchemy.ext.asyncio import create_async_engine
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+from werkzeug.security import check_password_hash
+
+from app import create_app
+from app.auth import TokenUser, verify_token
+from app.cache import ALL_CARS, MemoryBackend, cache_key, merchant_scope, response_cache
+from app.limits import limiter, retry_after
+from app.models import Car, Rental, User
+from app.routes.rentals import user_rental_to_dict
+from app.utils import COUNT_MODES, decode_cursor, encode_cursor
+
+flask_app = create_app()
+config    = flask_app.config
+engine    = create_async_engine(config["ASYNC_DATABASE_URL"], **config["ASYNC_ENGINE_OPTIONS"])
+
+cars, rentals, users = Car.__table__, Rental.__table__, User.__table__
+
+
+def _error(message, status):
+    return JSONResponse({"error": message}, status_code=status)
+
+
+def _limited(name, key, cost=1):
+    """429 Response if limiter's name/key bucket is out of tokens (app.limits), else None."""
+    wait = limiter.wait(name, key, cost)
+    if not wait:
+        return None
+    return JSONResponse({"error": "rate limit exceeded" if cost else "too many attempts"},
+                        status_code=429, headers={"Retry-After": retry_after(wait, name)})
+
+
+async def _authenticate(request, conn):
+    """Same rules as basic_auth_required; returns a TokenUser or an error Response."""
+    client = request.client.host if request.client else None
+    rejected = _limited("ip", client)
+    if rejected is not None:
+        return rejected
+    header = request.headers.get("authorization", "")
+    if header[:7].lower() == "bearer ":
+        user = verify_token(header[7:].strip(),
+                            config["AUTH_TOKEN_SECRETS"], config["AUTH_TOKEN_TTL"])
+        return (_limited("user", user.id) or user) if user else _error("invalid token", 401)
+
+    if header[:6].lower() != "basic ":
+        return _error("missing credentials", 401)
+    try:
+        username, _, password = base64.b64decode(header[6:].strip()).decode().partition(":")
+    except ValueError:
+        return _error("missing credentials", 401)
+    failures = f"{client}:{username}"
+    rejected = _limited("auth_failures", failures, 0)
+    if rejected is not None:
+        return rejected
+    row = (await conn.execute(
+        sa.select(users.c.id, users.c.username, users.c.role, users.c.password)
+        .where(users.c.username == username)
+    )).first()
+    # PBKDF2 is CPU-bound; keep it off the event loop
+    if not row or not await run_in_threadpool(check_password_hash, row.password, password):
+        limiter.wait("auth_failures", failures)
+        return _error("invalid credentials", 401)
+    return _limited("user", row.id) or TokenUser(row.id, row.username, row.role)
+
+
+def _int_arg(args, name, default):
+    try:
+        return int(args.get(name, default))
+    except ValueError:
+        return default
+
+
+async def _paginate(request, conn, stmt, keyset, serializer):
+    """Async twin of app.utils.paginate_query over a Core select."""
+    args     = request.query_params
+    per_page = _int_arg(args, "per_page", 20)
+    if per_page < 1:
+        per_page = 20
+    per_page = min(per_page, config["PAGINATION_MAX_PER_PAGE"])
+
+    cursor_mode = "after" in args
+    count_mode  = args.get("count", "none" if cursor_mode else "exact")
+    if count_mode not in COUNT_MODES:
+        return _error(f"count must be one of {', '.join(COUNT_MODES)}", 400)
+    link_args = {"count": count_mode} if "count" in args else {}
+    # filters such as available=1 carry over into next/prev links, as in paginate_query
+    kept = [(k, v) for k, v in args.multi_items()
+            if k not in ("page", "per_page", "after", "count")]
+
+    def link(**params):
+        return str(request.url.replace(query=urlencode(kept + list({**params, **link_args}.items()))))
+
+    async def total():
+        # cached/estimate are sync-app optimisations; here they fall back to exact
+        if count_mode == "none":
+            return None
+        return (await conn.execute(
+            sa.select(sa.func.count()).select_from(stmt.order_by(None).subquery())
+        )).scalar()
+
+    ordered = stmt.order_by(*keyset)
+    if cursor_mode:
+        after = args.get("after", "")
+        if after:
+            values = decode_cursor(after, keyset)
+            if values is None:
+                return _error("invalid cursor", 400)
+            ordered = ordered.where(sa.tuple_(*keyset) > sa.tuple_(*[
+                sa.literal(v, col.type) for col, v in zip(keyset, values)
+            ]))
+        rows     = (await conn.execute(ordered.limit(per_page + 1))).all()
+        has_next = len(rows) > per_page
+        rows     = rows[:per_page]
+        next_cursor = (
+            encode_cursor([getattr(rows[-1], col.key) for col in keyset]) if has_next else None
+        )
+        return {
+            "items":       [serializer(r) for r in rows],
+            "total":       await total(),
+            "per_page":    per_page,
+            "next_cursor": next_cursor,
+            "next_url":    link(after=next_cursor, per_page=per_page) if has_next else None,
+        }
+
+    page = max(_int_arg(args, "page", 1), 1)
+    rows = (await conn.execute(
+        ordered.limit(per_page + 1).offset((page - 1) * per_page)
+    )).all()
+    has_next = len(rows) > per_page
+    rows     = rows[:per_page]
+    count    = await total()
+    return {
+        "items":    [serializer(r) for r in rows],
+        "total":    count,
+        "pages":    -(-count // per_page) if count is not None else None,
+        "page":     page,
+        "per_page": per_page,
+        "next_url": link(page=page + 1, per_page=per_page) if has_next else None,
+        "prev_url": link(page=page - 1, per_page=per_page) if page > 1 else None,
+    }
+
+
+async def _backend(method, *args):
+    # the memory backend is a dict lookup; anything else may block on the network
+    if isinstance(response_cache.backend, MemoryBackend):
+        return method(*args)
+    return await run_in_threadpool(method, *args)
+
+
+async def _cached(request, endpoint, names, render):
+    """Serve from / fill the same response cache and ETags as cached_response."""
+    backend = response_cache.backend
+    if backend is None:
+        result = await render()
+        return result if isinstance(result, Response) else JSONResponse(result)
+
+    versions = await _backend(backend.counters, names)
+    key = cache_key(endpoint, request.headers.get("host", ""),
+                    request.query_params.multi_items(), names, versions)
+    entry = await _backend(backend.get, key)
+    if entry is None:
+        result = await render()
+        if isinstance(result, Response):
+            return result
+        body  = JSONResponse(result).body
+        entry = (hashlib.sha256(body).hexdigest(), body)
+        await _backend(backend.set, key, entry, config["RESPONSE_CACHE_TTL"])
+    etag, body = entry
+
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if f'"{etag}"' in if_none_match or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def endpoint(*roles):
+    """Authenticate (and role-check) before running an async handler."""
+    def decorator(fn):
+        async def handler(request):
+            async with engine.connect() as conn:
+                user = await _authenticate(request, conn)
+                if isinstance(user, Response):
+                    return user
+                if roles and user.role not in roles:
+                    return _error("forbidden", 403)
+                result = await fn(request, conn, user)
+                return result if isinstance(result, Response) else JSONResponse(result)
+        return handler
+    return decorator
+
+
+CAR_COLUMNS    = [cars.c[name] for name in Car.LISTING_COLUMNS]
+RENTAL_COLUMNS = [rentals.c[name] for name in Rental.LISTING_COLUMNS]
+
+
+@endpoint()
+async def list_cars(request, conn, user):
+    if request.query_params.get("available", "0") in ("1", "true"):
+        # same semantics as the sync view: open-rental anti-join, never cached
+        stmt = sa.select(*CAR_COLUMNS).where(~sa.exists().where(
+            rentals.c.car_id == cars.c.id, rentals.c.end_date.is_(None)))
+        return await _paginate(request, conn, stmt, (cars.c.id,), Car.row_to_dict)
+    return await _cached(request, "cars.list_cars", [ALL_CARS], lambda: _paginate(
+        request, conn, sa.select(*CAR_COLUMNS), (cars.c.id,), Car.row_to_dict
+    ))
+
+
+@endpoint()
+async def merchant_cars(request, conn, user):
+    merchant_id = request.path_params["merchant_id"]
+    stmt = sa.select(*CAR_COLUMNS).where(cars.c.merchant_id == merchant_id)
+    return await _cached(request, "cars.merchant_cars", [merchant_scope(merchant_id)], lambda: _paginate(
+        request, conn, stmt, (cars.c.id,), Car.row_to_dict
+    ))
+
+
+@endpoint("merchant")
+async def merchant_rentals_self(request, conn, user):
+    stmt = sa.select(*RENTAL_COLUMNS).where(rentals.c.merchant_id == user.id)
+    return await _paginate(request, conn, stmt,
+                           (rentals.c.start_date, rentals.c.id), Rental.row_to_dict)
+
+
+@endpoint("user")
+async def user_rentals(request, conn, user):
+    if request.path_params["user_id"] != user.id:
+        return _error("forbidden", 403)
+    stmt = sa.select(*RENTAL_COLUMNS).where(rentals.c.user_id == user.id)
+    return await _paginate(request, conn, stmt,
+                           (rentals.c.start_date, rentals.c.id), user_rental_to_dict)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    await engine.dispose()
+
+
+app = Starlette(
+    routes=[
+        Route("/cars/cars", list_cars, methods=["GET"]),
+        Route("/cars/merchants/{merchant_id:int}/cars", merchant_cars, methods=["GET"]),
+        Route("/rentals/merchants/me/rentals", merchant_rentals_self, methods=["GET"]),
+        Route("/rentals/users/{user_id:int}/rentals", user_rentals, methods=["GET"]),
+        # everything else (all writes included) runs on the sync Flask app
+        Mount("/", app=WSGIMiddleware(flask_app)),
+    ],
+    lifespan=lifespan,
+)
@@ -1,27 +1,181 @@
+import secrets
+import time
+from collections import namedtuple
 from functools import wraps
-from flask import request, jsonify, current_app
+from flask import request, jsonify, current_app, g
+from itsdangerous import URLSafeTimedSerializer, BadSignature
 from app.models import User
 from werkzeug.security import check_password_hash
 from werkzeug.security import generate_password_hash
 from app.extensions import db
+from app.flags import flags
+from app.limits import limiter, shed
+from app.metrics import timed
 from flask import Blueprint
 
 
 
 auth_bp = Blueprint('auth', __name__)
 
-# Basic Auth decorator
+# What a verified bearer token resolves to. It carries the same id/username/role
+# attributes the handlers read from a User, without touching the database.
+TokenUser = namedtuple("TokenUser", ["id", "username", "role"])
+
+# signs tokens only when no key is configured and the app runs in debug/testing mode
+DEV_TOKEN_SECRET = "dev-secret-change-me"
+
+_serializers = {}
+
+
+def init_app(app):
+    """Without AUTH_TOKEN_SECRETS/SECRET_KEY, bearer tokens are off outside debug/testing."""
+    if app.config["AUTH_TOKEN_SECRETS"]:
+        return
+    if app.debug or app.testing:
+        app.config["AUTH_TOKEN_SECRETS"] = [DEV_TOKEN_SECRET]
+        app.logger.warning("no AUTH_TOKEN_SECRETS/SECRET_KEY: signing tokens with the development key")
+    else:
+        app.logger.warning("no AUTH_TOKEN_SECRETS/SECRET_KEY: bearer tokens are disabled")
+
+
+def _serializer(keys):
+    # keys is newest-last; itsdangerous signs with the last and verifies with all,
+    # so appending a new key to AUTH_TOKEN_SECRETS rotates without logging anyone out
+    keys = tuple(keys)
+    s = _serializers.get(keys)
+    if s is None:
+        s = _serializers[keys] = URLSafeTimedSerializer(list(keys), salt="auth-token")
+    return s
+
+
+def issue_token(user, keys=None):
+    """Return a signed token carrying the user's id and role."""
+    keys = keys or current_app.config["AUTH_TOKEN_SECRETS"]
+    if not keys:
+        raise RuntimeError("no token signing key configured")
+    return _serializer(keys).dumps({
+        "uid":  user.id,
+        "un":   user.username,
+        "role": user.role,
+        "jti":  secrets.token_urlsafe(8),
+    })
+
+
+def _load_token(token, keys, max_age):
+    if not keys:
+        return None, None
+    try:
+        return _serializer(keys).loads(token, max_age=max_age, return_timestamp=True)
+    except BadSignature:   # also covers SignatureExpired
+        return None, None
+
+
+def verify_token(token, keys, max_age):
+    """Return a TokenUser for a valid, unexpired, unrevoked token, else None."""
+    data, _ = _load_token(token, keys, max_age)
+    if not data or flags.is_set("revoked:" + data["jti"]):
+        return None
+    return TokenUser(data["uid"], data["un"], data["role"])
+
+
+def revoke_token(token, keys, max_age):
+    """
+    Revoke a token until it would have expired anyway. The revocation is a
+    flag (app.flags), so every worker sees it once FLAGS_BACKEND is redis.
+    """
+    data, issued = _load_token(token, keys, max_age)
+    if not data:
+        return False
+    remaining = issued.timestamp() + max_age - time.time()
+    if remaining > 0:
+        flags.set("revoked:" + data["jti"], remaining)
+    return True
+
+
+def _bearer_token():
+    header = request.headers.get("Authorization", "")
+    if header[:7].lower() == "bearer ":
+        return header[7:].strip()
+    return None
+
+
+def _check_basic(auth):
+    user = User.query.filter_by(username=auth.username).first()
+    if not user:
+        return None
+    with timed("auth"):
+        if not check_password_hash(user.password, auth.password):
+            return None
+    return user
+
+
+def _login_basic(auth):
+    """
+    _check_basic behind the failed-attempt limit (app.limits): once it is
+    exhausted for this address and username, no hash is computed. Returns
+    (user, None) or (None, error response).
+    """
+    key = f"{request.remote_addr}:{auth.username}"
+    blocked = limiter.blocked("auth_failures", key)
+    if blocked is not None:
+        return None, blocked
+    user = _check_basic(auth)
+    if not user:
+        limiter.record("auth_failures", key)
+        return None, (jsonify({"error": "invalid credentials"}), 401)
+    return user, None
+
+
+def _authenticate():
+    """(user, None) from a bearer token or Basic Auth, or (None, error response)."""
+    token = _bearer_token()
+    if token:
+        user = verify_token(
+            token,
+            current_app.config["AUTH_TOKEN_SECRETS"],
+            current_app.config["AUTH_TOKEN_TTL"],
+        )
+        if not user:
+            return None, (jsonify({"error": "invalid token"}), 401)
+        return user, None
+
+    auth = request.authorization
+    if not auth or not auth.username:
+        return None, (jsonify({"error": "missing credentials"}), 401)
+    return _login_basic(auth)
+
+
+# Auth decorator: a bearer token from /auth/login (no DB, no hash), or Basic Auth,
+# behind admission control (app.limits)
 def basic_auth_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        auth = request.authorization
-        if not auth:
-            return jsonify({"error": "missing credentials"}), 401
-        user = User.query.filter_by(username=auth.username).first()
-        if not user or not check_password_hash(user.password, auth.password):
-            return jsonify({"error": "invalid credentials"}), 401
-        request.current_user = user
-        return f(*args, **kwargs)
+        # sub-request of POST /batch: the batch already authenticated the caller
+        # and holds the admission slot
+        batch_user = g.get("batch_user")
+        if batch_user is not None:
+            request.current_user = batch_user
+            return f(*args, **kwargs)
+
+        # 1) per client address, before any credential work
+        rejected = limiter.hit("ip", request.remote_addr)
+        if rejected is not None:
+            return rejected
+        # 2) bounded in-flight requests per worker: shed rather than queue on the pool
+        if not limiter.acquire():
+            return shed(503, "server busy", limiter.queue_timeout, "concurrency")
+        try:
+            user, error = _authenticate()
+            if error is not None:
+                return error
+            # 3) failed Basic logins are limited in _login_basic; 4) per authenticated user
+            rejected = limiter.hit("user", user.id)
+            if rejected is not None:
+                return rejected
+            request.current_user = user
+            return f(*args, **kwargs)
+        finally:
+            limiter.release()
     return decorated
 
 # Role check decorator
@@ -75,9 +229,33 @@ def register():
 @auth_bp.route("/login", methods=["POST"])
 def login():
     auth = request.authorization
-    if not auth:
+    if not auth or not auth.username:
         return jsonify({"error":"missing credentials"}), 401
-    user = User.query.filter_by(username=auth.username).first()
-    if not user or not check_password_hash(user.password, auth.password):
-        return jsonify({"error":"invalid credentials"}), 401
-    return jsonify({"message": f"welcome, {user.username}"})
+    rejected = limiter.hit("ip", request.remote_addr)
+    if rejected is not None:
+        return rejected
+    user, error = _login_basic(auth)
+    if error is not None:
+        return error
+    if not current_app.config["AUTH_TOKEN_SECRETS"]:
+        return jsonify({"error": "token login disabled: set AUTH_TOKEN_SECRETS or SECRET_KEY"}), 503
+    return jsonify({
+        "message":    f"welcome, {user.username}",
+        "token":      issue_token(user),
+        "token_type": "Bearer",
+        "expires_in": current_app.config["AUTH_TOKEN_TTL"],
+    })
+
+
+@auth_bp.route("/logout", methods=["POST"])
+def logout():
+    token = _bearer_token()
+    if not token:
+        return jsonify({"error": "missing token"}), 401
+    if not revoke_token(
+        token,
+        current_app.config["AUTH_TOKEN_SECRETS"],
+        current_app.config["AUTH_TOKEN_TTL"],
+    ):
+        return jsonify({"error": "invalid token"}), 401
+    return "", 204
@@ -0,0 +1,264 @@
+"""
+Process-local car availability index (opt-in: AVAILABILITY_INDEX_ENABLED).
+
+Three arrays indexed by car id hold a car's merchant (0 means no such car),
+its busy flag and its open rental id. They cost about 9 bytes per car id.
+The ids of busy cars are also kept in a set, maintained with the arrays.
+create_rental uses the index to reject busy cars without a query, and
+GET /cars?available=1 uses the busy set to filter out busy cars while it is
+small (BUSY_FILTER_MAX).
+
+How it stays in sync:
+  * warm() loads it from the database at startup.
+  * ORM after_insert/after_update/after_delete events on Rental and Car
+    record changes made through the ORM. Core statements that bypass the ORM
+    (create_rental's INSERT ... SELECT, return_rental's UPDATE, fleet
+    retirement, bulk import) report their changes with record(). Fee
+    recomputation and partition maintenance don't change which cars are
+    busy. tests/test_availability.py checks every one of these writers.
+  * On Postgres the changes are sent with pg_notify in the same transaction,
+    so they are delivered exactly when it commits and in commit order.
+    listen() runs a background thread in every worker, this one included,
+    that applies them. Elsewhere (SQLite) they are applied locally after
+    commit.
+
+The index is a hint for rejecting work early. The partial unique indexes on
+rentals still decide every booking.
+"""
+import logging
+import select
+import threading
+import time
+from array import array
+
+import sqlalchemy as sa
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from app.extensions import db
+from app.models import Car, Rental
+
+log = logging.getLogger(__name__)
+
+CHANNEL    = "car_availability"
+MAX_NOTIFY = 200   # ops per message (payloads are capped at 8000 bytes)
+BUSY_FILTER_MAX = 1000   # busy_ids() past this: callers use the SQL anti-join instead
+
+
+class AvailabilityIndex:
+    def __init__(self):
+        self.lock     = threading.Lock()
+        self.ready    = False   # events and lookups are no-ops until warmed
+        self.notify   = False   # send changes to other workers (Postgres)
+        self.merchant = array("i")
+        self.busy     = bytearray()
+        self.rental   = array("i")
+        self.busy_set = set()
+
+    def _grow(self, car_id):
+        missing = car_id + 1 - len(self.busy)
+        if missing > 0:
+            missing = max(missing, len(self.busy) // 2)   # amortised growth
+            self.merchant.extend([0] * missing)
+            self.busy.extend(bytes(missing))
+            self.rental.extend([0] * missing)
+
+    def warm(self):
+        cars, rentals = Car.__table__, Rental.__table__
+        with db.engine.connect() as conn:
+            car_rows  = conn.execute(sa.select(cars.c.id, cars.c.merchant_id)).all()
+            open_rows = conn.execute(
+                sa.select(rentals.c.car_id, rentals.c.id)
+                .where(rentals.c.end_date.is_(None), rentals.c.car_id.isnot(None))
+            ).all()
+        size = max((r.id for r in car_rows), default=0) + 1
+        merchant, busy, rental = array("i", [0] * size), bytearray(size), array("i", [0] * size)
+        for car_id, merchant_id in car_rows:
+            merchant[car_id] = merchant_id
+        for car_id, rental_id in open_rows:
+            busy[car_id], rental[car_id] = 1, rental_id
+        busy_set = {car_id for car_id, _ in open_rows}
+        with self.lock:
+            self.merchant, self.busy, self.rental = merchant, busy, rental
+            self.busy_set = busy_set
+            self.ready = True
+
+    def apply(self, ops):
+        """ops: ("car", id, merchant) | ("gone", id) | ("busy", id, rental) | ("free", id)."""
+        with self.lock:
+            for op in ops:
+                kind, car_id = op[0], op[1]
+                self._grow(car_id)
+                if kind == "car":
+                    self.merchant[car_id] = op[2]
+                elif kind == "gone":
+                    self.merchant[car_id] = self.busy[car_id] = self.rental[car_id] = 0
+                    self.busy_set.discard(car_id)
+                elif kind == "busy":
+                    self.busy[car_id], self.rental[car_id] = 1, op[2]
+                    self.busy_set.add(car_id)
+                elif kind == "free":
+                    self.busy[car_id] = self.rental[car_id] = 0
+                    self.busy_set.discard(car_id)
+
+    # -- lookups ------------------------------------------------------------------
+
+    def open_rental(self, car_id):
+        """The open rental id if the index knows car_id is busy, else None."""
+        if not self.ready or car_id >= len(self.busy) or not self.busy[car_id]:
+            return None
+        return self.rental[car_id] or None
+
+    def busy_ids(self, merchant_id=None, limit=BUSY_FILTER_MAX):
+        """Sorted ids of busy cars (of merchant_id), or None if there are more than limit."""
+        with self.lock:
+            if len(self.busy_set) > limit and merchant_id is None:
+                return None
+            ids = [car_id for car_id in self.busy_set
+                   if merchant_id is None or self.merchant[car_id] == merchant_id]
+        return sorted(ids) if len(ids) <= limit else None
+
+
+index = AvailabilityIndex()
+
+
+# -- change capture ---------------------------------------------------------------
+
+def _pending(session):
+    """Ops recorded in this transaction; applied after commit, dropped on rollback."""
+    ops = session.info.get("availability_ops")
+    if ops is None:
+        ops = session.info["availability_ops"] = []
+    return ops
+
+
+def record(*ops):
+    """Queue index ops from code that writes with Core statements (see module doc)."""
+    if index.ready:
+        _pending(db.session()).extend(ops)
+
+
+@event.listens_for(Car, "after_insert")
+@event.listens_for(Car, "after_update")
+def _car_saved(mapper, connection, target):
+    if index.ready:
+        _pending(object_session(target)).append(("car", target.id, target.merchant_id))
+
+
+@event.listens_for(Car, "after_delete")
+def _car_deleted(mapper, connection, target):
+    if index.ready:
+        _pending(object_session(target)).append(("gone", target.id))
+
+
+@event.listens_for(Rental, "after_insert")
+@event.listens_for(Rental, "after_update")
+def _rental_saved(mapper, connection, target):
+    if index.ready and target.car_id is not None:
+        op = ("busy", target.car_id, target.id) if target.end_date is None else ("free", target.car_id)
+        _pending(object_session(target)).append(op)
+
+
+@event.listens_for(Rental, "after_delete")
+def _rental_deleted(mapper, connection, target):
+    if index.ready and target.car_id is not None and target.end_date is None:
+        _pending(object_session(target)).append(("free", target.car_id))
+
+
+def _encode(ops):
+    return ";".join(":".join(str(part) for part in op) for op in ops)
+
+
+def _decode(payload):
+    if payload == "reload":
+        return None
+    ops = []
+    for item in payload.split(";"):
+        kind, *ids = item.split(":")
+        ops.append((kind, *map(int, ids)))
+    return ops
+
+
+@event.listens_for(Session, "before_commit")
+def _notify(session):
+    if not index.notify:
+        return
+    session.flush()   # commit flushes after this hook; capture those ORM events too
+    ops = session.info.pop("availability_ops", None)
+    if not ops:
+        return
+    payloads = [_encode(ops[i:i + MAX_NOTIFY]) for i in range(0, len(ops), MAX_NOTIFY)]
+    if len(payloads) > 5:
+        payloads = ["reload"]   # big batch: cheaper for everyone to re-warm
+    for payload in payloads:
+        session.execute(sa.select(sa.func.pg_notify(CHANNEL, payload)))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply(session):
+    # only without a channel; with one, the listener applies in commit order
+    ops = session.info.pop("availability_ops", None)
+    if ops:
+        index.apply(ops)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session):
+    session.info.pop("availability_ops", None)
+
+
+# -- cross-worker channel ------------------------------------------------------------
+
+def _listen_loop(app, dsn):
+    import psycopg2
+
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(**dsn)
+            conn.autocommit = True
+            conn.cursor().execute(f"LISTEN {CHANNEL}")
+            # anything committed before LISTEN took effect is picked up here
+            with app.app_context():
+                index.warm()
+            while True:
+                if select.select([conn], [], [], 30) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    ops = _decode(conn.notifies.pop(0).payload)
+                    if ops is None:
+                        with app.app_context():
+                            index.warm()
+                    else:
+                        index.apply(ops)
+        except Exception:
+            log.exception("availability listener failed; reconnecting")
+            if conn is not None:
+                conn.close()
+            time.sleep(2)
+
+
+def listen(app):
+    """Start the LISTEN thread. Threads don't survive fork: call again in each worker."""
+    with app.app_context():
+        url = db.engine.url
+    dsn = {**url.translate_connect_args(username="user", database="dbname"), **url.query}
+    threading.Thread(target=_listen_loop, args=(app, dsn), daemon=True,
+                     name="availability-listener").start()
+
+
+def init_app(app):
+    if not app.config["AVAILABILITY_INDEX_ENABLED"]:
+        return
+    with app.app_context():
+        try:
+            index.warm()
+        except sa.exc.SQLAlchemyError:
+            # e.g. migrations not applied yet; run without the index
+            log.warning("availability index not warmed; disabled", exc_info=True)
+            return
+        index.notify = db.engine.dialect.name == "postgresql"
+    # under a preforking server the listener starts in each worker (app.warmup)
+    if index.notify and app.config["START_BACKGROUND_THREADS"]:
+        listen(app)
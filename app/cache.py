@@ -0,0 +1,174 @@
+"""
+Response cache for listing endpoints.
+
+Entries are keyed on endpoint, host, query args and the version counters the
+response depends on. Writes bump the counters (after commit), which makes old
+entries unreachable; LRU/TTL eviction cleans them up. Each entry stores a
+strong ETag so If-None-Match can be answered with 304 from the cache alone.
+
+Responses built from read-replica reads are passed through uncached (see
+app.replicas).
+
+The memory backend is per process: with several workers use the redis
+backend, or other workers may serve stale pages until RESPONSE_CACHE_TTL.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import current_app, make_response, request
+
+from app.extensions import db, on_commit
+
+ALL_CARS = "cars"
+
+
+def merchant_scope(merchant_id):
+    return f"cars:merchant:{merchant_id}"
+
+
+class MemoryBackend:
+    """Process-local LRU with per-entry TTL."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries    = OrderedDict()   # key -> (expires_at, value)
+        self._counters   = {}
+        self._lock       = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is None:
+                return None
+            if hit[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return hit[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def incr(self, name):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + 1
+
+    def counters(self, names):
+        return [self._counters.get(name, 0) for name in names]
+
+
+class RedisBackend:
+    """Shared across workers; Redis handles TTL and (with maxmemory-policy) LRU."""
+
+    def __init__(self, url):
+        import redis   # optional dependency, only needed for this backend
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self._redis.get(key)
+        if raw is None:
+            return None
+        etag, _, body = raw.partition(b"\n")
+        return etag.decode(), body
+
+    def set(self, key, value, ttl):
+        etag, body = value
+        self._redis.set(key, etag.encode() + b"\n" + body, ex=ttl)
+
+    def incr(self, name):
+        self._redis.incr("version:" + name)
+
+    def counters(self, names):
+        return [int(v or 0) for v in self._redis.mget(["version:" + n for n in names])]
+
+
+class ResponseCache:
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        kind = app.config["RESPONSE_CACHE_BACKEND"]
+        if kind == "memory":
+            self.backend = MemoryBackend(app.config["RESPONSE_CACHE_SIZE"])
+        elif kind == "redis":
+            self.backend = RedisBackend(app.config["RESPONSE_CACHE_URL"])
+        elif kind != "none":
+            raise ValueError(f"unknown RESPONSE_CACHE_BACKEND {kind!r}")
+        app.extensions["response_cache"] = self
+
+    def bump(self, *names):
+        if self.backend is not None:
+            for name in names:
+                self.backend.incr(name)
+
+
+response_cache = ResponseCache()
+
+
+def invalidate_cars(merchant_id):
+    """Invalidate car listings for merchant_id once the current transaction commits."""
+    on_commit(lambda: response_cache.bump(ALL_CARS, merchant_scope(merchant_id)))
+
+
+def cache_key(endpoint, host, args, names, versions):
+    """Key for one response; args is a sequence of (name, value) query pairs."""
+    return "resp:{}:{}?{}|{}".format(
+        endpoint,
+        host,
+        urlencode(sorted(args)),
+        ",".join(f"{n}={v}" for n, v in zip(names, versions)),
+    )
+
+
+def cached_response(scopes):
+    """
+    Cache a GET view's 200 responses.
+
+    scopes(**view_args) returns the version counters the response depends on,
+    or None to bypass the cache for this request. Put it below the auth
+    decorator so only authenticated callers get hits.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            backend = response_cache.backend
+            if backend is None:
+                return f(*args, **kwargs)
+
+            names = scopes(**kwargs)
+            if names is None:
+                return f(*args, **kwargs)
+            versions = backend.counters(names)
+            key = cache_key(request.endpoint, request.host,
+                            request.args.items(multi=True), names, versions)
+
+            entry = backend.get(key)
+            if entry is None:
+                resp = make_response(f(*args, **kwargs))
+                # a replica may lag behind the version it is filed under
+                if resp.status_code != 200 or db.session.info.get("read_bind"):
+                    return resp
+                body  = resp.get_data()
+                entry = (hashlib.sha256(body).hexdigest(), body)
+                backend.set(key, entry, current_app.config["RESPONSE_CACHE_TTL"])
+            etag, body = entry
+
+            if request.if_none_match.contains(etag):
+                resp = current_app.response_class(status=304)
+            else:
+                resp = current_app.response_class(body, mimetype="application/json")
+            resp.set_etag(etag)
+            resp.headers["Cache-Control"] = "private, no-cache"
+            return resp
+        return decorated
+    return decorator
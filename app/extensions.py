@@ -1,5 +1,25 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate    import Migrate
+from sqlalchemy       import event
+from sqlalchemy.orm   import Session
 
-db      = SQLAlchemy()
+from app.session import AppSession
+
+db      = SQLAlchemy(session_options={"class_": AppSession})
 migrate = Migrate()
+
+
+def on_commit(fn):
+    """Run fn once the current db.session transaction commits; dropped on rollback."""
+    db.session.info.setdefault("on_commit", []).append(fn)
+
+
+@event.listens_for(Session, "after_commit")
+def _run_on_commit(session):
+    for fn in session.info.pop("on_commit", ()):
+        fn()
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_on_commit(session):
+    session.info.pop("on_commit", None)
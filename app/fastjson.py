@@ -0,0 +1,52 @@
+"""
+orjson-backed JSON provider (JSON_PROVIDER=orjson, the default when orjson is
+installed).
+
+The output matches Flask's default provider: sorted keys, the same encoding of
+Decimal, date/datetime (HTTP dates), UUID and dataclasses via
+DefaultJSONProvider.default. The one difference is that non-ASCII text is
+emitted as UTF-8 instead of \\u escapes. Responses are encoded straight to bytes.
+"""
+import logging
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson   # optional dependency
+except ImportError:
+    orjson = None
+
+log = logging.getLogger(__name__)
+
+# datetimes and dataclasses go through DefaultJSONProvider.default, as in Flask
+OPTIONS = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+           | orjson.OPT_PASSTHROUGH_DATACLASS) if orjson is not None else 0
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    def dumps_bytes(self, obj, indent=False):
+        option = OPTIONS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, default=self.default, option=option)
+
+    def dumps(self, obj, **kwargs):
+        return self.dumps_bytes(obj, indent=bool(kwargs.get("indent"))).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj    = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        return self._app.response_class(
+            self.dumps_bytes(obj, indent=indent) + (b"\n" if indent else b""),
+            mimetype=self.mimetype,
+        )
+
+
+def init_app(app):
+    choice = app.config["JSON_PROVIDER"]
+    if choice == "orjson":
+        if orjson is None:
+            log.warning("JSON_PROVIDER=orjson but orjson is not installed; using the default")
+            return
+        app.json = OrjsonProvider(app)
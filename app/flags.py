@@ -0,0 +1,77 @@
+"""
+Short-lived named flags: revoked bearer tokens (app.auth) and
+read-your-writes windows (app.replicas).
+
+FLAGS_BACKEND is memory | redis. The memory backend is per process, so a
+flag set by one gunicorn worker (or the ASGI app) isn't seen by the others:
+use redis (FLAGS_URL) whenever more than one process serves requests. Flags
+are kept apart from the response cache, so cache churn can't evict one
+before it expires.
+"""
+import math
+import threading
+import time
+
+PURGE_EVERY = 1024   # memory backend: drop expired flags every this many sets
+
+
+class MemoryFlags:
+    """Process-local; expired flags are purged as new ones are set."""
+
+    def __init__(self):
+        self._until = {}   # name -> monotonic expiry
+        self._sets  = 0
+        self._lock  = threading.Lock()
+
+    def set(self, name, ttl):
+        now = time.monotonic()
+        with self._lock:
+            self._until[name] = now + ttl
+            self._sets += 1
+            if self._sets % PURGE_EVERY == 0:
+                for key, until in list(self._until.items()):
+                    if until <= now:
+                        del self._until[key]
+
+    def is_set(self, name):
+        until = self._until.get(name)
+        return until is not None and until > time.monotonic()
+
+
+class RedisFlags:
+    """Shared across workers and hosts; Redis expires the keys."""
+
+    def __init__(self, url):
+        import redis   # optional dependency, only needed for this backend
+        self._redis = redis.Redis.from_url(url)
+
+    def set(self, name, ttl):
+        self._redis.set("flag:" + name, b"1", ex=max(math.ceil(ttl), 1))
+
+    def is_set(self, name):
+        return bool(self._redis.exists("flag:" + name))
+
+
+class Flags:
+    def __init__(self):
+        self.backend = MemoryFlags()
+
+    def init_app(self, app):
+        kind = app.config["FLAGS_BACKEND"]
+        if kind == "memory":
+            self.backend = MemoryFlags()
+        elif kind == "redis":
+            self.backend = RedisFlags(app.config["FLAGS_URL"])
+        else:
+            raise ValueError(f"unknown FLAGS_BACKEND {kind!r}")
+        app.extensions["flags"] = self
+
+    def set(self, name, ttl):
+        """Set name for ttl seconds."""
+        self.backend.set(name, ttl)
+
+    def is_set(self, name):
+        return self.backend.is_set(name)
+
+
+flags = Flags()
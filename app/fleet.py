@@ -0,0 +1,107 @@
+"""
+Set-based fleet retirement.
+
+retire_cars closes every open rental on the selected cars with one
+UPDATE ... FROM cars, pricing the fee in SQL. It then detaches the closed
+rentals from the cars (car_id = NULL, as a single DELETE /cars/:id does) and
+deletes the cars. All of it happens in one transaction, however many cars
+are involved.
+"""
+from datetime import datetime
+from decimal import Decimal
+
+import click
+import sqlalchemy as sa
+from flask.cli import AppGroup
+
+from app import availability, outbox
+from app.cache import invalidate_cars
+from app.extensions import db
+from app.fees import fee_sql
+from app.models import Car, Rental
+from app.rollups import record_closed_rentals
+from app.timeline import after_commit
+
+fleet_cli = AppGroup("fleet", help="Fleet maintenance.")
+
+
+def retire_cars(merchant_id, car_ids=None, model=None):
+    """
+    Retire the merchant's cars matching car_ids and/or model (all of them if
+    neither is given), then commit. Ids that don't exist or belong to someone
+    else are reported as not_found rather than failing the batch.
+    """
+    rentals, cars = Rental.__table__, Car.__table__
+    now = datetime.utcnow()
+
+    # 1) lock the cars first so concurrent rentals/updates queue behind us
+    select = sa.select(cars.c.id).where(cars.c.merchant_id == merchant_id)
+    if car_ids is not None:
+        select = select.where(cars.c.id.in_(car_ids))
+    if model is not None:
+        select = select.where(cars.c.model == model)
+    ids = db.session.execute(select.order_by(cars.c.id).with_for_update()).scalars().all()
+    not_found = sorted(set(car_ids) - set(ids)) if car_ids is not None else []
+    if not ids:
+        db.session.rollback()
+        return {"retired": 0, "car_ids": [], "rentals_closed": 0,
+                "fees_total": "0", "rentals_detached": 0, "not_found": not_found}
+
+    # 2) close open rentals, fee priced from the joined car's rate
+    closed = db.session.execute(
+        sa.update(rentals)
+        .where(rentals.c.car_id == cars.c.id,
+               cars.c.id.in_(ids),
+               rentals.c.end_date.is_(None))
+        .values(end_date=now,
+                fee=fee_sql(rentals.c.start_date, sa.literal(now), cars.c.daily_rate,
+                            db.engine.dialect.name))
+        .returning(rentals.c.id, rentals.c.user_id, rentals.c.merchant_id, rentals.c.car_id,
+                   rentals.c.start_date, rentals.c.end_date, rentals.c.fee)
+    ).all()
+    record_closed_rentals(closed)
+    outbox.emit_many(
+        [('rental.closed', r.id, {'rental_id': r.id, 'user_id': r.user_id, 'car_id': r.car_id,
+                                  'merchant_id': r.merchant_id, 'start_date': r.start_date,
+                                  'end_date': r.end_date, 'fee': r.fee, 'reason': 'car_retired'})
+         for r in closed]
+        + [('car.retired', car_id, {'car_id': car_id, 'merchant_id': merchant_id})
+           for car_id in ids]
+    )
+
+    # 3) keep rental history, drop the reference, delete the cars
+    detached = db.session.execute(
+        sa.update(rentals).where(rentals.c.car_id.in_(ids)).values(car_id=None)
+    ).rowcount
+    # reservations on these cars go with them (ON DELETE CASCADE)
+    db.session.execute(sa.delete(cars).where(cars.c.id.in_(ids)))
+    invalidate_cars(merchant_id)
+    after_commit('removed', ids)
+    availability.record(*[('gone', car_id) for car_id in ids])
+    db.session.commit()
+
+    return {
+        "retired":          len(ids),
+        "car_ids":          ids,
+        "rentals_closed":   len(closed),
+        "fees_total":       str(sum((Decimal(r.fee) for r in closed), Decimal(0))),
+        "rentals_detached": detached,
+        "not_found":        not_found,
+    }
+
+
+@fleet_cli.command("retire")
+@click.option("--merchant", "merchant_id", type=int, required=True)
+@click.option("--car-id", "car_ids", type=int, multiple=True, help="Repeatable.")
+@click.option("--model", default=None, help="Exact model name.")
+@click.option("--all", "everything", is_flag=True, help="Every car of the merchant.")
+def retire_command(merchant_id, car_ids, model, everything):
+    """Close open rentals on, and delete, a merchant's cars."""
+    if not (car_ids or model or everything):
+        raise click.UsageError("give --car-id, --model or --all")
+    result = retire_cars(merchant_id, list(car_ids) or None, model)
+    click.echo(
+        f"{result['retired']} cars retired, {result['rentals_closed']} rentals closed "
+        f"(fees {result['fees_total']}), {result['rentals_detached']} rentals detached"
+        + (f"; not found: {result['not_found']}" if result["not_found"] else "")
+    )
@@ -0,0 +1,172 @@
+"""
+Admission control: token-bucket rate limits and a cap on requests in flight.
+
+basic_auth_required (app.auth) applies, in order:
+  1) RATE_LIMIT_IP per client address, before credentials are looked at;
+  2) DB_CONCURRENCY_LIMIT requests in flight per worker. A request waits up
+     to ADMISSION_QUEUE_TIMEOUT for a slot and is then shed with 503,
+     instead of queueing on the connection pool for DB_POOL_TIMEOUT;
+  3) for Basic auth, RATE_LIMIT_AUTH_FAILURES per (address, username). Each
+     failed password check takes a token, and once the bucket is empty the
+     password isn't hashed at all;
+  4) RATE_LIMIT_USER per authenticated user (off unless configured).
+POST /auth/login goes through 1) and 3), and the async listings (app.asgi)
+through 1), 3) and 4).
+
+A limit is "rate/burst": a bucket of burst tokens refilled at rate tokens
+per second; an empty string disables it. Rejections carry Retry-After.
+
+Buckets live in RATE_LIMIT_BACKEND: memory | redis | none. The memory
+backend is per process, so under gunicorn each worker enforces the full
+limit on its own (N workers admit N times the limit); use redis (RATE_LIMIT_URL) to share buckets between
+workers and hosts. The concurrency cap is always per worker.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import jsonify
+
+from app import metrics
+
+Rule = namedtuple("Rule", "rate burst")
+
+MAX_KEYS = 100000   # memory backend: least recently used buckets beyond this are dropped
+
+# KEYS[1]: bucket; ARGV: rate, burst, cost, now. Returns seconds to wait ("0": admitted).
+_TAKE_LUA = """
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local cost, now   = tonumber(ARGV[3]), tonumber(ARGV[4])
+local b      = redis.call('HMGET', KEYS[1], 't', 'ts')
+local tokens = tonumber(b[1]) or burst
+local ts     = tonumber(b[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local need, wait = math.max(cost, 1), 0
+if tokens >= need then tokens = tokens - cost else wait = (need - tokens) / rate end
+redis.call('HSET', KEYS[1], 't', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+def parse_rule(spec):
+    """ "10/20" -> Rule(10.0, 20.0); "" -> None."""
+    if not spec:
+        return None
+    rate, _, burst = spec.partition("/")
+    rule = Rule(float(rate), float(burst or rate))
+    if rule.rate <= 0 or rule.burst < 1:
+        raise ValueError(f"bad rate limit {spec!r}: want rate/burst with rate > 0, burst >= 1")
+    return rule
+
+
+class MemoryBuckets:
+    """Process-local token buckets."""
+
+    def __init__(self, max_keys=MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()   # key -> (tokens, updated_at)
+        self._lock    = threading.Lock()
+
+    def take(self, key, rule, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            tokens, ts = self._buckets.get(key, (rule.burst, now))
+            tokens = min(rule.burst, tokens + (now - ts) * rule.rate)
+            need, wait = max(cost, 1), 0.0
+            if tokens >= need:
+                tokens -= cost
+            else:
+                wait = (need - tokens) / rule.rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class RedisBuckets:
+    """Shared across workers; each take is one atomic script call."""
+
+    def __init__(self, url):
+        import redis   # optional dependency, only needed for this backend
+        self._take = redis.Redis.from_url(url).register_script(_TAKE_LUA)
+
+    def take(self, key, rule, cost=1):
+        return float(self._take(keys=[key], args=[rule.rate, rule.burst, cost, time.time()]))
+
+
+class Limiter:
+    def __init__(self, app=None):
+        self.backend = None
+        self.rules   = {}
+        self.slots   = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        cfg  = app.config
+        kind = cfg["RATE_LIMIT_BACKEND"]
+        if kind == "memory":
+            self.backend = MemoryBuckets()
+        elif kind == "redis":
+            self.backend = RedisBuckets(cfg["RATE_LIMIT_URL"])
+        elif kind != "none":
+            raise ValueError(f"unknown RATE_LIMIT_BACKEND {kind!r}")
+        self.rules = {
+            "ip":            parse_rule(cfg["RATE_LIMIT_IP"]),
+            "user":          parse_rule(cfg["RATE_LIMIT_USER"]),
+            "auth_failures": parse_rule(cfg["RATE_LIMIT_AUTH_FAILURES"]),
+        }
+        limit = cfg["DB_CONCURRENCY_LIMIT"]
+        self.slots         = threading.BoundedSemaphore(limit) if limit > 0 else None
+        self.queue_timeout = cfg["ADMISSION_QUEUE_TIMEOUT"]
+        app.extensions["limiter"] = self
+
+    def wait(self, name, key, cost=1):
+        """Take cost tokens from the name/key bucket; seconds to wait if it can't (0: admitted)."""
+        rule = self.rules.get(name)
+        if self.backend is None or rule is None:
+            return 0.0
+        return self.backend.take(f"rl:{name}:{key}", rule, cost)
+
+    def hit(self, name, key):
+        """Take a token from the name/key bucket; None if admitted, else a 429 response."""
+        wait = self.wait(name, key)
+        return shed(429, "rate limit exceeded", wait, name) if wait else None
+
+    def blocked(self, name, key):
+        """A 429 response if the bucket is empty, else None; takes nothing."""
+        wait = self.wait(name, key, 0)
+        return shed(429, "too many attempts", wait, name) if wait else None
+
+    def record(self, name, key):
+        """Take a token without checking (a failed attempt)."""
+        self.wait(name, key)
+
+    def acquire(self):
+        """Claim an in-flight slot, waiting up to queue_timeout; False if none freed up."""
+        return self.slots is None or self.slots.acquire(timeout=self.queue_timeout)
+
+    def release(self):
+        if self.slots is not None:
+            self.slots.release()
+
+
+def retry_after(wait, reason):
+    """Retry-After value for a rejection, counted on /metrics."""
+    with metrics.registry.lock:
+        metrics.registry.shed.inc((reason,))
+    return str(max(1, math.ceil(wait)))
+
+
+def shed(status, error, wait, reason):
+    """Rejection response with Retry-After (whole seconds, at least 1)."""
+    resp = jsonify({"error": error})
+    resp.status_code = status
+    resp.headers["Retry-After"] = retry_after(wait, reason)
+    return resp
+
+
+limiter = Limiter()
@@ -0,0 +1,270 @@
+"""
+Per-request hot-path instrumentation.
+
+Every request records its latency, the number of SQL statements it ran and
+their total time (SQLAlchemy engine events), time spent hashing passwords and
+time spent serializing. Totals are exposed in Prometheus text format at
+/metrics. They are kept per worker process, so scrape each worker (or run one
+worker per target).
+
+Send the METRICS_TIMING_HEADER request header (X-Debug-Timing: 1 by default)
+to get the breakdown back as a Server-Timing header. Requests that run more
+than METRICS_N_PLUS_ONE_THRESHOLD statements are logged and counted as
+suspected N+1 patterns.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS   = (1, 2, 5, 10, 20, 50, 100)
+
+
+def _labels(names, values):
+    def esc(v):
+        return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return ",".join(f'{n}="{esc(v)}"' for n, v in zip(names, values))
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name, self.help, self.labels = name, help, labels
+        self.series = {}
+
+    def inc(self, labels, value=1):
+        self.series[labels] = self.series.get(labels, 0) + value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in sorted(self.series.items()):
+            yield f"{self.name}{{{_labels(self.labels, labels)}}} {value}"
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self.series = {}   # labels -> [bucket counts..., sum, count]
+
+    def observe(self, labels, value):
+        s = self.series.get(labels)
+        if s is None:
+            s = self.series[labels] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                s[i] += 1
+        s[-2] += value
+        s[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, s in sorted(self.series.items()):
+            base = _labels(self.labels, labels)
+            for bound, n in zip(self.buckets, s):
+                yield f'{self.name}_bucket{{{base},le="{bound}"}} {n}'
+            yield f'{self.name}_bucket{{{base},le="+Inf"}} {s[-1]}'
+            yield f"{self.name}_sum{{{base}}} {s[-2]}"
+            yield f"{self.name}_count{{{base}}} {s[-1]}"
+
+
+class Gauge:
+    def __init__(self, name, help, labels):
+        self.name, self.help, self.labels = name, help, labels
+        self.series = {}
+
+    def set(self, labels, value):
+        self.series[labels] = value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        for labels, value in sorted(self.series.items()):
+            yield f"{self.name}{{{_labels(self.labels, labels)}}} {value}"
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = Counter(
+            "http_requests_total", "Requests served.", ("endpoint", "method", "status"))
+        self.latency = Histogram(
+            "http_request_duration_seconds", "Time to produce the response.", ("endpoint",))
+        self.statements = Histogram(
+            "db_statements_per_request", "SQL statements run per request.", ("endpoint",),
+            buckets=COUNT_BUCKETS)
+        self.db_time = Counter(
+            "db_time_seconds_total", "Time spent executing SQL.", ("endpoint",))
+        self.auth_time = Counter(
+            "auth_hash_seconds_total", "Time spent checking password hashes.", ("endpoint",))
+        self.serialize_time = Counter(
+            "serialize_seconds_total", "Time spent serializing response bodies.", ("endpoint",))
+        self.n_plus_one = Counter(
+            "n_plus_one_suspected_total", "Requests over the statement threshold.", ("endpoint",))
+        self.shed = Counter(
+            "requests_shed_total", "Requests rejected by admission control (app.limits).",
+            ("reason",))
+        self.startup = Gauge(
+            "app_startup_seconds", "Duration of each startup phase; first_request is the "
+            "first response this worker served.", ("phase",))
+        self.first_request_done = False
+
+    def render(self):
+        with self.lock:
+            metrics = (self.requests, self.latency, self.statements, self.db_time,
+                       self.auth_time, self.serialize_time, self.n_plus_one, self.shed,
+                       self.startup)
+            lines = [line for m in metrics for line in m.render()]
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def record_startup(phase, seconds):
+    with registry.lock:
+        registry.startup.set((phase,), round(seconds, 6))
+
+
+def _timing():
+    return g.get("_timing") if has_app_context() else None
+
+
+@contextmanager
+def timed(kind):
+    """Add the block's wall time to the current request's 'auth'/'serialize' bucket."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing = _timing()
+        if timing is not None:
+            timing[kind] += time.perf_counter() - started
+
+
+class TimedJSONMixin:
+    """Counts JSON encoding as 'serialize' time, whichever provider is installed."""
+
+    def dumps(self, obj, **kwargs):
+        with timed("serialize"):
+            return super().dumps(obj, **kwargs)
+
+    def dumps_bytes(self, obj, **kwargs):   # OrjsonProvider's response path
+        with timed("serialize"):
+            return super().dumps_bytes(obj, **kwargs)
+
+
+def timed_provider(app):
+    """Return a copy of app's current JSON provider with timing mixed in."""
+    cls = type(app.json)
+    # built from the app itself: the provider keeps only a weakref.proxy to it,
+    # which can't be proxied again
+    return type(f"Timed{cls.__name__}", (TimedJSONMixin, cls), {})(app)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("_query_started", []).append(time.perf_counter())
+    if context is not None:
+        context._query_timed = True   # lets handle_error know this statement pushed a start
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["_query_started"].pop()
+    if context is not None:
+        context._query_timed = False
+    timing  = _timing()
+    if timing is not None:
+        timing["queries"] += 1
+        timing["db"]      += time.perf_counter() - started
+
+
+@event.listens_for(Engine, "handle_error")
+def _cursor_execute_failed(ctx):
+    # after_cursor_execute never runs for a failed statement; drop its start time.
+    # Registered on every Engine, so it must never raise: the caller expects
+    # the original error (IntegrityError, disconnects, pre-ping failures).
+    try:
+        context = getattr(ctx, "execution_context", None)
+        conn    = getattr(ctx, "connection", None)
+        if conn is None or not getattr(context, "_query_timed", False):
+            return
+        context._query_timed = False
+        stack = conn.info.get("_query_started")
+        if stack:
+            stack.pop()
+    except Exception:
+        pass
+
+
+def _start_request():
+    g._timing = {"started": time.perf_counter(), "queries": 0,
+                 "db": 0.0, "auth": 0.0, "serialize": 0.0}
+
+
+def _record(timing, status):
+    """Count one finished request; returns (total seconds, N+1 suspected)."""
+    total    = time.perf_counter() - timing["started"]
+    endpoint = request.endpoint or "unmatched"
+    n_plus_1 = timing["queries"] > current_app.config["METRICS_N_PLUS_ONE_THRESHOLD"]
+
+    with registry.lock:
+        registry.requests.inc((endpoint, request.method, status))
+        registry.latency.observe((endpoint,), total)
+        registry.statements.observe((endpoint,), timing["queries"])
+        registry.db_time.inc((endpoint,), timing["db"])
+        registry.auth_time.inc((endpoint,), timing["auth"])
+        registry.serialize_time.inc((endpoint,), timing["serialize"])
+        if n_plus_1:
+            registry.n_plus_one.inc((endpoint,))
+        first = not registry.first_request_done
+        if first:
+            registry.first_request_done = True
+            registry.startup.set(("first_request",), round(total, 6))
+    if first:
+        current_app.logger.info("first request (%s) took %.1f ms", endpoint, total * 1000)
+    if n_plus_1:
+        current_app.logger.warning(
+            "%s ran %d SQL statements (possible N+1)", endpoint, timing["queries"])
+    return total, n_plus_1
+
+
+def _finish_request(response):
+    timing = g.pop("_timing", None)
+    if timing is None:
+        return response
+    total, n_plus_1 = _record(timing, response.status_code)
+
+    if request.headers.get(current_app.config["METRICS_TIMING_HEADER"]) == "1":
+        response.headers["Server-Timing"] = ", ".join([
+            f'db;dur={timing["db"] * 1000:.2f};desc="{timing["queries"]} queries"',
+            f'auth;dur={timing["auth"] * 1000:.2f}',
+            f'serialize;dur={timing["serialize"] * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+        if n_plus_1:
+            response.headers["X-N-Plus-One"] = str(timing["queries"])
+    return response
+
+
+def _teardown_request(exc):
+    # after_request is skipped when the view raised and the error propagates
+    # (debug/testing, batch sub-requests): count it as the 500 it becomes
+    timing = g.pop("_timing", None)
+    if timing is not None:
+        _record(timing, 500)
+
+
+def init_app(app):
+    if not app.config["METRICS_ENABLED"]:
+        return
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_teardown_request)
+    # time JSON encoding too, wrapping whichever provider is installed
+    app.json = timed_provider(app)
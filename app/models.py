@@ -1,4 +1,5 @@
 from datetime import datetime
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
 from app.extensions import db
 
 class User(db.Model):
@@ -10,6 +11,15 @@ class User(db.Model):
 
 class Car(db.Model):
     __tablename__ = 'cars'
+    # backing indexes for GET /cars/search (trigram needs the pg_trgm extension)
+    __table_args__ = (
+        db.Index('ix_cars_model_trgm', 'model', postgresql_using='gin',
+                 postgresql_ops={'model': 'gin_trgm_ops'}),
+        db.Index('ix_cars_daily_rate', 'daily_rate'),
+        db.Index('ix_cars_merchant_rate', 'merchant_id', 'daily_rate'),
+        # per-merchant listing, paged by id
+        db.Index('ix_cars_merchant_id', 'merchant_id', 'id'),
+    )
     id           = db.Column(db.Integer, primary_key=True)
     model        = db.Column(db.String(120), nullable=False)
     plate        = db.Column(db.String(20), unique=True, nullable=False)
@@ -17,22 +27,53 @@ class Car(db.Model):
     merchant_id  = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     merchant     = db.relationship('User', backref='cars')
 
-    def to_dict(self):
+    # columns row_to_dict reads, for listings that select rows instead of Cars
+    LISTING_COLUMNS = ('id', 'model', 'plate', 'daily_rate')
+
+    @staticmethod
+    def row_to_dict(row):
         return {
-            'id': self.id,
-            'model': self.model,
-            'plate': self.plate,
-            'daily_rate': str(self.daily_rate)
+            'id': row.id,
+            'model': row.model,
+            'plate': row.plate,
+            'daily_rate': str(row.daily_rate)
         }
 
+    @classmethod
+    def listing_query(cls):
+        """LISTING_COLUMNS as plain rows: no identity map, no relationship loading."""
+        return db.session.query(*(getattr(cls, name) for name in cls.LISTING_COLUMNS))
+
+    def to_dict(self):
+        return Car.row_to_dict(self)
+
 class Rental(db.Model):
     __tablename__ = 'rentals'
+    # at most one open rental per car and per user; create_rental relies on
+    # these to reject double bookings atomically. On Postgres rentals is
+    # partitioned by month (migration e1f3a5c7b9d2) and the same rule lives
+    # in active_rentals under these names, kept in sync by triggers.
+    __table_args__ = (
+        db.Index('uq_rentals_active_car', 'car_id', unique=True,
+                 postgresql_where=db.text('end_date IS NULL'),
+                 sqlite_where=db.text('end_date IS NULL')),
+        db.Index('uq_rentals_active_user', 'user_id', unique=True,
+                 postgresql_where=db.text('end_date IS NULL'),
+                 sqlite_where=db.text('end_date IS NULL')),
+        # hot queries (migration f2b6c8d0a4e7; `flask plans check` guards them)
+        db.Index('ix_rentals_merchant_start', 'merchant_id', 'start_date', 'id'),
+        db.Index('ix_rentals_user_start', 'user_id', 'start_date', 'id'),
+        db.Index('ix_rentals_car_id', 'car_id'),
+        db.Index('ix_rentals_closed_end', 'end_date',
+                 postgresql_where=db.text('end_date IS NOT NULL'),
+                 sqlite_where=db.text('end_date IS NOT NULL')),
+    )
 
     id           = db.Column(db.Integer, primary_key=True)
     user_id      = db.Column(db.Integer, db.ForeignKey('users.id'),   nullable=False)
     car_id       = db.Column(db.Integer, db.ForeignKey('cars.id'),    nullable=True)
     merchant_id  = db.Column(db.Integer, db.ForeignKey('users.id'),   nullable=False)
-    start_date   = db.Column(db.DateTime, default=datetime.utcnow)
+    start_date   = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)   # partition key
     end_date     = db.Column(db.DateTime, nullable=True)
     fee          = db.Column(db.Numeric(10,2), nullable=True)
 
@@ -56,13 +97,127 @@ class Rental(db.Model):
         days  = delta.days + 1
         return days * float(self.car.daily_rate)
 
+    LISTING_COLUMNS = ('id', 'user_id', 'merchant_id', 'car_id', 'start_date', 'end_date', 'fee')
+
+    @staticmethod
+    def row_to_dict(row):
+        return {
+            "id":         row.id,
+            "user_id":    row.user_id,
+            "merchant_id": row.merchant_id,
+            "car_id":     row.car_id,
+            "start_date": row.start_date.isoformat(),
+            "end_date":   row.end_date.isoformat() if row.end_date else None,
+            "fee":        str(row.fee) if row.fee is not None else None,
+        }
+
+    @classmethod
+    def listing_query(cls):
+        """Rows of LISTING_COLUMNS, as for Car."""
+        return db.session.query(*(getattr(cls, name) for name in cls.LISTING_COLUMNS))
+
+    def to_dict(self):
+        return Rental.row_to_dict(self)
+
+
+# Daily rollups, maintained by app.rollups when a rental closes. Its revenue
+# and count go to the UTC day it closed on; its rented seconds are spread
+# over the UTC days it covered.
+class MerchantDailyStats(db.Model):
+    __tablename__ = 'merchant_daily_stats'
+    merchant_id    = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    day            = db.Column(db.Date, primary_key=True)
+    revenue        = db.Column(db.Numeric(14,2), nullable=False, default=0)
+    rentals        = db.Column(db.Integer, nullable=False, default=0)
+    rented_seconds = db.Column(db.BigInteger, nullable=False, default=0)
+
+class CarDailyStats(db.Model):
+    __tablename__ = 'car_daily_stats'
+    __table_args__ = (
+        db.Index('ix_car_daily_stats_merchant_day', 'merchant_id', 'day'),
+    )
+    # no FK on car_id: stats outlive deleted cars
+    car_id         = db.Column(db.Integer, primary_key=True)
+    day            = db.Column(db.Date, primary_key=True)
+    merchant_id    = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    revenue        = db.Column(db.Numeric(14,2), nullable=False, default=0)
+    rentals        = db.Column(db.Integer, nullable=False, default=0)
+    rented_seconds = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+# Future bookings of a car over [start_at, end_at), naive UTC like every other
+# timestamp here. On Postgres an exclusion constraint rejects overlapping
+# reservations of the same car, however the requests race.
+class Reservation(db.Model):
+    __tablename__ = 'reservations'
+    id          = db.Column(db.Integer, primary_key=True)
+    car_id      = db.Column(db.Integer, db.ForeignKey('cars.id', ondelete='CASCADE'), nullable=False)
+    user_id     = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    merchant_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    start_at    = db.Column(db.DateTime, nullable=False)
+    end_at      = db.Column(db.DateTime, nullable=False)
+    created_at  = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.CheckConstraint('end_at > start_at', name='ck_reservations_period'),
+        ExcludeConstraint(
+            (car_id, '='), (db.func.tsrange(start_at, end_at, '[)'), '&&'),
+            name='ex_reservations_car_period', using='gist',
+        ).ddl_if(dialect='postgresql'),
+        db.Index('ix_reservations_user_start', 'user_id', 'start_at'),
+        db.Index('ix_reservations_end', 'end_at'),
+    )
+
     def to_dict(self):
         return {
-            "id":         self.id,
-            "user_id":    self.user_id,
+            "id":          self.id,
+            "car_id":      self.car_id,
+            "user_id":     self.user_id,
             "merchant_id": self.merchant_id,
-            "car_id":     self.car_id,
-            "start_date": self.start_date.isoformat(),
-            "end_date":   self.end_date.isoformat() if self.end_date else None,
-            "fee":        str(self.fee) if self.fee is not None else None,
+            "start_at":    self.start_at.isoformat(),
+            "end_at":      self.end_at.isoformat(),
+        }
+
+
+# Months of rentals moved out of the database into Parquet files by
+# app.partitions; the history endpoints read them back on demand.
+class RentalArchive(db.Model):
+    __tablename__ = 'rental_archives'
+    id             = db.Column(db.Integer, primary_key=True)
+    partition_name = db.Column(db.String(63), unique=True, nullable=False)
+    range_start    = db.Column(db.DateTime, nullable=False, index=True)
+    range_end      = db.Column(db.DateTime, nullable=False)
+    path           = db.Column(db.String(1024), nullable=False)
+    rows           = db.Column(db.BigInteger, nullable=False)
+    bytes          = db.Column(db.BigInteger, nullable=False)
+    archived_at    = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+# Transactional outbox: rental lifecycle events written in the same
+# transaction as the change they describe, drained by app.outbox.
+class OutboxEvent(db.Model):
+    __tablename__ = 'outbox_events'
+    __table_args__ = (
+        # the dispatcher's scan: undelivered events that are due, oldest first
+        db.Index('ix_outbox_events_pending', 'available_at', 'id',
+                 postgresql_where=db.text('dispatched_at IS NULL'),
+                 sqlite_where=db.text('dispatched_at IS NULL')),
+    )
+    id            = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    topic         = db.Column(db.String(64), nullable=False)
+    key           = db.Column(db.String(64), nullable=False)   # aggregate id, e.g. the rental id
+    payload       = db.Column(db.JSON, nullable=False)
+    created_at    = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    available_at  = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    attempts      = db.Column(db.Integer, nullable=False, default=0)
+    last_error    = db.Column(db.Text, nullable=True)
+    dispatched_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "id":         self.id,
+            "topic":      self.topic,
+            "key":        self.key,
+            "payload":    self.payload,
+            "created_at": self.created_at.isoformat(),
         }
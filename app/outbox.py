@@ -0,0 +1,316 @@
+"""
+Transactional outbox for rental lifecycle events.
+
+Routes call emit() inside their own transaction, so an event is stored if
+and only if the change it describes commits. A dispatcher drains the
+outbox_events table in batches and hands events to a sink:
+
+  * file:<path>   appends NDJSON, one event per line (fsync'd per batch)
+  * webhook:<url> POSTs {"events": [...]} as JSON; 429/503 means back off
+  * queue         puts events on a bounded in-process queue (outbox.sink().queue)
+
+Delivery is at least once. An event is marked dispatched only after its sink
+accepted it, in the transaction that holds its row lock. A crash in between
+sends it again, so consumers should dedupe on the event id. Batches are
+claimed with FOR UPDATE SKIP LOCKED, so several dispatchers can run side by
+side. Order is by due time and id, not strictly per key across dispatchers.
+
+Backpressure: a sink raises Backpressure when it can't take more (queue full,
+webhook answering 429/503, unreachable or timing out). The dispatcher then leaves the batch undelivered,
+costing it no attempt, and pauses with growing waits before claiming again.
+Any other failure costs each affected event an attempt and delays it with
+exponential backoff. After OUTBOX_MAX_ATTEMPTS the event is left for
+inspection (flask outbox status).
+
+Topics: rental.created, rental.returned, rental.closed (rental closed because
+its car was retired), car.retired.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timedelta
+
+import click
+import sqlalchemy as sa
+from flask import current_app
+from flask.cli import AppGroup
+
+from app.extensions import db, on_commit
+from app.models import OutboxEvent
+
+log = logging.getLogger(__name__)
+
+outbox_cli = AppGroup("outbox", help="Transactional outbox of rental events.")
+
+
+# -- writing ------------------------------------------------------------------------
+
+def _jsonable(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)   # Decimal fees and the like
+
+
+def emit(topic, key, payload):
+    """Store one event in the current transaction."""
+    emit_many([(topic, key, payload)])
+
+
+def emit_many(events):
+    """Store (topic, key, payload) events in the current transaction, one INSERT."""
+    if not events:
+        return
+    now = datetime.utcnow()
+    db.session.execute(sa.insert(OutboxEvent.__table__), [
+        {"topic": topic, "key": str(key),
+         "payload": {k: _jsonable(v) for k, v in payload.items()},
+         "created_at": now, "available_at": now, "attempts": 0}
+        for topic, key, payload in events
+    ])
+    # wake an in-process dispatcher once this commits (see start())
+    if _wake_dispatcher not in db.session.info.get("on_commit", ()):
+        on_commit(_wake_dispatcher)
+
+
+# -- sinks ----------------------------------------------------------------------------
+
+class Backpressure(Exception):
+    """The sink can't take more right now; retry the batch later, no attempt spent."""
+
+
+class FileSink:
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, events):
+        lines = "".join(json.dumps(e, separators=(",", ":")) + "\n" for e in events)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class WebhookSink:
+    def __init__(self, url, timeout=5.0):
+        self.url     = url
+        self.timeout = timeout
+
+    def send(self, events):
+        req = urllib.request.Request(
+            self.url, data=json.dumps({"events": events}).encode(), method="POST",
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                resp.read()
+        except urllib.error.HTTPError as e:
+            # other 4xx/5xx: one event may be at fault, so dispatch_batch retries singly
+            if e.code in (429, 503):
+                raise Backpressure(f"webhook answered {e.code}") from e
+            raise
+        except OSError as e:
+            # unreachable, refused or timed out (URLError, socket timeouts): no
+            # event is at fault, so don't retry each one while holding the rows
+            raise Backpressure(f"webhook unreachable: {e}") from e
+
+
+class QueueSink:
+    def __init__(self, maxsize=10000):
+        self.queue = queue.Queue(maxsize)
+
+    def send(self, events):
+        # all or nothing, so a full queue never takes half a batch
+        if self.queue.maxsize and self.queue.maxsize - self.queue.qsize() < len(events):
+            raise Backpressure("queue full")
+        for e in events:
+            self.queue.put_nowait(e)
+
+
+_sinks = {}
+
+
+def sink(spec=None):
+    """The sink for spec ("file:<path>", "webhook:<url>" or "queue"), default OUTBOX_SINK."""
+    spec = spec or current_app.config["OUTBOX_SINK"]
+    if spec not in _sinks:
+        kind, _, target = spec.partition(":")
+        if kind == "file":
+            _sinks[spec] = FileSink(target)
+        elif kind == "webhook":
+            _sinks[spec] = WebhookSink(target, current_app.config["OUTBOX_WEBHOOK_TIMEOUT"])
+        elif kind == "queue":
+            _sinks[spec] = QueueSink(current_app.config["OUTBOX_QUEUE_SIZE"])
+        else:
+            raise ValueError(f"unknown outbox sink {spec!r}")
+    return _sinks[spec]
+
+
+# -- dispatching ----------------------------------------------------------------------
+
+def _backoff(attempts):
+    cfg = current_app.config
+    return timedelta(seconds=min(cfg["OUTBOX_BACKOFF_BASE"] * 2 ** (attempts - 1),
+                                 cfg["OUTBOX_BACKOFF_MAX"]))
+
+
+def dispatch_batch(target, batch_size=None):
+    """
+    Claim up to batch_size due events, send them and record the outcome, then
+    commit. Returns the number claimed. Raises Backpressure (after committing
+    whatever was delivered) when the sink pushes back.
+    """
+    cfg        = current_app.config
+    batch_size = batch_size or cfg["OUTBOX_BATCH_SIZE"]
+    t, now     = OutboxEvent.__table__, datetime.utcnow()
+
+    rows = db.session.execute(
+        sa.select(t.c.id, t.c.topic, t.c.key, t.c.payload, t.c.created_at, t.c.attempts)
+        .where(t.c.dispatched_at.is_(None), t.c.available_at <= now,
+               t.c.attempts < cfg["OUTBOX_MAX_ATTEMPTS"])
+        .order_by(t.c.available_at, t.c.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not rows:
+        db.session.rollback()   # release the (empty) transaction
+        return 0
+
+    events = [{"id": r.id, "topic": r.topic, "key": r.key, "payload": r.payload,
+               "created_at": r.created_at.isoformat()} for r in rows]
+    delivered, failed, pushed_back = [], [], None
+    try:
+        target.send(events)
+        delivered = [r.id for r in rows]
+    except Backpressure as e:
+        pushed_back = e
+    except Exception as e:
+        # one bad event shouldn't hold back the rest: retry them one by one
+        log.warning("outbox batch of %d failed (%s); sending singly", len(rows), e)
+        for row, event in zip(rows, events):
+            if pushed_back is not None:
+                break
+            try:
+                target.send([event])
+                delivered.append(row.id)
+            except Backpressure as bp:
+                pushed_back = bp
+            except Exception as err:
+                failed.append({"b_id": row.id, "b_attempts": row.attempts + 1,
+                               "b_available_at": now + _backoff(row.attempts + 1),
+                               "b_error": f"{type(err).__name__}: {err}"[:2000]})
+
+    if delivered:
+        db.session.execute(sa.update(t).where(t.c.id.in_(delivered)).values(dispatched_at=now))
+    if failed:
+        db.session.execute(
+            sa.update(t).where(t.c.id == sa.bindparam("b_id")).values(
+                attempts=sa.bindparam("b_attempts"),
+                available_at=sa.bindparam("b_available_at"),
+                last_error=sa.bindparam("b_error"),
+            ),
+            failed,
+        )
+    db.session.commit()
+    if pushed_back is not None:
+        raise pushed_back
+    return len(rows)
+
+
+_wake = threading.Event()
+
+
+def _wake_dispatcher():
+    _wake.set()
+
+
+def run(target, once=False, batch_size=None):
+    """Drain the outbox until it is empty (once) or forever. Returns events claimed."""
+    cfg   = current_app.config
+    total = 0
+    pause = cfg["OUTBOX_POLL_INTERVAL"]
+    while True:
+        try:
+            n = dispatch_batch(target, batch_size)
+            pause = cfg["OUTBOX_POLL_INTERVAL"]
+        except Backpressure as e:
+            log.info("outbox sink pushing back (%s); pausing %.1fs", e, pause)
+            time.sleep(pause)
+            pause = min(pause * 2, cfg["OUTBOX_BACKOFF_MAX"])
+            continue
+        total += n
+        if n:
+            continue            # more may be waiting: claim again straight away
+        if once:
+            return total
+        _wake.wait(cfg["OUTBOX_POLL_INTERVAL"])
+        _wake.clear()
+
+
+def start(app):
+    """Run a dispatcher thread in this process (OUTBOX_DISPATCH_IN_PROCESS)."""
+    def loop():
+        while True:
+            try:
+                with app.app_context():
+                    run(sink())
+            except Exception:
+                log.exception("outbox dispatcher failed; restarting")
+                time.sleep(2)
+
+    threading.Thread(target=loop, daemon=True, name="outbox-dispatcher").start()
+
+
+def init_app(app):
+    if app.config["OUTBOX_DISPATCH_IN_PROCESS"] and app.config["START_BACKGROUND_THREADS"]:
+        start(app)
+
+
+# -- CLI ----------------------------------------------------------------------------
+
+@outbox_cli.command("dispatch")
+@click.option("--sink", "spec", default=None, help="file:<path>, webhook:<url> or queue "
+                                                    "(default OUTBOX_SINK).")
+@click.option("--batch-size", type=int, default=None)
+@click.option("--once", is_flag=True, help="Stop once nothing is due.")
+def dispatch_command(spec, batch_size, once):
+    """Deliver pending events to a sink."""
+    n = run(sink(spec), once=once, batch_size=batch_size)
+    click.echo(f"{n} events claimed")
+
+
+@outbox_cli.command("status")
+def status_command():
+    """Pending, failing and given-up event counts."""
+    t, now = OutboxEvent.__table__, datetime.utcnow()
+    max_attempts = current_app.config["OUTBOX_MAX_ATTEMPTS"]
+    pending = t.c.dispatched_at.is_(None)
+    row = db.session.execute(sa.select(
+        sa.func.count().filter(pending, t.c.attempts < max_attempts).label("pending"),
+        sa.func.count().filter(pending, t.c.attempts > 0,
+                               t.c.attempts < max_attempts).label("retrying"),
+        sa.func.count().filter(pending, t.c.attempts >= max_attempts).label("given_up"),
+        sa.func.min(t.c.created_at).filter(pending).label("oldest"),
+    )).one()
+    lag = f", oldest {(now - row.oldest).total_seconds():.0f}s old" if row.oldest else ""
+    click.echo(f"{row.pending} pending ({row.retrying} retrying), {row.given_up} given up{lag}")
+
+
+@outbox_cli.command("purge")
+@click.option("--older-than", "days", type=int, default=7, show_default=True,
+              help="Days since dispatch.")
+def purge_command(days):
+    """Delete delivered events."""
+    t = OutboxEvent.__table__
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    n = db.session.execute(
+        sa.delete(t).where(t.c.dispatched_at.isnot(None), t.c.dispatched_at < cutoff)
+    ).rowcount
+    db.session.commit()
+    click.echo(f"{n} delivered events deleted")
@@ -0,0 +1,344 @@
+"""
+Monthly partitions of rentals and their archival (PostgreSQL).
+
+Migration e1f3a5c7b9d2 turns rentals into a table range-partitioned by
+month on start_date, with a default partition for anything out of range.
+Postgres can't enforce "one open rental per car / per user" with partial
+unique indexes on a partitioned table, because such indexes must include
+start_date. Triggers therefore mirror every open rental into active_rentals,
+whose unique constraints carry the old index names (uq_rentals_active_car,
+uq_rentals_active_user). create_rental's conflict handling is unchanged.
+
+    flask partitions maintain [--ahead 3] [--archive-after 24] [--dry-run]
+
+This creates the partitions for the next --ahead months. Rows that landed
+in the default partition for those months are moved in. It then detaches
+each partition that ended more than --archive-after months ago and has no
+open rental. The rows go to a zstd-compressed Parquet file in
+RENTALS_ARCHIVE_DIR while the partition is still attached; then the
+partition is detached, recorded in rental_archives and dropped in a short
+transaction. History endpoints read the
+files on demand (read_archived). Archived rentals no longer take part in
+SQL queries such as fee recomputation or exports. The daily rollups keep
+their totals, and `flask rollups rebuild` reads archived months back from
+the files (scan_archived).
+"""
+import os
+import re
+from collections import namedtuple
+from datetime import datetime
+
+import click
+import sqlalchemy as sa
+from flask import current_app
+from flask.cli import AppGroup
+
+from app.extensions import db
+from app.models import RentalArchive
+
+partitions_cli = AppGroup("partitions", help="Monthly rentals partitions and archives.")
+
+DEFAULT_PARTITION   = "rentals_default"
+ARCHIVE_COLUMNS     = ("id", "user_id", "merchant_id", "car_id", "start_date", "end_date", "fee")
+ROW_GROUP           = 65536   # rows per Parquet row group
+DETACH_LOCK_TIMEOUT = "5s"    # give up archiving a month rather than stall rentals
+
+_BOUNDS = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+ArchivedRental = namedtuple("ArchivedRental", ARCHIVE_COLUMNS)
+
+
+def _pyarrow():
+    # optional dependency, only needed to write or read archives
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    return pa, pq
+
+
+def _schema(pa):
+    return pa.schema([
+        ("id", pa.int64()), ("user_id", pa.int64()), ("merchant_id", pa.int64()),
+        ("car_id", pa.int64()), ("start_date", pa.timestamp("us")),
+        ("end_date", pa.timestamp("us")), ("fee", pa.decimal128(10, 2)),
+    ])
+
+
+def month_start(dt):
+    return datetime(dt.year, dt.month, 1)
+
+
+def add_months(month, n):
+    years, index = divmod(month.month - 1 + n, 12)
+    return datetime(month.year + years, index + 1, 1)
+
+
+def partition_name(month):
+    return f"rentals_p{month:%Y_%m}"
+
+
+def is_partitioned():
+    if db.engine.dialect.name != "postgresql":
+        return False
+    return db.session.execute(sa.text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+        "WHERE partrelid = to_regclass('rentals'))"
+    )).scalar()
+
+
+def partitions():
+    """[(name, lower, upper)] of rentals' range partitions by lower bound; default excluded."""
+    rows = db.session.execute(sa.text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = 'rentals'::regclass"
+    )).all()
+    found = []
+    for name, bound in rows:
+        m = _BOUNDS.search(bound)
+        if m:
+            found.append((name, datetime.fromisoformat(m.group(1)),
+                          datetime.fromisoformat(m.group(2))))
+    return sorted(found, key=lambda p: p[1])
+
+
+# -- creating ------------------------------------------------------------------------
+
+def create_partition(month):
+    """
+    Attach the partition for month, moving its rows out of the default
+    partition first. Returns the number of rows moved. Runs in the caller's
+    transaction.
+    """
+    lo, hi = month, add_months(month, 1)
+    name   = partition_name(month)
+    # writers wait until the rows have moved and the partition is attached
+    db.session.execute(sa.text("LOCK TABLE rentals IN SHARE ROW EXCLUSIVE MODE"))
+    db.session.execute(sa.text(
+        f"CREATE TABLE {name} (LIKE rentals INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+    ))
+    moved = db.session.execute(sa.text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+        f"  WHERE start_date >= :lo AND start_date < :hi RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), {"lo": lo, "hi": hi}).rowcount
+    db.session.execute(sa.text(
+        f"ALTER TABLE rentals ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{lo:%Y-%m-%d}') TO ('{hi:%Y-%m-%d}')"
+    ))
+    if moved:
+        # the DELETE fired the trigger that clears active_rentals; restore the open ones
+        db.session.execute(sa.text(
+            "INSERT INTO active_rentals (rental_id, car_id, user_id) "
+            f"SELECT id, car_id, user_id FROM {name} WHERE end_date IS NULL"
+        ))
+    return moved
+
+
+def ensure_partitions(start, end):
+    """Create missing monthly partitions covering [start, end); returns their names."""
+    existing = {lo for _, lo, _ in partitions()}
+    created  = []
+    month    = month_start(start)
+    while month < end:
+        if month not in existing:
+            create_partition(month)
+            created.append(partition_name(month))
+        month = add_months(month, 1)
+    return created
+
+
+# -- archiving -----------------------------------------------------------------------
+
+def _write_parquet(table_name, path):
+    """
+    Stream a partition into a Parquet file; returns (rows, bytes). Rows are
+    clustered by merchant so row-group statistics let merchant lookups skip
+    most of the file.
+    """
+    pa, pq = _pyarrow()
+    schema = _schema(pa)
+    t      = sa.table(table_name, *(sa.column(c) for c in ARCHIVE_COLUMNS))
+    result = db.session.execute(
+        sa.select(*t.c).order_by(t.c.merchant_id, t.c.start_date, t.c.id)
+        .execution_options(stream_results=True)
+    )
+    rows, tmp = 0, path + ".tmp"
+    with pq.ParquetWriter(tmp, schema, compression="zstd") as writer:
+        for chunk in result.partitions(ROW_GROUP):
+            columns = list(zip(*chunk))
+            writer.write_table(pa.table(
+                [pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+                schema=schema,
+            ))
+            rows += len(chunk)
+    result.close()
+    with open(tmp, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return rows, os.path.getsize(path)
+
+
+def archive_partition(name, lo, hi, directory):
+    """
+    Archive, detach and drop one partition, then commit. Returns the
+    RentalArchive, or None if the partition still has an open rental.
+
+    The file is written while the partition is still attached. A SHARE lock
+    on the partition alone keeps its rows fixed without blocking reads of
+    rentals. The ACCESS EXCLUSIVE lock DETACH takes on rentals is held only
+    for the detach, the catalog insert and the drop.
+    """
+    db.session.execute(sa.text(f"LOCK TABLE {name} IN SHARE MODE"))
+    if db.session.execute(sa.text(
+        f"SELECT EXISTS (SELECT 1 FROM {name} WHERE end_date IS NULL)"
+    )).scalar():
+        db.session.rollback()
+        return None
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.abspath(os.path.join(directory, f"{name}.parquet"))
+    rows, size = _write_parquet(name, path)
+    try:
+        # don't queue behind long queries: a waiting ACCESS EXCLUSIVE blocks every new reader
+        db.session.execute(sa.text(f"SET LOCAL lock_timeout = '{DETACH_LOCK_TIMEOUT}'"))
+        db.session.execute(sa.text(f"ALTER TABLE rentals DETACH PARTITION {name}"))
+        archive = RentalArchive(partition_name=name, range_start=lo, range_end=hi,
+                                path=path, rows=rows, bytes=size)
+        db.session.add(archive)
+        db.session.execute(sa.text(f"DROP TABLE {name}"))
+        db.session.commit()
+    except sa.exc.SQLAlchemyError:
+        db.session.rollback()
+        os.remove(path)
+        raise
+    return archive
+
+
+_footers = {}   # (path, column) -> [(min, max)] per row group; archive files never change
+
+
+def _row_group_ranges(pq, path, column):
+    ranges = _footers.get((path, column))
+    if ranges is None:
+        meta  = pq.ParquetFile(path).metadata   # footer only
+        index = meta.schema.names.index(column)
+        ranges = []
+        for i in range(meta.num_row_groups):
+            stats = meta.row_group(i).column(index).statistics
+            ranges.append((stats.min, stats.max) if stats is not None and stats.has_min_max
+                          else (None, None))
+        _footers[(path, column)] = ranges
+    return ranges
+
+
+def _may_contain(pq, path, column, value):
+    return any(lo is None or lo <= value <= hi
+               for lo, hi in _row_group_ranges(pq, path, column))
+
+
+def read_archived(column, value, after=None, limit=20):
+    """
+    Archived rentals whose column equals value, ordered by (start_date, id)
+    and strictly after the cursor values, up to limit + 1 of them (one
+    extra, to tell whether there is a next page). Months before the cursor
+    are skipped by their range, and files whose row-group statistics rule
+    value out are never read.
+    """
+    _, pq    = _pyarrow()
+    archives = RentalArchive.query.order_by(RentalArchive.range_start)
+    filters  = [(column, "=", value)]
+    if after is not None:
+        archives = archives.filter(RentalArchive.range_end > after[0])
+        filters.append(("start_date", ">=", after[0]))
+
+    found = []
+    for archive in archives:
+        if not _may_contain(pq, archive.path, column, value):
+            continue
+        table = pq.read_table(archive.path, columns=list(ARCHIVE_COLUMNS), filters=filters)
+        # files are clustered by merchant; pages are by (start_date, id)
+        for rec in sorted(table.to_pylist(), key=lambda r: (r["start_date"], r["id"])):
+            if after is not None and (rec["start_date"], rec["id"]) <= tuple(after):
+                continue
+            found.append(ArchivedRental(**rec))
+            if len(found) > limit:
+                return found
+    return found
+
+
+def scan_archived(ended_since=None):
+    """
+    Every archived rental, one row group at a time (lists of ArchivedRental);
+    only those that ended on or after ended_since if given. Needs pyarrow
+    only if something has been archived.
+    """
+    archives = RentalArchive.query.order_by(RentalArchive.range_start).all()
+    if not archives:
+        return
+    _, pq = _pyarrow()
+    for archive in archives:
+        parquet = pq.ParquetFile(archive.path)
+        for i in range(parquet.num_row_groups):
+            rows = [ArchivedRental(**rec) for rec in parquet.read_row_group(i).to_pylist()
+                    if ended_since is None or rec["end_date"] >= ended_since]
+            if rows:
+                yield rows
+
+
+# -- CLI ------------------------------------------------------------------------------
+
+@partitions_cli.command("maintain")
+@click.option("--ahead", type=int, default=3, show_default=True,
+              help="Months of future partitions to keep ready.")
+@click.option("--archive-after", type=int, default=None,
+              help="Archive partitions ending this many months ago "
+                   "(default RENTALS_ARCHIVE_AFTER_MONTHS; 0 disables).")
+@click.option("--dry-run", is_flag=True, help="Only report what would be done.")
+def maintain_command(ahead, archive_after, dry_run):
+    """Create upcoming partitions and archive old ones."""
+    if not is_partitioned():
+        raise click.ClickException("rentals is not partitioned (PostgreSQL, migration e1f3a5c7b9d2)")
+    cfg = current_app.config
+    archive_after = cfg["RENTALS_ARCHIVE_AFTER_MONTHS"] if archive_after is None else archive_after
+    this_month = month_start(datetime.utcnow())
+
+    # 1) upcoming months
+    existing = {lo for _, lo, _ in partitions()}
+    missing  = [add_months(this_month, n) for n in range(ahead + 1)
+                if add_months(this_month, n) not in existing]
+    for month in missing:
+        if dry_run:
+            click.echo(f"would create {partition_name(month)}")
+            continue
+        moved = create_partition(month)
+        db.session.commit()
+        click.echo(f"created {partition_name(month)}"
+                   + (f" ({moved} rows moved from {DEFAULT_PARTITION})" if moved else ""))
+
+    # 2) old months
+    if not archive_after:
+        return
+    cutoff = add_months(this_month, -archive_after)
+    for name, lo, hi in partitions():
+        if hi > cutoff:
+            break
+        if dry_run:
+            click.echo(f"would archive {name}")
+            continue
+        try:
+            archive = archive_partition(name, lo, hi, cfg["RENTALS_ARCHIVE_DIR"])
+        except sa.exc.OperationalError as e:   # lock_timeout: retried on the next run
+            click.echo(f"kept {name}: {e.orig}")
+            continue
+        if archive is None:
+            click.echo(f"kept {name}: it still has an open rental")
+        else:
+            click.echo(f"archived {name}: {archive.rows} rows, {archive.bytes} bytes -> {archive.path}")
+
+
+@partitions_cli.command("list")
+def list_command():
+    """Live partitions and archived months."""
+    if is_partitioned():
+        for name, lo, hi in partitions():
+            click.echo(f"{name:24} {lo:%Y-%m-%d} .. {hi:%Y-%m-%d}")
+    for archive in RentalArchive.query.order_by(RentalArchive.range_start):
+        click.echo(f"{archive.partition_name:24} archived {archive.rows} rows -> {archive.path}")
@@ -0,0 +1,192 @@
+"""
+Query-plan checks for the hot routes (PostgreSQL).
+
+    flask plans check [--budget-factor 1.0] [--verbose]
+
+Every case in CASES is dispatched in-process, much like a POST /batch
+sub-request. The response cache is off and commits are deferred, so nothing
+a case writes survives. Each statement the handler sends to the database is
+captured and run through EXPLAIN (FORMAT JSON) twice:
+
+  * as the planner would run it, where the root's Total Cost must stay
+    within the case's budget (times --budget-factor), and
+  * with enable_seqscan off, where any Seq Scan still left on a GUARDED
+    table means no index can serve the query.
+
+The second pass makes the check independent of table size: on a small
+seeded database the planner prefers sequential scans anyway, and this
+still catches an index that went missing. Run it against a database loaded
+with `flask seed`. The command exits with status 1 if any case fails;
+tests/test_query_plans.py runs the same cases under pytest.
+"""
+import json
+from collections import namedtuple
+
+import click
+import sqlalchemy as sa
+from flask import current_app, g
+from flask.cli import AppGroup
+
+from app.auth import TokenUser
+from app.cache import response_cache
+from app.extensions import db
+from app.models import Rental
+
+plans_cli = AppGroup("plans", help="Query-plan regression checks.")
+
+# tables that must always be reached through an index; rentals' monthly
+# partitions (rentals_pYYYY_MM, rentals_default) count as rentals
+GUARDED = ("rentals", "cars", "users", "reservations", "active_rentals")
+
+Case = namedtuple("Case", "method path role budget body", defaults=(None,))
+
+# path placeholders: {merchant_id} {user_id} {car_id} {rental_id}
+CASES = (
+    Case("GET",  "/cars/cars?after=",                              "user",     100),
+    Case("GET",  "/cars/cars?page=5",                              "user",     5000),
+    Case("GET",  "/cars/cars?available=1&after=",                  "user",     500),
+    Case("GET",  "/cars/cars/search?q=corolla&max_rate=90",        "user",     2000),
+    Case("GET",  "/cars/merchants/{merchant_id}/cars?after=",      "user",     100),
+    Case("GET",  "/cars/merchants/{merchant_id}/cars",             "user",     500),
+    Case("GET",  "/rentals/merchants/me/rentals?after=",           "merchant", 100),
+    Case("GET",  "/rentals/merchants/me/rentals",                  "merchant", 2000),
+    Case("GET",  "/rentals/users/{user_id}/rentals?after=",        "user",     100),
+    Case("GET",  "/analytics/merchants/me/revenue",                "merchant", 200),
+    Case("POST", "/rentals/rentals",                               "user",     100,
+         {"car_id": "{car_id}"}),
+    Case("PUT",  "/rentals/{rental_id}/return",                    "user",     100),
+)
+
+Statement = namedtuple("Statement", "engine sql params")
+Finding   = namedtuple("Finding", "cost seq_scans sql")
+
+
+def _sample_ids():
+    """Ids for the path placeholders, taken from the loaded data."""
+    open_rental = (db.session.query(Rental.id, Rental.user_id, Rental.merchant_id, Rental.car_id)
+                   .filter(Rental.end_date.is_(None)).order_by(Rental.id).first())
+    if open_rental is None:
+        raise click.ClickException("no open rental to sample; load data with `flask seed` first")
+    db.session.rollback()
+    return {"rental_id": open_rental.id, "user_id": open_rental.user_id,
+            "merchant_id": open_rental.merchant_id, "car_id": open_rental.car_id}
+
+
+def _fill(value, ids):
+    if isinstance(value, dict):
+        return {k: _fill(v, ids) for k, v in value.items()}
+    if isinstance(value, str) and value.startswith("{") and value.endswith("}"):
+        return ids[value[1:-1]]
+    return value
+
+
+def _capture(case, ids):
+    """Dispatch case; returns (status, [Statement])."""
+    captured = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().split(None, 1)[0].upper() in ("SELECT", "INSERT", "UPDATE",
+                                                             "DELETE", "WITH"):
+            params = parameters[0] if executemany else parameters
+            captured.append(Statement(conn.engine, statement, params))
+
+    user_id = ids["merchant_id"] if case.role == "merchant" else ids["user_id"]
+    path    = case.path.format(**ids)
+    path, _, query = path.partition("?")
+    kwargs  = {"json": _fill(case.body, ids)} if case.body is not None else {}
+
+    engines = list(db.engines.values())
+    for engine in engines:
+        sa.event.listen(engine, "before_cursor_execute", listener)
+    g.batch_user = TokenUser(user_id, f"plans-{case.role}", case.role)
+    db.session.info["defer_commit"] = True
+    try:
+        with current_app.test_request_context(path, method=case.method,
+                                              query_string=query, **kwargs):
+            resp = current_app.full_dispatch_request()
+    finally:
+        db.session.info.pop("defer_commit", None)
+        db.session.rollback()
+        g.pop("batch_user", None)
+        for engine in engines:
+            sa.event.remove(engine, "before_cursor_execute", listener)
+    return resp.status_code, captured
+
+
+def _nodes(plan):
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from _nodes(child)
+
+
+def _guarded(relation):
+    return relation in GUARDED or relation.startswith("rentals_")
+
+
+def _explain(conn, statement):
+    raw = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement.sql,
+                               statement.params or None).scalar()
+    if isinstance(raw, str):
+        raw = json.loads(raw)
+    return raw[0]["Plan"]
+
+
+def explain(statement):
+    """Finding for one captured statement: planner cost and unavoidable seq scans."""
+    with statement.engine.connect() as conn:
+        cost = _explain(conn, statement)["Total Cost"]
+        conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        scans = sorted({node["Relation Name"] for node in _nodes(_explain(conn, statement))
+                        if node["Node Type"] == "Seq Scan" and _guarded(node["Relation Name"])})
+        conn.rollback()
+    return Finding(cost, scans, statement.sql)
+
+
+def check_case(case, ids, budget_factor=1.0):
+    """Dispatch and EXPLAIN one case; returns ([Finding], [problem])."""
+    status, statements = _capture(case, ids)
+    budget   = case.budget * budget_factor
+    findings = [explain(s) for s in statements]
+    problems = [f"seq scan on {', '.join(f.seq_scans)}: {f.sql}"
+                for f in findings if f.seq_scans]
+    problems += [f"cost {f.cost:.0f} over {budget:.0f}: {f.sql}"
+                 for f in findings if f.cost > budget]
+    if status >= 500:
+        problems.append(f"handler answered {status}")
+    if not statements:
+        problems.append(f"handler answered {status} without querying the database")
+    return findings, problems
+
+
+@plans_cli.command("check")
+@click.option("--budget-factor", type=float, default=1.0, show_default=True,
+              help="Scale every case's cost budget.")
+@click.option("--verbose", is_flag=True, help="Print each statement's cost.")
+def check_command(budget_factor, verbose):
+    """EXPLAIN the SQL of the hot routes; fail on seq scans or cost over budget."""
+    if db.engine.dialect.name != "postgresql":
+        raise click.ClickException("plans check needs PostgreSQL")
+
+    ids      = _sample_ids()
+    backend  = response_cache.backend
+    failures = 0
+    response_cache.backend = None   # every case must reach its handler
+    try:
+        for case in CASES:
+            findings, problems = check_case(case, ids, budget_factor)
+            worst = max((f.cost for f in findings), default=0)
+            click.echo(f"{'FAIL' if problems else 'ok':4}  {case.method:4} {case.path:48} "
+                       f"{len(findings)} statements, max cost {worst:.0f} / "
+                       f"{case.budget * budget_factor:.0f}")
+            if verbose:
+                for f in findings:
+                    click.echo(f"        {f.cost:10.1f}  {' '.join(f.sql.split())[:120]}")
+            for problem in problems:
+                click.echo(f"        {' '.join(problem.split())}")
+            failures += bool(problems)
+    finally:
+        response_cache.backend = backend
+
+    click.echo(f"{len(CASES) - failures}/{len(CASES)} cases within plan and budget")
+    if failures:
+        raise SystemExit(1)
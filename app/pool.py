@@ -0,0 +1,94 @@
+import os
+import threading
+import time
+import uuid
+
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import NullPool, QueuePool
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that also records how long checkouts wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts   = 0
+        self.timeouts    = 0
+        self.wait_total  = 0.0
+        self.wait_max    = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeout:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._stats_lock:
+                self.checkouts  += 1
+                self.wait_total += waited
+                self.wait_max    = max(self.wait_max, waited)
+
+
+def engine_options(env=os.environ, async_driver=False):
+    """
+    SQLAlchemy engine options from DB_POOL_* environment variables.
+
+    DB_POOL_CLASS=null disables pooling (one connection per checkout), which
+    is what you want behind PgBouncer in transaction mode. DB_PGBOUNCER=1 also
+    turns off server-side prepared statements (asyncpg only; psycopg2 never
+    prepares server-side).
+    """
+    opts = {
+        "pool_pre_ping": env.get("DB_POOL_PRE_PING", "1") == "1",
+        "pool_recycle":  int(env.get("DB_POOL_RECYCLE", "1800")),
+    }
+    if env.get("DB_POOL_CLASS", "queue") == "null":
+        opts["poolclass"] = NullPool
+    else:
+        if not async_driver:   # async engines need their own adapted pool class
+            opts["poolclass"] = TimedQueuePool
+        opts.update(
+            pool_size=int(env.get("DB_POOL_SIZE", "5")),
+            max_overflow=int(env.get("DB_MAX_OVERFLOW", "10")),
+            pool_timeout=float(env.get("DB_POOL_TIMEOUT", "30")),
+        )
+    if async_driver and env.get("DB_PGBOUNCER", "0") == "1":
+        opts["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            # unique names so a statement never collides on a shared server connection
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+    return opts
+
+
+def replica_binds(urls):
+    """SQLALCHEMY_BINDS entries ("replica0", ...) for comma-separated replica URLs."""
+    urls = [u.strip() for u in urls.split(",") if u.strip()]
+    return {f"replica{i}": url for i, url in enumerate(urls)}
+
+
+def pool_status(engine):
+    """Snapshot of this worker's pool: occupancy plus checkout wait times."""
+    pool   = engine.pool
+    status = {"pid": os.getpid(), "pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=max(pool.overflow(), 0),
+        )
+    if isinstance(pool, TimedQueuePool):
+        status.update(
+            checkouts=pool.checkouts,
+            timeouts=pool.timeouts,
+            wait_avg_ms=round(pool.wait_total / pool.checkouts * 1000, 3) if pool.checkouts else 0.0,
+            wait_max_ms=round(pool.wait_max * 1000, 3),
+        )
+    return status
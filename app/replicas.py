@@ -0,0 +1,146 @@
+"""
+Read-replica routing (opt-in: DATABASE_REPLICA_URLS).
+
+Each replica URL becomes a Flask-SQLAlchemy bind named "replica0",
+"replica1", and so on (app.pool.replica_binds). AppSession.get_bind asks read_engine() where a
+statement should go. A statement goes to a replica only when all of these hold:
+
+  * it runs during a GET or HEAD request whose caller is already authenticated
+    (credential lookups stay on the primary, so a user who just registered
+    can log in at once),
+  * it is a plain SELECT: not DML, not FOR UPDATE, and not part of a flush,
+  * that caller has not written anything in the last REPLICA_STICKY_SECONDS
+    (read-your-writes),
+  * at least one replica is healthy.
+
+A request keeps the replica it was given, so its reads see one snapshot.
+Replicas are picked round-robin. A replica that raises a connection error
+is skipped for REPLICA_RETRY_SECONDS. The request that hit the error still
+fails. The next ones avoid that replica.
+
+Sticky windows are flags in app.flags. With FLAGS_BACKEND=redis they hold
+across workers; with memory they are per worker. Responses built from
+replica reads are never stored in the response cache (app.cache): a
+lagging replica could otherwise file pre-write data under the version a
+write just bumped.
+"""
+import itertools
+import logging
+import threading
+import time
+
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.extensions import db
+from app.flags import flags
+
+log = logging.getLogger(__name__)
+
+READ_METHODS = ("GET", "HEAD")
+
+
+class ReplicaRouter:
+    def __init__(self):
+        self.keys       = []
+        self.retry      = 30   # seconds; REPLICA_RETRY_SECONDS
+        self.sticky_for = 5    # seconds; REPLICA_STICKY_SECONDS
+        self.down_until = {}   # bind key -> monotonic time it may be retried
+        self._next      = itertools.count()
+        self._lock      = threading.Lock()
+
+    # -- health ---------------------------------------------------------------------
+
+    def mark_down(self, key):
+        with self._lock:
+            self.down_until[key] = time.monotonic() + self.retry
+        log.warning("replica %s unavailable; reads go elsewhere for %ss", key, self.retry)
+
+    def healthy(self):
+        now = time.monotonic()
+        return [k for k in self.keys if self.down_until.get(k, 0) <= now]
+
+    def choose(self):
+        """The next healthy replica's bind key, round-robin; None if none is up."""
+        keys = self.healthy()
+        if not keys:
+            return None
+        return keys[next(self._next) % len(keys)]
+
+    def status(self):
+        now = time.monotonic()
+        return {
+            key: {"healthy": self.down_until.get(key, 0) <= now,
+                  "retry_in_s": round(max(self.down_until.get(key, 0) - now, 0), 1)}
+            for key in self.keys
+        }
+
+    # -- read-your-writes -------------------------------------------------------------
+
+    def stick(self, user_id):
+        flags.set(f"sticky:{user_id}", self.sticky_for)
+
+    def is_sticky(self, user_id):
+        return flags.is_set(f"sticky:{user_id}")
+
+
+router = ReplicaRouter()
+
+
+def _current_user():
+    return getattr(request, "current_user", None) if has_request_context() else None
+
+
+def read_engine(session):
+    """The replica engine for this session's reads, or None for the primary."""
+    if not router.keys or session.info.get("wrote"):
+        return None
+    key = session.info.get("read_bind")
+    if key is None:
+        if not has_request_context() or request.method not in READ_METHODS:
+            return None
+        user = _current_user()
+        if user is None or router.is_sticky(user.id):
+            return None   # not decided yet (auth lookup) or inside the sticky window
+        key = session.info["read_bind"] = router.choose()
+        if key is None:
+            return None
+    return db.engines[key]
+
+
+def is_write(clause):
+    return clause is not None and (
+        getattr(clause, "is_dml", False) or getattr(clause, "_for_update_arg", None) is not None
+    )
+
+
+@event.listens_for(Session, "after_commit")
+def _stick_writer(session):
+    # the caller's next reads go to the primary until replicas have caught up
+    if session.info.pop("wrote", False) and router.keys:
+        session.info.pop("read_bind", None)
+        user = _current_user()
+        if user is not None:
+            router.stick(user.id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_writes(session):
+    session.info.pop("wrote", None)
+
+
+def _on_error(key):
+    def handle_error(ctx):
+        if ctx.is_disconnect or ctx.connection is None:   # lost, or never connected
+            router.mark_down(key)
+    return handle_error
+
+
+def init_app(app):
+    router.keys       = sorted(k for k in app.config["SQLALCHEMY_BINDS"] if k.startswith("replica"))
+    router.retry      = app.config["REPLICA_RETRY_SECONDS"]
+    router.sticky_for = app.config["REPLICA_STICKY_SECONDS"]
+    with app.app_context():
+        for key in router.keys:
+            event.listen(db.engines[key], "handle_error", _on_error(key))
@@ -0,0 +1,206 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+import click
+import sqlalchemy as sa
+from flask.cli import AppGroup
+
+from app.extensions import db
+from app.models import CarDailyStats, MerchantDailyStats, Rental
+from app.partitions import scan_archived
+from app.utils import dialect_insert
+
+CENT          = Decimal("0.01")
+REBUILD_CHUNK = 10000   # closed rentals folded per rollup upsert
+
+rollups_cli = AppGroup("rollups", help="Merchant revenue and utilization rollups.")
+
+
+def _upsert(model, keys, rows):
+    if not rows:
+        return
+    t    = model.__table__
+    stmt = dialect_insert(t).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={
+            "revenue":        t.c.revenue        + stmt.excluded.revenue,
+            "rentals":        t.c.rentals        + stmt.excluded.rentals,
+            "rented_seconds": t.c.rented_seconds + stmt.excluded.rented_seconds,
+        },
+    )
+    db.session.execute(stmt)
+
+
+def daily_seconds(start, end):
+    """[(day, seconds)] of [start, end) split at UTC midnights."""
+    spans = []
+    day   = start.date()
+    while True:
+        midnight = datetime.combine(day + timedelta(days=1), time.min)
+        seconds  = int((min(end, midnight) - max(start, datetime.combine(day, time.min)))
+                       .total_seconds())
+        if seconds > 0:
+            spans.append((day, seconds))
+        if end <= midnight:
+            return spans
+        day += timedelta(days=1)
+
+
+def _fold(merchant, car, r, since=None):
+    """Add r's rented seconds to the per-day accumulators (days >= since only)."""
+    for day, seconds in daily_seconds(r.start_date, r.end_date):
+        if since is not None and day < since:
+            continue
+        merchant[(r.merchant_id, day)][2] += seconds
+        if r.car_id is not None:
+            car[(r.car_id, day, r.merchant_id)][2] += seconds
+
+
+def _fold_closed(merchant, car, r, since=None):
+    """Add closed rental r: revenue and count on its closing day, time per day."""
+    day     = r.end_date.date()
+    fee     = Decimal(str(r.fee)).quantize(CENT) if r.fee is not None else Decimal(0)
+    targets = [merchant[(r.merchant_id, day)]]
+    if r.car_id is not None:
+        targets.append(car[(r.car_id, day, r.merchant_id)])
+    for acc in targets:
+        acc[0] += fee
+        acc[1] += 1
+    _fold(merchant, car, r, since)
+
+
+def _rows(merchant, car):
+    # sorted so concurrent closers lock rollup rows in the same order
+    return (
+        [{"merchant_id": m, "day": d, "revenue": v[0], "rentals": v[1], "rented_seconds": v[2]}
+         for (m, d), v in sorted(merchant.items())],
+        [{"car_id": c, "day": d, "merchant_id": m,
+          "revenue": v[0], "rentals": v[1], "rented_seconds": v[2]}
+         for (c, d, m), v in sorted(car.items())],
+    )
+
+
+def record_closed_rentals(rentals):
+    """
+    Fold just-closed rentals into the daily rollups.
+
+    Runs in the caller's transaction, so the rollups commit or roll back with
+    the rental itself. Each item needs merchant_id, car_id, start_date,
+    end_date and fee. Revenue and count go to the closing day; rented time
+    is spread over the days the rental covered, so utilization over short
+    windows stays within the time actually rented.
+    """
+    merchant = defaultdict(lambda: [Decimal(0), 0, 0])
+    car      = defaultdict(lambda: [Decimal(0), 0, 0])
+    for r in rentals:
+        _fold_closed(merchant, car, r)
+
+    merchant_rows, car_rows = _rows(merchant, car)
+    _upsert(MerchantDailyStats, ["merchant_id", "day"], merchant_rows)
+    _upsert(CarDailyStats, ["car_id", "day"], car_rows)
+
+
+def record_fee_adjustments(changes):
+    """
+    Apply repriced fees to the rollups' revenue.
+
+    changes is an iterable of (merchant_id, car_id, end_date, delta) where
+    delta is the Decimal change of one closed rental's fee. Counts and
+    durations are left alone.
+    """
+    merchant = defaultdict(Decimal)
+    car      = defaultdict(Decimal)
+    for merchant_id, car_id, end_date, delta in changes:
+        merchant[(merchant_id, end_date.date())] += delta
+        if car_id is not None:
+            car[(car_id, end_date.date(), merchant_id)] += delta
+
+    _upsert(MerchantDailyStats, ["merchant_id", "day"], [
+        {"merchant_id": m, "day": d, "revenue": v, "rentals": 0, "rented_seconds": 0}
+        for (m, d), v in sorted(merchant.items())
+    ])
+    _upsert(CarDailyStats, ["car_id", "day"], [
+        {"car_id": c, "day": d, "merchant_id": m, "revenue": v, "rentals": 0, "rented_seconds": 0}
+        for (c, d, m), v in sorted(car.items())
+    ])
+
+
+def rebuild_rollups(since=None):
+    """
+    Recompute the rollups from rentals (all history, or days >= since).
+    Months archived by app.partitions are no longer in rentals; their
+    rentals are read back from the archive files and folded in.
+    """
+    r   = Rental.__table__
+    day = sa.cast(r.c.end_date, sa.Date)
+    closed = [r.c.end_date.isnot(None)]
+    if since is not None:
+        closed.append(r.c.end_date >= since)
+
+    for model in (MerchantDailyStats, CarDailyStats):
+        delete = sa.delete(model.__table__)
+        if since is not None:
+            delete = delete.where(model.__table__.c.day >= since.date())
+        db.session.execute(delete)
+
+    # revenue and counts by closing day in SQL; rented time is spread below
+    aggregates = (
+        sa.func.coalesce(sa.func.sum(r.c.fee), 0),
+        sa.func.count(),
+        sa.literal(0),
+    )
+    db.session.execute(
+        sa.insert(MerchantDailyStats.__table__).from_select(
+            ["merchant_id", "day", "revenue", "rentals", "rented_seconds"],
+            sa.select(r.c.merchant_id, day, *aggregates)
+            .where(*closed)
+            .group_by(r.c.merchant_id, day),
+        )
+    )
+    # rentals whose car was deleted only count towards the merchant totals
+    db.session.execute(
+        sa.insert(CarDailyStats.__table__).from_select(
+            ["car_id", "day", "merchant_id", "revenue", "rentals", "rented_seconds"],
+            sa.select(r.c.car_id, day, sa.func.min(r.c.merchant_id), *aggregates)
+            .where(*closed, r.c.car_id.isnot(None))
+            .group_by(r.c.car_id, day),
+        )
+    )
+
+    # a rental closed on or after since may have started before it; only its
+    # days from since on are rebuilt
+    result = db.session.execute(
+        sa.select(r.c.merchant_id, r.c.car_id, r.c.start_date, r.c.end_date)
+        .where(*closed)
+        .execution_options(stream_results=True)
+    )
+    for chunk in result.partitions(REBUILD_CHUNK):
+        merchant = defaultdict(lambda: [Decimal(0), 0, 0])
+        car      = defaultdict(lambda: [Decimal(0), 0, 0])
+        for row in chunk:
+            _fold(merchant, car, row, since.date() if since is not None else None)
+        merchant_rows, car_rows = _rows(merchant, car)
+        _upsert(MerchantDailyStats, ["merchant_id", "day"], merchant_rows)
+        _upsert(CarDailyStats, ["car_id", "day"], car_rows)
+    result.close()
+
+    for chunk in scan_archived(since):
+        merchant = defaultdict(lambda: [Decimal(0), 0, 0])
+        car      = defaultdict(lambda: [Decimal(0), 0, 0])
+        for row in chunk:
+            _fold_closed(merchant, car, row, since.date() if since is not None else None)
+        merchant_rows, car_rows = _rows(merchant, car)
+        _upsert(MerchantDailyStats, ["merchant_id", "day"], merchant_rows)
+        _upsert(CarDailyStats, ["car_id", "day"], car_rows)
+    db.session.commit()
+
+
+@rollups_cli.command("rebuild")
+@click.option("--since", type=click.DateTime(formats=["%Y-%m-%d"]), default=None,
+              help="Only rebuild days on or after this date (backfill).")
+def rebuild_command(since):
+    """Rebuild the daily rollups from the rentals table and its archives."""
+    rebuild_rollups(since)
+    click.echo("rollups rebuilt" + (f" since {since.date()}" if since else ""))
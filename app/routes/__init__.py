@@ -1,6 +1,10 @@
 # so that 'from app.routes import cars_bp' works
 from .cars    import cars_bp
 from .rentals import rentals_bp
+from .analytics import analytics_bp
+from .ops import ops_bp
+from .reservations import reservations_bp
+from .batch import batch_bp
 
 
-__all__ = ["cars_bp", "rentals_bp"]
+__all__ = ["cars_bp", "rentals_bp", "analytics_bp", "ops_bp", "reservations_bp", "batch_bp"]
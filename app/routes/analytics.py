@@ -0,0 +1,105 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import sqlalchemy as sa
+from flask import Blueprint, request, jsonify
+from app.auth import basic_auth_required, roles_required
+from app.extensions import db
+from app.models import Car, CarDailyStats, MerchantDailyStats
+
+analytics_bp = Blueprint('analytics', __name__)
+
+
+def _date_range():
+    """Parse ?from=&to= (YYYY-MM-DD, inclusive); defaults to the last 30 days."""
+    to    = request.args.get('to')
+    start = request.args.get('from')
+    to    = datetime.strptime(to, '%Y-%m-%d').date() if to else date.today()
+    start = datetime.strptime(start, '%Y-%m-%d').date() if start else to - timedelta(days=29)
+    return start, to
+
+
+# Revenue and rental counts per day or month for the authenticated merchant
+@analytics_bp.route('/merchants/me/revenue', methods=['GET'])
+@basic_auth_required
+@roles_required('merchant')
+def merchant_revenue():
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in ('day', 'month'):
+        return jsonify({'error': 'granularity must be day or month'}), 400
+    try:
+        start, to = _date_range()
+    except ValueError:
+        return jsonify({'error': 'from/to must be YYYY-MM-DD'}), 400
+
+    s = MerchantDailyStats
+    rows = (
+        db.session.query(s.day, s.revenue, s.rentals)
+        .filter(s.merchant_id == request.current_user.id, s.day.between(start, to))
+        .order_by(s.day)
+        .all()
+    )
+
+    # one row per day at most, so folding into months here is O(days)
+    periods = {}
+    for day, revenue, rentals in rows:
+        key = day.isoformat() if granularity == 'day' else day.strftime('%Y-%m')
+        acc = periods.setdefault(key, [Decimal(0), 0])
+        acc[0] += revenue
+        acc[1] += rentals
+
+    return jsonify({
+        'from':        start.isoformat(),
+        'to':          to.isoformat(),
+        'granularity': granularity,
+        'items': [
+            {'period': key, 'revenue': str(revenue), 'rentals': rentals}
+            for key, (revenue, rentals) in periods.items()
+        ],
+        'total_revenue': str(sum((v[0] for v in periods.values()), Decimal(0))),
+    })
+
+
+# Rentals, revenue and utilization per car plus fleet totals
+@analytics_bp.route('/merchants/me/utilization', methods=['GET'])
+@basic_auth_required
+@roles_required('merchant')
+def merchant_utilization():
+    try:
+        start, to = _date_range()
+    except ValueError:
+        return jsonify({'error': 'from/to must be YYYY-MM-DD'}), 400
+    merchant_id  = request.current_user.id
+    span_seconds = ((to - start).days + 1) * 86400
+
+    s = CarDailyStats
+    rows = (
+        db.session.query(
+            s.car_id,
+            sa.func.sum(s.revenue),
+            sa.func.sum(s.rentals),
+            sa.func.sum(s.rented_seconds),
+        )
+        .filter(s.merchant_id == merchant_id, s.day.between(start, to))
+        .group_by(s.car_id)
+        .order_by(s.car_id)
+        .all()
+    )
+    fleet_size = Car.query.filter_by(merchant_id=merchant_id).count()
+    busy       = sum(int(r[3]) for r in rows)
+
+    return jsonify({
+        'from':       start.isoformat(),
+        'to':         to.isoformat(),
+        'fleet_size': fleet_size,
+        'utilization': round(busy / (fleet_size * span_seconds), 4) if fleet_size else None,
+        'cars': [
+            {
+                'car_id':      car_id,
+                'revenue':     str(revenue),
+                'rentals':     int(rentals),
+                'utilization': round(min(int(seconds) / span_seconds, 1.0), 4),
+            }
+            for car_id, revenue, rentals, seconds in rows
+        ],
+    })
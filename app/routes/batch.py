@@ -0,0 +1,114 @@
+from urllib.parse import urlsplit
+
+from flask import Blueprint, current_app, g, request, jsonify
+from werkzeug.exceptions import HTTPException
+from app.auth import TokenUser, basic_auth_required
+from app.extensions import db
+
+batch_bp = Blueprint('batch', __name__)
+
+BATCH_METHODS = ('GET', 'POST', 'PUT', 'DELETE')
+
+
+def _validate(ops):
+    """Return an error message for a malformed batch, else None."""
+    if not isinstance(ops, list) or not ops:
+        return 'requests must be a non-empty list'
+    if len(ops) > current_app.config['BATCH_MAX_REQUESTS']:
+        return f"at most {current_app.config['BATCH_MAX_REQUESTS']} requests per batch"
+
+    adapter = current_app.url_map.bind('')
+    for n, op in enumerate(ops):
+        if not isinstance(op, dict) or not isinstance(op.get('path'), str):
+            return f'requests[{n}]: path required'
+        method = str(op.get('method', 'GET')).upper()
+        if method not in BATCH_METHODS:
+            return f'requests[{n}]: method must be one of {", ".join(BATCH_METHODS)}'
+        try:
+            endpoint, _ = adapter.match(urlsplit(op['path']).path, method=method)
+        except HTTPException:
+            return f'requests[{n}]: no route for {method} {op["path"]}'
+        if (endpoint.split('.')[0] not in current_app.config['BATCH_BLUEPRINTS']
+                or endpoint in current_app.config['BATCH_EXCLUDED_ENDPOINTS']):
+            return f'requests[{n}]: {endpoint} cannot be batched'
+    return None
+
+
+def _run(op):
+    """Dispatch one sub-request in-process; returns (status, body)."""
+    parts  = urlsplit(op['path'])
+    method = str(op.get('method', 'GET')).upper()
+    kwargs = {'json': op['body']} if 'body' in op else {}
+    with current_app.test_request_context(
+        parts.path, method=method, query_string=parts.query,
+        base_url=request.host_url, **kwargs
+    ):
+        try:
+            resp = current_app.full_dispatch_request()
+        except Exception:
+            current_app.logger.exception('batch sub-request %s %s failed', method, op['path'])
+            return 500, {'error': 'internal error'}
+    body = resp.get_json(silent=True)
+    if body is None and resp.status_code != 204:
+        body = resp.get_data(as_text=True)
+    return resp.status_code, body
+
+
+# Run several cars/rentals requests in one call (and optionally one transaction)
+@batch_bp.route('/batch', methods=['POST'])
+@basic_auth_required
+def batch():
+    """
+    Body: {"requests": [{"method": "POST", "path": "/rentals/rentals",
+                         "body": {...}}, ...], "atomic": false}
+
+    Sub-requests run in order as the authenticated caller, without re-checking
+    credentials. With atomic=true they share one transaction, each in its
+    own savepoint (see AppSession), so a view's own rollback only undoes
+    itself. The first response with status >= 400 stops the batch, and
+    everything is rolled back. Otherwise each sub-request commits on its own, as if it had been
+    sent separately.
+    """
+    data   = request.get_json(silent=True) or {}
+    ops    = data.get('requests')
+    atomic = data.get('atomic') is True
+    error  = _validate(ops)
+    if error:
+        return jsonify({'error': error}), 400
+
+    user = request.current_user
+    outer_timing = g.pop('_timing', None)     # sub-requests keep their own metrics
+    g.batch_user = TokenUser(user.id, user.username, user.role)
+    if atomic:
+        db.session.info['defer_commit'] = True
+
+    responses, failed = [], False
+    try:
+        for op in ops:
+            if failed:
+                responses.append({'status': None, 'skipped': True})
+                continue
+            if atomic:
+                db.session().begin_step()   # the scoped_session proxy doesn't forward it
+            status, body = _run(op)
+            responses.append({'status': status, 'body': body})
+            if atomic and status >= 400:
+                failed = True   # the whole transaction is rolled back below
+            elif atomic:
+                db.session().end_step()
+            else:
+                db.session.rollback()   # drop anything a failed view left behind
+    finally:
+        g.pop('batch_user', None)
+        db.session.info.pop('step', None)
+        db.session.info.pop('defer_commit', None)
+        if outer_timing is not None:
+            g._timing = outer_timing
+
+    committed = not atomic or not failed
+    if atomic:
+        if failed:
+            db.session.rollback()
+        else:
+            db.session.commit()
+    return jsonify({'atomic': atomic, 'committed': committed, 'responses': responses}), 200
@@ -1,21 +1,101 @@
-from flask import Blueprint, request, jsonify, url_for
+import csv
+import json
+import sqlalchemy as sa
+from decimal import Decimal, InvalidOperation
+from flask import Blueprint, current_app, request, jsonify, url_for
+from app import availability
 from app.auth import basic_auth_required, roles_required
+from app.cache import ALL_CARS, cached_response, invalidate_cars, merchant_scope
 from app.models import Car, Rental
 from app.extensions import db
-from app.utils import paginate_query
-from datetime import datetime
+from app.fleet import retire_cars
+from app.utils import dialect_insert, paginate_query
 
 cars_bp = Blueprint('cars', __name__)
 
 
 
 
-# List all cars
+def _available_only():
+    return request.args.get('available', '0') in ('1', 'true')
+
+
+# List all cars (?available=1: only cars without an open rental)
 @cars_bp.route('/cars', methods=['GET'])
 @basic_auth_required
+@cached_response(lambda: None if _available_only() else [ALL_CARS])
 def list_cars():
-    q = Car.query
-    return jsonify(paginate_query(q, 'cars.list_cars'))
+    q = Car.listing_query()
+    if not _available_only():
+        return jsonify(paginate_query(q, 'cars.list_cars', serializer=Car.row_to_dict))
+
+    busy = availability.index.busy_ids() if availability.index.ready else None
+    if busy is not None:
+        # few busy cars: a short NOT IN list, no scan of rentals
+        q = q.filter(Car.id.notin_(busy))
+    else:
+        q = q.filter(~sa.exists().where(Rental.car_id == Car.id, Rental.end_date.is_(None)))
+    return jsonify(paginate_query(q, 'cars.list_cars', serializer=Car.row_to_dict, available=1))
+
+SEARCH_ARGS = ('q', 'min_rate', 'max_rate', 'merchant_id', 'available')
+
+
+def _decimal_arg(name):
+    value = request.args.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        return False
+
+
+# Search cars: fuzzy model match, rate range, merchant and "available now"
+@cars_bp.route('/cars/search', methods=['GET'])
+@basic_auth_required
+def search_cars():
+    term     = (request.args.get('q') or '').strip()
+    min_rate = _decimal_arg('min_rate')
+    max_rate = _decimal_arg('max_rate')
+    if min_rate is False or max_rate is False:
+        return jsonify({'error': 'min_rate/max_rate must be numbers'}), 400
+    merchant_id = request.args.get('merchant_id', type=int)
+    available   = request.args.get('available', '0') in ('1', 'true')
+
+    q = Car.listing_query()
+    if term:
+        if 'after' in request.args:
+            return jsonify({'error': 'cursor pagination is not available with q'}), 400
+        escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        contains = Car.model.ilike(f'%{escaped}%', escape='\\')
+        if db.engine.dialect.name == 'postgresql':
+            # substring or trigram-similar (pg_trgm "%"), best matches first;
+            # both are served by the GIN trigram index on cars.model
+            similar = sa.text('cars.model % :q').bindparams(q=term)
+            q = q.filter(sa.or_(contains, similar)).order_by(
+                sa.func.similarity(Car.model, term).desc()
+            )
+        else:
+            q = q.filter(contains)
+    if min_rate is not None:
+        q = q.filter(Car.daily_rate >= min_rate)
+    if max_rate is not None:
+        q = q.filter(Car.daily_rate <= max_rate)
+    if merchant_id is not None:
+        q = q.filter(Car.merchant_id == merchant_id)
+    if available:
+        # anti-join against the partial unique index on open rentals
+        q = q.filter(~sa.exists().where(
+            Rental.car_id == Car.id, Rental.end_date.is_(None)
+        ))
+
+    return jsonify(paginate_query(
+        q,
+        'cars.search_cars',
+        serializer=Car.row_to_dict,
+        default_count='estimate',
+        **{k: v for k, v in request.args.items() if k in SEARCH_ARGS}
+    ))
 
 # Create car
 @cars_bp.route('/cars', methods=['POST'])
@@ -30,10 +110,131 @@ def create_car():
         return jsonify({'error':'plate exists'}),400
     car = Car(model=model, plate=plate, daily_rate=rate, merchant_id=request.current_user.id)
     db.session.add(car)
+    invalidate_cars(car.merchant_id)
     db.session.commit()
     return jsonify(car.to_dict()),201
 
 
+def _bulk_records(fmt):
+    """Yield (row_number, record) from the request body without buffering it."""
+    # invalid bytes survive as lone surrogates; _bulk_validate rejects that row
+    lines = (raw.decode('utf-8', 'surrogateescape') for raw in request.stream)
+    if fmt == 'csv':
+        yield from enumerate(csv.DictReader(lines), start=1)
+        return
+    n = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        n += 1
+        try:
+            yield n, json.loads(line)
+        except ValueError:
+            yield n, None
+
+
+def _bulk_validate(rec, merchant_id):
+    """Return (row values, None) or (None, error message)."""
+    if not isinstance(rec, dict):
+        return None, 'invalid row'
+    model, plate, rate = rec.get('model'), rec.get('plate'), rec.get('daily_rate')
+    if not all([model, plate, rate]):
+        return None, 'model, plate and daily_rate required'
+    model, plate = str(model), str(plate)
+    try:
+        model.encode('utf-8'), plate.encode('utf-8')
+    except UnicodeEncodeError:
+        return None, 'invalid UTF-8'
+    if len(model) > 120 or len(plate) > 20:
+        return None, 'model or plate too long'
+    try:
+        rate = Decimal(str(rate))
+    except InvalidOperation:
+        return None, 'invalid daily_rate'
+    if not rate.is_finite() or not 0 <= rate < 10 ** 8:
+        return None, 'invalid daily_rate'
+    return {'model': model, 'plate': plate, 'daily_rate': rate, 'merchant_id': merchant_id}, None
+
+
+def _bulk_error(report, n, message):
+    # count every failure but keep the listing bounded for huge bad uploads
+    report['failed'] += 1
+    if len(report['errors']) < current_app.config['BULK_IMPORT_MAX_ERRORS']:
+        report['errors'].append({'row': n, 'error': message})
+    else:
+        report['errors_truncated'] = True
+
+
+def _bulk_insert(chunk, report):
+    """Insert one chunk set-wise; plates already taken are reported, not raised."""
+    batch, seen = [], set()
+    for n, values in chunk:
+        if values['plate'] in seen:
+            _bulk_error(report, n, 'duplicate plate in upload')
+            continue
+        seen.add(values['plate'])
+        batch.append((n, values))
+    if not batch:
+        return
+
+    # one round trip per chunk; the cars.plate unique constraint decides
+    stmt = (
+        dialect_insert(Car.__table__)
+        .values([values for _, values in batch])
+        .on_conflict_do_nothing(index_elements=['plate'])
+        .returning(Car.__table__.c.id, Car.__table__.c.plate)
+    )
+    rows     = db.session.execute(stmt).all()
+    inserted = {r.plate for r in rows}
+    if inserted:
+        merchant_id = batch[0][1]['merchant_id']
+        invalidate_cars(merchant_id)
+        availability.record(*[('car', r.id, merchant_id) for r in rows])
+    for n, values in batch:
+        if values['plate'] not in inserted:
+            _bulk_error(report, n, 'plate exists')
+    report['inserted'] += len(inserted)
+
+
+# Bulk-create cars from a streamed CSV (header: model,plate,daily_rate) or NDJSON body
+@cars_bp.route('/cars/bulk', methods=['POST'])
+@basic_auth_required
+@roles_required('merchant')
+def bulk_create_cars():
+    fmt = request.args.get('format') or (
+        'csv' if request.mimetype == 'text/csv' else 'ndjson'
+    )
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    chunk_size = request.args.get(
+        'chunk_size', current_app.config['BULK_IMPORT_CHUNK_SIZE'], type=int
+    )
+    chunk_size = max(1, min(chunk_size, 5000))
+    atomic      = request.args.get('atomic', '0') in ('1', 'true')
+    merchant_id = request.current_user.id
+
+    report = {'rows': 0, 'inserted': 0, 'failed': 0, 'errors': [], 'errors_truncated': False}
+    chunk  = []
+    for n, rec in _bulk_records(fmt):
+        report['rows'] += 1
+        values, error = _bulk_validate(rec, merchant_id)
+        if error:
+            _bulk_error(report, n, error)
+            continue
+        chunk.append((n, values))
+        if len(chunk) >= chunk_size:
+            _bulk_insert(chunk, report)
+            chunk = []
+            if not atomic:
+                db.session.commit()
+    _bulk_insert(chunk, report)
+    db.session.commit()
+
+    # duplicates are found per chunk, after later rows' validation errors
+    report['errors'].sort(key=lambda e: e['row'])
+    return jsonify(report), 201 if report['inserted'] else 400
+
+
 @cars_bp.route("/cars/<int:car_id>", methods=["PUT"])
 @basic_auth_required
 @roles_required("merchant")
@@ -55,6 +256,7 @@ def update_car(car_id):
     if "daily_rate" in data:
         car.daily_rate = data["daily_rate"]
 
+    invalidate_cars(car.merchant_id)
     db.session.commit()
     return jsonify({
         "id":         car.id,
@@ -73,33 +275,47 @@ def delete_car(car_id):
     if car.merchant_id != request.current_user.id:
         return jsonify({"error": "forbidden"}), 403
 
-    # 1) Close out any active rental
-    active = Rental.query.filter_by(car_id=car.id, end_date=None).first()
-    if active:
-        active.end_date = datetime.utcnow()
-        active.fee = active.calculate_fee()
-        db.session.commit()  # persist the end/fee
+    # close any active rental, detach history and delete, in one transaction
+    retire_cars(car.merchant_id, car_ids=[car.id])
+    return "", 204
 
-    # 2) Now drop the car — rental.car_id will be set to NULL automatically
-    db.session.delete(car)
-    db.session.commit()
 
-    return "", 204
+# Retire many cars at once: {"car_ids": [...]}, {"model": "..."} or {"all": true}
+@cars_bp.route("/cars/retire", methods=["POST"])
+@basic_auth_required
+@roles_required("merchant")
+def retire_fleet():
+    data    = request.get_json(silent=True) or {}
+    car_ids = data.get("car_ids")
+    model   = data.get("model")
+    if car_ids is not None and (
+        not isinstance(car_ids, list)
+        or not all(isinstance(i, int) and not isinstance(i, bool) for i in car_ids)
+    ):
+        return jsonify({"error": "car_ids must be a list of integers"}), 400
+    if model is not None and not isinstance(model, str):
+        return jsonify({"error": "model must be a string"}), 400
+    if not car_ids and model is None and data.get("all") is not True:
+        return jsonify({"error": "give car_ids, model or all: true"}), 400
+
+    return jsonify(retire_cars(request.current_user.id, car_ids or None, model))
 
 
 # List all cars for a specific merchant (anyone can view)
 @cars_bp.route("/merchants/<int:merchant_id>/cars", methods=["GET"])
 @basic_auth_required
+@cached_response(lambda merchant_id: [merchant_scope(merchant_id)])
 def merchant_cars(merchant_id):
     """
     List all cars for the given merchant_id, paginated.
     Anyone with Basic-Auth (user or merchant) may view.
     """
-    q = Car.query.filter_by(merchant_id=merchant_id)
+    q = Car.listing_query().filter(Car.merchant_id == merchant_id)
     return jsonify(
         paginate_query(
             q,
-            "merchant_cars",
+            "cars.merchant_cars",
+            serializer=Car.row_to_dict,
             merchant_id=merchant_id
         )
     )
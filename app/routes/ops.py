@@ -0,0 +1,38 @@
+from flask import Blueprint, Response, jsonify
+from app.extensions import db
+from app.metrics import registry
+from app.pool import pool_status
+from app.replicas import router
+
+ops_bp = Blueprint('ops', __name__)
+
+POOL_COUNTERS = ('checkouts', 'timeouts')   # only ever go up; the rest are gauges
+
+
+# Connection pool stats for the worker that serves the request
+@ops_bp.route('/health/pool', methods=['GET'])
+def pool_health():
+    return jsonify(pool_status(db.engine))
+
+
+# Read replicas this worker routes GET requests to, and which are skipped
+@ops_bp.route('/health/replicas', methods=['GET'])
+def replica_health():
+    return jsonify({
+        'replicas': {key: {**state, **pool_status(db.engines[key])}
+                     for key, state in router.status().items()},
+        'sticky_seconds': router.sticky_for,
+    })
+
+
+# Prometheus text exposition for this worker, pool gauges and counters included
+@ops_bp.route('/metrics', methods=['GET'])
+def metrics():
+    lines = [registry.render()]
+    for name, value in pool_status(db.engine).items():
+        if isinstance(value, (int, float)) and name != 'pid':
+            if name in POOL_COUNTERS:
+                lines.append(f'# TYPE db_pool_{name}_total counter\ndb_pool_{name}_total {value}\n')
+            else:
+                lines.append(f'# TYPE db_pool_{name} gauge\ndb_pool_{name} {value}\n')
+    return Response(''.join(lines), mimetype='text/plain; version=0.0.4')
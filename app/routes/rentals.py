@@ -1,10 +1,20 @@
-from flask import Blueprint, request, jsonify, url_for
+import csv
+import io
+import json
+import sqlalchemy as sa
+from flask import (Blueprint, Response, current_app, request, jsonify,
+                   stream_with_context, url_for)
+from sqlalchemy.exc import IntegrityError
+from app import availability, outbox
 from app.auth import basic_auth_required, roles_required
 from app.extensions import db
-from datetime import datetime
-from sqlalchemy.orm import joinedload
-from app.utils import paginate_query
-from app.models import Car, User, Rental
+from datetime import datetime, timedelta
+from app.fees import fee_sql, recompute_fees
+from app.partitions import read_archived
+from app.utils import decode_cursor, encode_cursor, paginate_query, violated_constraint
+from app.models import Car, User, Rental, Reservation
+from app.rollups import record_closed_rentals
+from app.timeline import after_commit
 
 
 rentals_bp = Blueprint('rentals', __name__)
@@ -19,34 +29,64 @@ def create_rental():
     if not car_id:
         return jsonify({'error': 'car_id required'}), 400
 
-    # 1) one active rental per user
-    active = Rental.query.filter_by(
-        user_id=request.current_user.id,
-        end_date=None
-    ).first()
-    if active:
-        return jsonify({'error': 'already have active', 'rental_id': active.id}), 400
-
-    # 2) car must be free
-    busy = Rental.query.filter_by(car_id=car_id, end_date=None).first()
-    if busy:
-        return jsonify({'error': 'car busy', 'rental_id': busy.id}), 400
-
-    # 3) load the Car so we can get its merchant_id
-    car = Car.query.get_or_404(car_id)
-
-    # 4) create the rental including merchant_id
-    r = Rental(
-        user_id=request.current_user.id,
-        car_id=car_id,
-        merchant_id=car.merchant_id
+    # the availability index (when enabled) answers "busy" without a query
+    busy_rental = availability.index.open_rental(car_id) if isinstance(car_id, int) else None
+    if busy_rental is not None:
+        return jsonify({'error': 'car busy', 'rental_id': busy_rental}), 400
+
+    uid = request.current_user.id
+    now = datetime.utcnow()
+    rentals, cars, res = Rental.__table__, Car.__table__, Reservation.__table__
+
+    # One round trip: copy merchant_id from the car while inserting. The partial
+    # unique indexes on open rentals reject a second active rental for the user
+    # or the car, even when requests race. A car reserved by someone else right
+    # now is skipped; the holder of the reservation may pick it up.
+    reserved_now = sa.exists().where(
+        res.c.car_id == cars.c.id, res.c.start_at <= now, res.c.end_at > now,
+        res.c.user_id != uid,
     )
-    db.session.add(r)
+    stmt = (
+        sa.insert(rentals)
+        .from_select(
+            ['user_id', 'car_id', 'merchant_id', 'start_date'],
+            sa.select(
+                sa.literal(uid), cars.c.id, cars.c.merchant_id, sa.literal(now)
+            ).where(cars.c.id == car_id, ~reserved_now),
+        )
+        .returning(rentals.c.id, rentals.c.car_id, rentals.c.merchant_id, rentals.c.start_date)
+    )
+    try:
+        row = db.session.execute(stmt).first()
+    except IntegrityError as e:
+        db.session.rollback()
+        which = violated_constraint(e)
+        # error path only: look up the conflicting rental for the response
+        if 'uq_rentals_active_user' in which or 'rentals.user_id' in which:
+            active = Rental.query.filter_by(user_id=uid, end_date=None).first()
+            return jsonify({'error': 'already have active',
+                            'rental_id': active.id if active else None}), 400
+        if 'uq_rentals_active_car' in which or 'rentals.car_id' in which:
+            busy = Rental.query.filter_by(car_id=car_id, end_date=None).first()
+            return jsonify({'error': 'car busy',
+                            'rental_id': busy.id if busy else None}), 400
+        raise
+
+    if row is None:   # no such car, or reserved; nothing inserted
+        db.session.rollback()
+        Car.query.get_or_404(car_id)
+        return jsonify({'error': 'car reserved'}), 400
+    outbox.emit('rental.created', row.id, {
+        'rental_id': row.id, 'user_id': uid, 'car_id': row.car_id,
+        'merchant_id': row.merchant_id, 'start_date': row.start_date,
+    })
+    after_commit('rented', row.car_id, row.start_date, row.id)
+    availability.record(('busy', row.car_id, row.id))
     db.session.commit()
 
     return jsonify({
-        'id': r.id,
-        'start_date': r.start_date.isoformat()
+        'id': row.id,
+        'start_date': row.start_date.isoformat()
     }), 201
 
 # Return rental
@@ -54,15 +94,39 @@ def create_rental():
 @basic_auth_required
 @roles_required('user')
 def return_rental(rid):
-    r = Rental.query.get_or_404(rid)
-    if r.user_id != request.current_user.id:
-        return jsonify({'error':'forbidden'}),403
-    if r.end_date:
+    rentals, cars = Rental.__table__, Car.__table__
+    now = datetime.utcnow()
+    # close it only if it is still open: of two concurrent returns (or a
+    # return racing a fleet retirement) exactly one gets the row back
+    r = db.session.execute(
+        sa.update(rentals)
+        .where(rentals.c.id == rid,
+               rentals.c.user_id == request.current_user.id,
+               rentals.c.end_date.is_(None),
+               rentals.c.car_id == cars.c.id)
+        .values(end_date=now,
+                fee=fee_sql(rentals.c.start_date, sa.literal(now), cars.c.daily_rate,
+                            db.engine.dialect.name))
+        .returning(rentals.c.id, rentals.c.user_id, rentals.c.merchant_id, rentals.c.car_id,
+                   rentals.c.start_date, rentals.c.end_date, rentals.c.fee)
+    ).first()
+    if r is None:
+        db.session.rollback()
+        existing = Rental.query.get_or_404(rid)
+        if existing.user_id != request.current_user.id:
+            return jsonify({'error':'forbidden'}),403
         return jsonify({'error':'already returned'}),400
-    r.end_date = datetime.utcnow()
-    r.fee      = r.calculate_fee()
+
+    record_closed_rentals([r])
+    outbox.emit('rental.returned', r.id, {
+        'rental_id': r.id, 'user_id': r.user_id, 'car_id': r.car_id,
+        'merchant_id': r.merchant_id, 'start_date': r.start_date,
+        'end_date': r.end_date, 'fee': r.fee,
+    })
+    after_commit('returned', r.car_id)
+    availability.record(('free', r.car_id))   # Core UPDATE: no ORM event frees it
     db.session.commit()
-    return jsonify({'rental_id':r.id,'end_date':r.end_date.isoformat(),'fee':r.fee})
+    return jsonify({'rental_id':r.id,'end_date':r.end_date.isoformat(),'fee':float(r.fee)})
 
 
 
@@ -77,22 +141,158 @@ def merchant_rentals_self():
     """
     merchant_id = request.current_user.id
 
-    # now that Rental has its own merchant_id column, we can filter directly
-    q = (
-        Rental.query
-        .filter_by(merchant_id=merchant_id)
-        .options(joinedload(Rental.car))   # if you still want the car relationship loaded
-    )
+    # filter on Rental's own merchant_id and select only the listed columns:
+    # plain rows, no Rental/Car objects built per row
+    q = Rental.listing_query().filter(Rental.merchant_id == merchant_id)
 
     return jsonify(
         paginate_query(
             q,
             endpoint="rentals.merchant_rentals_self",
-            merchant_id=merchant_id
+            serializer=Rental.row_to_dict,
+            keyset=(Rental.start_date, Rental.id),
         )
     )
 
 
+def _archived_page(column, value, endpoint, serializer, **kwargs):
+    """Cursor page over archived (Parquet) rentals, shaped like paginate_query's."""
+    per_page = request.args.get("per_page", 20, type=int)
+    per_page = min(max(per_page, 1), current_app.config["PAGINATION_MAX_PER_PAGE"])
+    after    = request.args.get("after", "")
+    values   = None
+    if after:
+        values = decode_cursor(after, (Rental.start_date, Rental.id))
+        if values is None:
+            return jsonify({"error": "invalid cursor"}), 400
+    try:
+        rows = read_archived(column, value, values, per_page)
+    except ImportError:
+        return jsonify({"error": "reading archives needs pyarrow"}), 503
+    has_next = len(rows) > per_page
+    rows     = rows[:per_page]
+    next_cursor = encode_cursor([rows[-1].start_date, rows[-1].id]) if has_next else None
+    return jsonify({
+        "items":       [serializer(r) for r in rows],
+        "per_page":    per_page,
+        "next_cursor": next_cursor,
+        "next_url":    url_for(endpoint, after=next_cursor, per_page=per_page,
+                               _external=True, **kwargs) if has_next else None,
+    })
+
+
+# Rentals of your cars that were archived out of the database (merchant only)
+@rentals_bp.route("/merchants/me/rentals/archived", methods=["GET"])
+@basic_auth_required
+@roles_required("merchant")
+def merchant_rentals_archived():
+    return _archived_page("merchant_id", request.current_user.id,
+                          "rentals.merchant_rentals_archived", Rental.row_to_dict)
+
+
+EXPORT_FIELDS = ("id", "user_id", "merchant_id", "car_id", "start_date", "end_date", "fee")
+
+
+def _export_row(row):
+    return (
+        row.id,
+        row.user_id,
+        row.merchant_id,
+        row.car_id,
+        row.start_date.isoformat(),
+        row.end_date.isoformat() if row.end_date else None,
+        str(row.fee) if row.fee is not None else None,
+    )
+
+
+# Stream the merchant's whole rental history as NDJSON or CSV
+@rentals_bp.route("/merchants/me/rentals/export", methods=["GET"])
+@basic_auth_required
+@roles_required("merchant")
+def merchant_rentals_export():
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in ("ndjson", "csv"):
+        return jsonify({"error": "format must be ndjson or csv"}), 400
+    since = request.args.get("since")
+    if since:
+        try:
+            since = datetime.fromisoformat(since)
+        except ValueError:
+            return jsonify({"error": "since must be an ISO 8601 timestamp"}), 400
+
+    t = Rental.__table__
+    stmt = (
+        sa.select(*(t.c[name] for name in EXPORT_FIELDS))
+        .where(t.c.merchant_id == request.current_user.id)
+        .order_by(t.c.start_date, t.c.id)
+    )
+    if since:
+        stmt = stmt.where(t.c.start_date >= since)
+    batch_size = current_app.config["EXPORT_BATCH_SIZE"]
+
+    def generate():
+        # server-side cursor: rows arrive batch by batch, memory stays flat
+        buf    = io.StringIO()
+        writer = csv.writer(buf)
+        if fmt == "csv":
+            writer.writerow(EXPORT_FIELDS)
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+        result = db.session.execute(stmt.execution_options(stream_results=True))
+        for rows in result.partitions(batch_size):
+            if fmt == "csv":
+                writer.writerows(_export_row(r) for r in rows)
+            else:
+                buf.writelines(
+                    json.dumps(dict(zip(EXPORT_FIELDS, _export_row(r)))) + "\n"
+                    for r in rows
+                )
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+        result.close()
+        db.session.rollback()
+
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    resp = Response(stream_with_context(generate()), mimetype=mimetype)
+    resp.headers["Content-Disposition"] = f"attachment; filename=rentals.{fmt}"
+    return resp
+
+
+# Reprice the merchant's closed rentals from the cars' current daily rates
+@rentals_bp.route("/merchants/me/fees/recompute", methods=["POST"])
+@basic_auth_required
+@roles_required("merchant")
+def merchant_fees_recompute():
+    """
+    ?from=&to= (YYYY-MM-DD, inclusive) select rentals by the day they ended;
+    both optional. ?dry_run=1 only reports what would change.
+    """
+    try:
+        start = request.args.get("from")
+        to    = request.args.get("to")
+        start = datetime.strptime(start, "%Y-%m-%d") if start else None
+        end   = datetime.strptime(to, "%Y-%m-%d") + timedelta(days=1) if to else None
+    except ValueError:
+        return jsonify({"error": "from/to must be YYYY-MM-DD"}), 400
+    dry_run = request.args.get("dry_run") in ("1", "true")
+
+    result = recompute_fees(start, end, merchant_id=request.current_user.id, dry_run=dry_run)
+    return jsonify({**result, "dry_run": dry_run})
+
+
+def user_rental_to_dict(r):
+    return {
+        "id":         r.id,
+        "user_id":    r.user_id,
+        "car_id":     r.car_id,
+        "start_date": r.start_date.isoformat(),
+        "end_date":   r.end_date.isoformat() if r.end_date else None,
+        "fee":        str(r.fee) if r.fee is not None else None
+    }
+
+
 # List all rentals for a specific user (user only)
 @rentals_bp.route("/users/<int:user_id>/rentals", methods=["GET"])
 @basic_auth_required
@@ -100,17 +300,22 @@ def merchant_rentals_self():
 def user_rentals(user_id):
     if user_id != request.current_user.id:
         return jsonify({"error":"forbidden"}), 403
-    q = Rental.query.filter_by(user_id=user_id)
+    q = Rental.listing_query().filter(Rental.user_id == user_id)
     return jsonify(paginate_query(
     q,
-    "user_rentals",
-    serializer=lambda r: {
-        "id":         r.id,
-        "user_id":    r.user_id,
-        "car_id":     r.car_id,
-        "start_date": r.start_date.isoformat(),
-        "end_date":   r.end_date.isoformat() if r.end_date else None,
-        "fee":        str(r.fee) if r.fee is not None else None
-    },
+    "rentals.user_rentals",
+    keyset=(Rental.start_date, Rental.id),
+    serializer=user_rental_to_dict,
     user_id=user_id
     ))
+
+
+# Your archived rental history (user only)
+@rentals_bp.route("/users/<int:user_id>/rentals/archived", methods=["GET"])
+@basic_auth_required
+@roles_required("user")
+def user_rentals_archived(user_id):
+    if user_id != request.current_user.id:
+        return jsonify({"error": "forbidden"}), 403
+    return _archived_page("user_id", user_id, "rentals.user_rentals_archived",
+                          user_rental_to_dict, user_id=user_id)
@@ -0,0 +1,141 @@
+from datetime import datetime, timedelta, timezone
+
+import sqlalchemy as sa
+from flask import Blueprint, current_app, request, jsonify
+from sqlalchemy.exc import IntegrityError
+from app.auth import basic_auth_required, roles_required
+from app.extensions import db
+from app.models import Car, Reservation
+from app.timeline import after_commit, timeline
+from app.utils import paginate_query, violated_constraint
+
+reservations_bp = Blueprint('reservations', __name__)
+
+
+def _timestamp(value):
+    """ISO 8601 -> naive UTC datetime (naive input is taken as UTC); None if invalid."""
+    try:
+        ts = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def _window(default_days):
+    """Parse ?from=&to= (ISO 8601); defaults to now .. now + default_days. ValueError if bad."""
+    now   = datetime.utcnow()
+    start = _timestamp(request.args['from']) if 'from' in request.args else now
+    end   = (_timestamp(request.args['to']) if 'to' in request.args
+             else (start or now) + timedelta(days=default_days))
+    if start is None or end is None:
+        raise ValueError('from/to must be ISO 8601 timestamps')
+    if end <= start:
+        raise ValueError('to must be after from')
+    if end - start > timedelta(days=current_app.config['AVAILABILITY_MAX_WINDOW_DAYS']):
+        raise ValueError('window too long')
+    return start, end
+
+
+# Book a car ahead for [start, end)
+@reservations_bp.route('/reservations', methods=['POST'])
+@basic_auth_required
+@roles_required('user')
+def create_reservation():
+    data   = request.get_json() or {}
+    car_id = data.get('car_id')
+    start  = _timestamp(data.get('start'))
+    end    = _timestamp(data.get('end'))
+    if not car_id or start is None or end is None:
+        return jsonify({'error': 'car_id, start and end (ISO 8601) required'}), 400
+    if end <= start:
+        return jsonify({'error': 'end must be after start'}), 400
+    if start < datetime.utcnow():
+        return jsonify({'error': 'start must be in the future'}), 400
+    if end - start > timedelta(days=current_app.config['RESERVATION_MAX_DAYS']):
+        return jsonify({'error': 'reservation too long'}), 400
+
+    car = Car.query.get_or_404(car_id)
+    res = Reservation.__table__
+    if db.engine.dialect.name != 'postgresql':
+        # no exclusion constraints elsewhere; best-effort check for dev databases
+        clash = db.session.execute(
+            sa.select(res.c.id).where(res.c.car_id == car.id,
+                                      res.c.start_at < end, res.c.end_at > start).limit(1)
+        ).scalar()
+        if clash:
+            return jsonify({'error': 'car already reserved', 'reservation_id': clash}), 400
+
+    r = Reservation(car_id=car.id, user_id=request.current_user.id,
+                    merchant_id=car.merchant_id, start_at=start, end_at=end)
+    db.session.add(r)
+    try:
+        db.session.flush()
+    except IntegrityError as e:
+        db.session.rollback()
+        if 'ex_reservations_car_period' in violated_constraint(e):
+            return jsonify({'error': 'car already reserved'}), 400
+        raise
+    after_commit('reserved', r.car_id, r.start_at, r.end_at, r.id)
+    db.session.commit()
+    return jsonify(r.to_dict()), 201
+
+
+# Cancel a reservation (the user who made it or the car's merchant)
+@reservations_bp.route('/reservations/<int:rid>', methods=['DELETE'])
+@basic_auth_required
+def cancel_reservation(rid):
+    r = Reservation.query.get_or_404(rid)
+    if request.current_user.id not in (r.user_id, r.merchant_id):
+        return jsonify({'error': 'forbidden'}), 403
+    db.session.delete(r)
+    after_commit('cancelled', r.car_id, r.id)
+    db.session.commit()
+    return '', 204
+
+
+# Your own reservations
+@reservations_bp.route('/users/me/reservations', methods=['GET'])
+@basic_auth_required
+@roles_required('user')
+def my_reservations():
+    q = Reservation.query.filter_by(user_id=request.current_user.id)
+    return jsonify(paginate_query(
+        q, 'reservations.my_reservations', keyset=(Reservation.start_at, Reservation.id)
+    ))
+
+
+# Cars with nothing booked or rented over [from, to)
+@reservations_bp.route('/availability', methods=['GET'])
+@basic_auth_required
+def availability():
+    try:
+        start, end = _window(default_days=1)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    merchant_id = request.args.get('merchant_id', type=int)
+    car_ids     = timeline.free_cars(start, end, merchant_id)
+    return jsonify({
+        'from':    start.isoformat(),
+        'to':      end.isoformat(),
+        'count':   len(car_ids),
+        'car_ids': car_ids,
+    })
+
+
+# Busy periods of one car over [from, to)
+@reservations_bp.route('/cars/<int:car_id>/calendar', methods=['GET'])
+@basic_auth_required
+def car_calendar(car_id):
+    try:
+        start, end = _window(default_days=30)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    busy = timeline.calendar(car_id, start, end)
+    if busy is None:
+        # not in this worker's snapshot yet: a brand-new car, or no such car
+        Car.query.get_or_404(car_id)
+        busy = []
+    return jsonify({'car_id': car_id, 'from': start.isoformat(),
+                    'to': end.isoformat(), 'busy': busy})
@@ -0,0 +1,335 @@
+"""
+Synthetic dataset generator for production-sized loads (PostgreSQL only).
+
+    flask seed --users 1M --cars 200k --rentals 20M --seed 42
+
+Merchants own fleets with a long-tailed size distribution. Car rates depend on
+the model class. Every car has a back-to-back rental history over --days days,
+and a small fraction of cars are currently rented. Frequent renters are
+over-represented.
+
+The output depends only on the options (including --until), not on --workers.
+Rows are generated in fixed-size chunks, each with its own seeded RNG.
+
+Worker processes stream the chunks into the database with COPY. Secondary
+indexes and foreign keys are dropped first and recreated afterwards. All
+synthetic users share one precomputed hash of --password. The daily rollups are
+rebuilt at the end.
+
+This TRUNCATEs every application table. seed.py still loads the small demo
+dataset the README refers to.
+"""
+import io
+import math
+import multiprocessing
+import random
+import re
+import time
+from array import array
+from datetime import datetime, timedelta
+
+import click
+import sqlalchemy as sa
+from flask.cli import with_appcontext
+from werkzeug.security import generate_password_hash
+
+from app.extensions import db
+from app.partitions import ensure_partitions, is_partitioned
+from app.rollups import rebuild_rollups
+
+CHUNK      = 100_000   # rows per job; part of the output's identity, keep fixed
+COPY_FLUSH = 20_000    # rows buffered per copy_expert round trip
+TABLES     = ("users", "cars", "rentals")
+
+# model -> (weight in the fleet mix, daily rate range in cents)
+MODELS = {
+    "Kia Rio":            (14, (2500,  4000)),
+    "Renault Clio":       (12, (2600,  4200)),
+    "Toyota Corolla":     (16, (3500,  5500)),
+    "Honda Civic":        (14, (3800,  5800)),
+    "Ford Focus":         (10, (3400,  5000)),
+    "VW Golf":            (10, (3600,  5600)),
+    "Mazda 3":            (8,  (3900,  6000)),
+    "Chevy Malibu":       (7,  (4500,  7000)),
+    "BMW 3 Series":       (5,  (8000, 12000)),
+    "Mercedes E-Class":   (3,  (11000, 16000)),
+    "Tesla Model 3":      (4,  (9000, 14000)),
+    "Ford Transit":       (3,  (7000,  9500)),
+}
+MODEL_NAMES = list(MODELS)
+
+
+class Count(click.ParamType):
+    """Accepts 1000, 1_000, 200k, 1.5M."""
+    name = "count"
+    _units = {"": 1, "k": 1_000, "m": 1_000_000}
+
+    def convert(self, value, param, ctx):
+        if isinstance(value, int):
+            return value
+        m = re.fullmatch(r"([\d_.]+)([kKmM]?)", str(value).strip())
+        if not m:
+            self.fail(f"{value!r} is not a count like 5000, 200k or 1M", param, ctx)
+        return int(float(m.group(1).replace("_", "")) * self._units[m.group(2).lower()])
+
+
+# -- generation (runs in the worker processes) ---------------------------------
+
+_plan = None   # set once per worker by _init_worker
+
+
+def _rng(table, start):
+    return random.Random(f"{_plan['seed']}:{table}:{start}")
+
+
+def _money(cents):
+    return f"{cents // 100}.{cents % 100:02d}"
+
+
+def _stamp(dt):
+    return dt.isoformat(sep=" ")
+
+
+def _user_rows(start, stop):
+    merchants, pwhash = _plan["merchants"], _plan["pwhash"]
+    for i in range(start + 1, stop + 1):
+        if i <= merchants:
+            yield (i, f"merchant{i}", pwhash, "merchant")
+        else:
+            yield (i, f"user{i}", pwhash, "user")
+
+
+def _car_rows(start, stop):
+    models, merchant, rate = _plan["car_model"], _plan["car_merchant"], _plan["car_rate"]
+    for i in range(start + 1, stop + 1):
+        yield (i, MODEL_NAMES[models[i - 1]], f"SYN-{i:08d}", _money(rate[i - 1]), merchant[i - 1])
+
+
+def _rental_rows(start, stop):
+    """
+    Closed rental k belongs to car k % cars and to that car's slot k // cars;
+    slots tile the history window, so a car's rentals never overlap.
+    """
+    rng       = _rng("rentals", start)
+    cars      = _plan["cars"]
+    first     = _plan["merchants"] + 1
+    renters   = _plan["users"] - _plan["merchants"]
+    window    = _plan["history_end"] - _plan["history_start"]
+    slot_len  = window / _plan["slots"]
+    merchant, rate = _plan["car_merchant"], _plan["car_rate"]
+
+    for k in range(start, stop):
+        car   = k % cars + 1
+        slot0 = _plan["history_start"] + slot_len * (k // cars)
+        begin = slot0 + slot_len * (rng.random() * 0.5)
+        # mostly short rentals with a long tail, capped to the slot
+        length = min(timedelta(days=rng.expovariate(1 / 2.5)), slot0 + slot_len - begin)
+        end    = begin + max(length, timedelta(hours=1))
+        user   = first + int(renters * rng.random() ** 2)
+        days   = (end - begin).days + 1           # same rule as Rental.calculate_fee
+        yield (k + 1, user, car, merchant[car - 1], _stamp(begin), _stamp(end),
+               _money(days * rate[car - 1]))
+
+
+def _active_rental_rows(start, stop):
+    first_id = _plan["closed"] + 1
+    for n, (car, user, started) in enumerate(_plan["active"][start:stop], start):
+        yield (first_id + n, user, car, _plan["car_merchant"][car - 1],
+               _stamp(started), None, None)
+
+
+GENERATORS = {
+    "users":          ("users",   ("id", "username", "password", "role"), _user_rows),
+    "cars":           ("cars",    ("id", "model", "plate", "daily_rate", "merchant_id"), _car_rows),
+    "rentals":        ("rentals", ("id", "user_id", "car_id", "merchant_id",
+                                   "start_date", "end_date", "fee"), _rental_rows),
+    "active_rentals": ("rentals", ("id", "user_id", "car_id", "merchant_id",
+                                   "start_date", "end_date", "fee"), _active_rental_rows),
+}
+
+
+def _init_worker(plan):
+    global _plan
+    _plan = plan
+
+
+def _copy_chunk(job):
+    """Generate rows [start, stop) of one kind and COPY them in; returns the row count."""
+    import psycopg2
+
+    kind, start, stop = job
+    table, columns, rows = GENERATORS[kind]
+    copy = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+    conn = psycopg2.connect(**_plan["dsn"])
+    try:
+        with conn.cursor() as cur:
+            buf, pending = io.StringIO(), 0
+            for row in rows(start, stop):
+                buf.write("\t".join("\\N" if v is None else str(v) for v in row))
+                buf.write("\n")
+                pending += 1
+                if pending == COPY_FLUSH:
+                    buf.seek(0)
+                    cur.copy_expert(copy, buf)
+                    buf, pending = io.StringIO(), 0
+            if pending:
+                buf.seek(0)
+                cur.copy_expert(copy, buf)
+        conn.commit()
+    finally:
+        conn.close()
+    return stop - start
+
+
+# -- planning and orchestration (runs in the flask process) --------------------
+
+def build_plan(users, merchants, cars, rentals, seed, until, days, active_fraction, password):
+    """Everything the workers need; per-car attributes are precomputed here."""
+    rng     = random.Random(f"{seed}:cars")
+    weights = [MODELS[m][0] for m in MODEL_NAMES]
+    car_model, car_merchant, car_rate = array("B"), array("i"), array("i")
+    for _ in range(cars):
+        m      = rng.choices(range(len(MODEL_NAMES)), weights)[0]
+        lo, hi = MODELS[MODEL_NAMES[m]][1]
+        car_model.append(m)
+        # long-tailed fleets: low merchant ids own most of the cars
+        car_merchant.append(1 + int(merchants * rng.random() ** 3))
+        car_rate.append(rng.randrange(lo, hi, 25))
+
+    renters = users - merchants
+    active  = min(int(cars * active_fraction), renters, rentals)
+    closed  = rentals - active
+    history_end = until - timedelta(days=3)   # open rentals all started after this
+    rng     = random.Random(f"{seed}:active")
+    active_rows = [
+        (car, user, until - timedelta(hours=rng.uniform(1, 72)))
+        for car, user in zip(sorted(rng.sample(range(1, cars + 1), active)),
+                             rng.sample(range(merchants + 1, users + 1), active))
+    ]
+    url = db.engine.url
+    return {
+        "seed": seed, "users": users, "merchants": merchants, "cars": cars,
+        "closed": closed, "active": active_rows,
+        "slots": max(math.ceil(closed / cars), 1) if cars else 1,
+        "history_start": history_end - timedelta(days=days),
+        "history_end":   history_end,
+        "pwhash": generate_password_hash(password),   # one hash shared by every user
+        "car_model": car_model, "car_merchant": car_merchant, "car_rate": car_rate,
+        "dsn": {**url.translate_connect_args(username="user", database="dbname"), **url.query},
+    }
+
+
+def _jobs(plan):
+    def chunks(kind, total):
+        return [(kind, s, min(s + CHUNK, total)) for s in range(0, total, CHUNK)]
+    return (chunks("users", plan["users"]) + chunks("cars", plan["cars"])
+            + chunks("rentals", plan["closed"]) + chunks("active_rentals", len(plan["active"])))
+
+
+def _drop_indexes_and_foreign_keys():
+    """Drop secondary indexes and FKs on the loaded tables; returns the DDL to restore them."""
+    tables  = "ARRAY['users', 'cars', 'rentals']::regclass[]"
+    # indexes backing PRIMARY KEY / UNIQUE / EXCLUDE constraints stay
+    indexes = db.session.execute(sa.text(
+        "SELECT x.indexrelid::regclass::text, pg_get_indexdef(x.indexrelid) FROM pg_index x "
+        f"WHERE x.indrelid = ANY({tables}) AND NOT EXISTS ("
+        "  SELECT 1 FROM pg_constraint c "
+        "  WHERE c.conindid = x.indexrelid AND c.contype IN ('p', 'u', 'x'))"
+    )).all()
+    fkeys = db.session.execute(sa.text(
+        "SELECT conrelid::regclass::text, quote_ident(conname), pg_get_constraintdef(oid) "
+        f"FROM pg_constraint WHERE contype = 'f' AND conrelid = ANY({tables})"
+    )).all()
+
+    for table, name, _ in fkeys:
+        db.session.execute(sa.text(f"ALTER TABLE {table} DROP CONSTRAINT {name}"))
+    for name, _ in indexes:
+        db.session.execute(sa.text(f"DROP INDEX {name}"))
+    # an index on a partitioned table prints as "ON ONLY"; recreate it on every partition
+    return ([ddl.replace(" ON ONLY ", " ON ", 1) for _, ddl in indexes]
+            + [f"ALTER TABLE {table} ADD CONSTRAINT {name} {ddl}" for table, name, ddl in fkeys])
+
+
+def generate(plan, workers):
+    """Wipe the tables, COPY the plan in with `workers` processes, restore indexes."""
+    # 1) empty everything (rollups and any other dependants included)
+    names = [t.name for t in db.metadata.sorted_tables]
+    if is_partitioned():
+        names.append("active_rentals")   # fed by a trigger, not in the models
+    db.session.execute(sa.text(f"TRUNCATE {', '.join(names)} RESTART IDENTITY CASCADE"))
+    if is_partitioned():
+        # monthly partitions for the whole history, so nothing piles up in the default one
+        until = plan["history_end"] + timedelta(days=3)   # open rentals start before this
+        ensure_partitions(plan["history_start"], max(until, datetime.utcnow()))
+    restore = _drop_indexes_and_foreign_keys()
+    db.session.commit()
+
+    # 2) load; whatever happens, put the indexes and constraints back
+    try:
+        jobs  = _jobs(plan)
+        total = sum(stop - start for _, start, stop in jobs)
+        with multiprocessing.Pool(workers, _init_worker, (plan,)) as pool, \
+                click.progressbar(length=total, label="copying rows") as bar:
+            for n in pool.imap_unordered(_copy_chunk, jobs):
+                bar.update(n)
+    finally:
+        click.echo(f"rebuilding {len(restore)} indexes and foreign keys")
+        for ddl in restore:
+            db.session.execute(sa.text(ddl))
+        db.session.commit()
+
+    # 3) sequences past the explicit ids, fresh rollups, planner statistics
+    for table in TABLES:
+        db.session.execute(sa.text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"COALESCE((SELECT max(id) FROM {table}), 0) + 1, false)"
+        ))
+    db.session.commit()
+    rebuild_rollups()
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(sa.text("ANALYZE"))
+
+
+@click.command("seed")
+@click.option("--users", type=Count(), default="10k", show_default=True,
+              help="Total users, merchants included.")
+@click.option("--merchants", type=Count(), default=None,
+              help="Merchant accounts (default: 1 per 500 users).")
+@click.option("--cars", type=Count(), default="2k", show_default=True)
+@click.option("--rentals", type=Count(), default="100k", show_default=True,
+              help="Total rentals, the open ones included.")
+@click.option("--seed", type=int, default=42, show_default=True)
+@click.option("--until", type=click.DateTime(formats=["%Y-%m-%d"]), default=None,
+              help="End of the generated history (default: today, UTC).")
+@click.option("--days", type=int, default=365, show_default=True,
+              help="Length of the rental history.")
+@click.option("--active-fraction", type=float, default=0.02, show_default=True,
+              help="Share of cars with an open rental.")
+@click.option("--password", default="synthetic", show_default=True,
+              help="Password of every generated account.")
+@click.option("--workers", type=int, default=None,
+              help="COPY worker processes (default: CPU count).")
+@click.option("--yes", is_flag=True, help="Don't ask before truncating the tables.")
+@with_appcontext
+def seed_command(users, merchants, cars, rentals, seed, until, days, active_fraction,
+                 password, workers, yes):
+    """Replace all data with a generated dataset (PostgreSQL)."""
+    if db.engine.dialect.name != "postgresql":
+        raise click.ClickException("flask seed streams with COPY and needs PostgreSQL")
+    merchants = merchants if merchants is not None else max(users // 500, 1)
+    if not 0 < merchants < users or cars < 1:
+        raise click.BadParameter("need at least one car and more users than merchants")
+    if not yes:
+        click.confirm(f"This TRUNCATEs every table in {db.engine.url.database}. Continue?",
+                      abort=True)
+
+    until = until or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    plan  = build_plan(users, merchants, cars, rentals, seed, until, days,
+                       active_fraction, password)
+    started = time.perf_counter()
+    generate(plan, workers or multiprocessing.cpu_count())
+    click.echo(
+        f"{users} users ({merchants} merchants), {cars} cars, {rentals} rentals "
+        f"({len(plan['active'])} open) up to {until.date()} "
+        f"in {time.perf_counter() - started:.0f}s"
+    )
@@ -0,0 +1,77 @@
+"""The application's SQLAlchemy session class (see extensions.db)."""
+import sqlite3
+
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class AppSession(FlaskSession):
+    """
+    Flask-SQLAlchemy's session with two additions. get_bind() sends plain
+    reads in GET requests to a read replica when app.replicas allows it.
+    While info["defer_commit"] is set, commit() only flushes. POST /batch
+    sets it so every view's commit lands in one transaction that the batch
+    commits or rolls back at the end. on_commit hooks wait for that final
+    commit.
+
+    Each deferred step (one batch sub-request) runs in a savepoint opened by
+    begin_step(). A rollback() inside the step undoes only that savepoint and
+    the on_commit hooks registered since, so a view that rolls back on a
+    success path (a dry run, nothing to do) can't discard earlier steps.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        # read-only work in GET requests may go to a replica (app.replicas)
+        from app import replicas
+
+        if bind is None:
+            if self._flushing or replicas.is_write(clause):
+                self.info["wrote"] = True
+            else:
+                engine = replicas.read_engine(self)
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def commit(self):
+        if self.info.get("defer_commit"):
+            self.flush()
+            return
+        super().commit()
+
+    def begin_step(self):
+        """Open the savepoint for one deferred step."""
+        self.info["step"] = (self.begin_nested(), len(self.info.get("on_commit", ())))
+
+    def end_step(self):
+        """Release the current step's savepoint, keeping its work."""
+        step = self.info.pop("step", None)
+        if step is not None and step[0].is_active:
+            step[0].commit()
+
+    def rollback(self):
+        step = self.info.get("step")
+        if not self.info.get("defer_commit") or step is None:
+            super().rollback()
+            return
+        savepoint, hooks = step
+        if savepoint.is_active:
+            savepoint.rollback()
+        del self.info.setdefault("on_commit", [])[hooks:]
+        self.begin_step()   # whatever the view does next stays in this step
+
+
+# pysqlite only opens a transaction before DML, so a SAVEPOINT issued first
+# (begin_step) would start one of its own, and releasing it would commit.
+# Let SQLAlchemy emit BEGIN itself instead, as its SQLite docs recommend.
+@event.listens_for(Engine, "connect")
+def _sqlite_manual_transactions(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.isolation_level = None
+
+
+@event.listens_for(Engine, "begin")
+def _sqlite_begin(conn):
+    if conn.dialect.driver == "pysqlite":
+        conn.exec_driver_sql("BEGIN")
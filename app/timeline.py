@@ -0,0 +1,168 @@
+"""
+In-process availability engine.
+
+Keeps, per car, the sorted start and end times of its current and future
+reservations and the start of its open rental, if any. It answers "which cars
+are free over [X, Y)" with one bisect per car, and a car's calendar with a
+slice. Reservations of one car never overlap (the exclusion constraint), so
+sorting by start also sorts the ends.
+
+An open rental has no end yet. It makes its car busy from its start up to the
+present. Windows that begin in the future count it as returned by then.
+
+Each worker holds its own copy. Writes made by this process are applied as
+soon as they commit. Writes made by other workers show up on the next reload,
+which happens at most AVAILABILITY_TTL seconds later. New cars also appear on
+that reload. The database constraints stay the source of truth for bookings.
+"""
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+import sqlalchemy as sa
+from flask import current_app
+
+from app.extensions import db, on_commit
+from app.models import Car, Rental, Reservation
+
+
+class _Snapshot:
+    def __init__(self):
+        self.merchant = {}   # car_id -> merchant_id
+        self.booked   = {}   # car_id -> ([start, ...], [end, ...], [reservation id, ...])
+        self.open     = {}   # car_id -> (rental start, rental id)
+
+
+class Timeline:
+    def __init__(self):
+        self.lock      = threading.Lock()
+        self.snapshot  = None
+        self.loaded_at = 0.0
+
+    # -- loading --------------------------------------------------------------
+
+    def _load(self):
+        now, snap = datetime.utcnow(), _Snapshot()
+        cars, res, rentals = Car.__table__, Reservation.__table__, Rental.__table__
+
+        snap.merchant = dict(db.session.execute(sa.select(cars.c.id, cars.c.merchant_id)).all())
+        rows = db.session.execute(
+            sa.select(res.c.car_id, res.c.start_at, res.c.end_at, res.c.id)
+            .where(res.c.end_at > now)
+            .order_by(res.c.car_id, res.c.start_at)
+        )
+        for car_id, start, end, rid in rows:
+            starts, ends, ids = snap.booked.setdefault(car_id, ([], [], []))
+            starts.append(start)
+            ends.append(end)
+            ids.append(rid)
+        snap.open = {
+            car_id: (start, rid) for car_id, start, rid in db.session.execute(
+                sa.select(rentals.c.car_id, rentals.c.start_date, rentals.c.id)
+                .where(rentals.c.end_date.is_(None), rentals.c.car_id.isnot(None))
+            )
+        }
+        return snap
+
+    def current(self):
+        """The snapshot, reloaded first if older than AVAILABILITY_TTL."""
+        ttl = current_app.config["AVAILABILITY_TTL"]
+        if self.snapshot is None or time.monotonic() - self.loaded_at > ttl:
+            with self.lock:
+                if self.snapshot is None or time.monotonic() - self.loaded_at > ttl:
+                    self.snapshot  = self._load()
+                    self.loaded_at = time.monotonic()
+        return self.snapshot
+
+    def invalidate(self):
+        self.snapshot = None
+
+    # -- local updates (applied after commit, copy-on-write per car) -----------
+
+    def _update(self, fn):
+        with self.lock:
+            if self.snapshot is not None:
+                fn(self.snapshot)
+
+    def reserved(self, car_id, start, end, rid):
+        def apply(snap):
+            starts, ends, ids = (list(x) for x in snap.booked.get(car_id, ([], [], [])))
+            i = bisect_left(starts, start)
+            starts.insert(i, start)
+            ends.insert(i, end)
+            ids.insert(i, rid)
+            snap.booked[car_id] = (starts, ends, ids)
+        self._update(apply)
+
+    def cancelled(self, car_id, rid):
+        def apply(snap):
+            starts, ends, ids = snap.booked.get(car_id, ([], [], []))
+            if rid in ids:
+                i = ids.index(rid)
+                snap.booked[car_id] = (starts[:i] + starts[i + 1:], ends[:i] + ends[i + 1:],
+                                       ids[:i] + ids[i + 1:])
+        self._update(apply)
+
+    def rented(self, car_id, start, rid):
+        self._update(lambda snap: snap.open.__setitem__(car_id, (start, rid)))
+
+    def returned(self, car_id):
+        self._update(lambda snap: snap.open.pop(car_id, None))
+
+    def removed(self, car_ids):
+        def apply(snap):
+            gone = set(car_ids)
+            # replaced, not mutated: free_cars may be iterating the old dict
+            snap.merchant = {c: m for c, m in snap.merchant.items() if c not in gone}
+            for car_id in gone:
+                snap.booked.pop(car_id, None)
+                snap.open.pop(car_id, None)
+        self._update(apply)
+
+    # -- queries ----------------------------------------------------------------
+
+    @staticmethod
+    def _busy(snap, car_id, start, end, now):
+        rental = snap.open.get(car_id)
+        if rental is not None and start <= now and rental[0] < end:
+            return True
+        booked = snap.booked.get(car_id)
+        if booked is None:
+            return False
+        starts, ends, _ = booked
+        i = bisect_right(ends, start)          # first reservation ending after start
+        return i < len(starts) and starts[i] < end
+
+    def free_cars(self, start, end, merchant_id=None):
+        """Sorted ids of cars with nothing booked or rented over [start, end)."""
+        snap, now = self.current(), datetime.utcnow()
+        return sorted(
+            car_id for car_id, owner in snap.merchant.items()
+            if (merchant_id is None or owner == merchant_id)
+            and not self._busy(snap, car_id, start, end, now)
+        )
+
+    def calendar(self, car_id, start, end):
+        """The open rental, then reservations by start, overlapping [start, end); None if no such car."""
+        snap, now = self.current(), datetime.utcnow()
+        if car_id not in snap.merchant:
+            return None
+        busy = []
+        rental = snap.open.get(car_id)
+        if rental is not None and start <= now and rental[0] < end:
+            busy.append({"kind": "rental", "id": rental[1],
+                         "start": rental[0].isoformat(), "end": None})
+        starts, ends, ids = snap.booked.get(car_id, ([], [], []))
+        for i in range(bisect_right(ends, start), bisect_left(starts, end)):
+            busy.append({"kind": "reservation", "id": ids[i],
+                         "start": starts[i].isoformat(), "end": ends[i].isoformat()})
+        return busy
+
+
+timeline = Timeline()
+
+
+def after_commit(method, *args):
+    """Apply a timeline update once the current transaction commits."""
+    on_commit(lambda: getattr(timeline, method)(*args))
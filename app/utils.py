@@ -1,16 +1,207 @@
-from flask import request, url_for
+import base64
+import json
+import math
+import threading
+import time
+from datetime import datetime
 
-def paginate_query(query, endpoint, serializer=lambda x: x.to_dict(), **kwargs):
-    page     = request.args.get('page', 1, type=int)
+import sqlalchemy as sa
+from flask import abort, current_app, jsonify, request, url_for
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.extensions import db
+from app.metrics import timed
+
+COUNT_MODES = ("exact", "cached", "estimate", "none")
+
+_count_cache      = {}   # compiled SQL + params -> (expires_at, total)
+_count_cache_lock = threading.Lock()
+
+
+def _bad_request(message):
+    resp = jsonify({"error": message})
+    resp.status_code = 400
+    abort(resp)
+
+
+def violated_constraint(err):
+    """Name of the constraint behind an IntegrityError, or the driver message."""
+    name = getattr(getattr(err.orig, "diag", None), "constraint_name", None)
+    return name or str(err.orig)
+
+
+def dialect_insert(table):
+    """INSERT for the bound database, with on_conflict_do_* available."""
+    if db.engine.dialect.name == "sqlite":
+        return sqlite.insert(table)
+    return postgresql.insert(table)
+
+
+def encode_cursor(values):
+    """Pack keyset values into an opaque, URL-safe cursor string."""
+    raw = json.dumps(
+        [v.isoformat() if isinstance(v, datetime) else v for v in values],
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _cursor_value(column, value):
+    type_ = column.expression.type
+    if value is None:
+        return None
+    if isinstance(type_, sa.DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(type_, sa.Integer) and (not isinstance(value, int) or isinstance(value, bool)):
+        raise TypeError(f"cursor value {value!r} is not an integer")
+    return value
+
+
+def decode_cursor(token, columns):
+    """Inverse of encode_cursor for the given keyset columns; None if malformed."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if not isinstance(values, list) or len(values) != len(columns):
+            return None
+        return [_cursor_value(col, v) for col, v in zip(columns, values)]
+    except (ValueError, TypeError):   # bad base64, bad JSON, bad timestamp or id
+        return None
+
+
+def _default_keyset(query):
+    entity = query.column_descriptions[0]["entity"]
+    return tuple(sa.inspect(entity).primary_key)
+
+
+def _exact_count(query):
+    return query.enable_eagerloads(False).order_by(None).count()
+
+
+def _estimated_count(query):
+    """Planner row estimate (pg_class.reltuples + statistics); no table scan."""
+    if db.engine.dialect.name != "postgresql":
+        return None
+    stmt     = query.enable_eagerloads(False).order_by(None).statement
+    compiled = stmt.compile(dialect=db.engine.dialect)
+    plan = db.session.connection().exec_driver_sql(
+        "EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params
+    ).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def _cached_count(query):
+    stmt     = query.enable_eagerloads(False).order_by(None).statement
+    compiled = stmt.compile(dialect=db.engine.dialect)
+    key      = str(compiled) + repr(sorted(compiled.params.items()))
+    now      = time.monotonic()
+
+    hit = _count_cache.get(key)
+    if hit and hit[0] > now:
+        return hit[1]
+    total = _exact_count(query)
+    with _count_cache_lock:
+        _count_cache[key] = (now + current_app.config["PAGINATION_COUNT_TTL"], total)
+        if len(_count_cache) > 1024:
+            for k, (expires, _) in list(_count_cache.items()):
+                if expires <= now:
+                    _count_cache.pop(k, None)
+    return total
+
+
+def count_query(query, mode):
+    """Total for the listing according to mode (see COUNT_MODES)."""
+    if mode == "none":
+        return None
+    if mode == "estimate":
+        total = _estimated_count(query)
+        if total is not None:
+            return total
+    if mode == "cached":
+        return _cached_count(query)
+    return _exact_count(query)
+
+
+def paginate_query(query, endpoint, serializer=lambda x: x.to_dict(), keyset=None,
+                   default_count=None, **kwargs):
+    """
+    Paginate an ordered query and build next/prev URLs for endpoint.
+
+    Two modes, picked by the request:
+      * ?page=N (default) – classic OFFSET/LIMIT pages.
+      * ?after=<cursor>   – keyset pages; pass after= (empty) for the first page.
+        Cost stays flat however deep the client walks.
+
+    keyset is the tuple of columns that orders the listing and keys the cursor,
+    e.g. (Rental.start_date, Rental.id); defaults to the primary key.
+
+    ?count=exact|cached|estimate|none controls the total; offset mode defaults
+    to default_count (exact unless given), cursor mode to none.
+    """
+    keyset   = tuple(keyset or _default_keyset(query))
     per_page = request.args.get('per_page', 20, type=int)
-    pag      = query.paginate(page=page, per_page=per_page, error_out=False)
+    if per_page < 1:
+        per_page = 20
+    per_page = min(per_page, current_app.config["PAGINATION_MAX_PER_PAGE"])
+
+    cursor_mode = 'after' in request.args
+    count_mode  = request.args.get(
+        'count', 'none' if cursor_mode else (default_count or 'exact')
+    )
+    if count_mode not in COUNT_MODES:
+        _bad_request(f"count must be one of {', '.join(COUNT_MODES)}")
+    if 'count' in request.args:
+        kwargs['count'] = count_mode
+
+    ordered = query.order_by(*keyset)
+
+    if cursor_mode:
+        after = request.args.get('after', '')
+        if after:
+            values = decode_cursor(after, keyset)
+            if values is None:
+                _bad_request("invalid cursor")
+            if len(keyset) == 1:
+                ordered = ordered.filter(keyset[0] > values[0])
+            else:
+                ordered = ordered.filter(sa.tuple_(*keyset) > sa.tuple_(*[
+                    sa.literal(v, col.expression.type) for col, v in zip(keyset, values)
+                ]))
+
+        rows     = ordered.limit(per_page + 1).all()
+        has_next = len(rows) > per_page
+        rows     = rows[:per_page]
+        next_cursor = (
+            encode_cursor([getattr(rows[-1], col.key) for col in keyset])
+            if has_next else None
+        )
+        with timed('serialize'):
+            items = [serializer(item) for item in rows]
+        return {
+            'items':       items,
+            'total':       count_query(query, count_mode),
+            'per_page':    per_page,
+            'next_cursor': next_cursor,
+            'next_url':    url_for(endpoint, after=next_cursor, per_page=per_page, _external=True, **kwargs) if has_next else None,
+        }
+
+    page = request.args.get('page', 1, type=int)
+    if page < 1:
+        page = 1
+    rows     = ordered.limit(per_page + 1).offset((page - 1) * per_page).all()
+    has_next = len(rows) > per_page
+    rows     = rows[:per_page]
+    total    = count_query(query, count_mode)
+    with timed('serialize'):
+        items = [serializer(item) for item in rows]
 
     return {
-        'items':     [serializer(item) for item in pag.items],
-        'total':     pag.total,
-        'pages':     pag.pages,
-        'page':      pag.page,
-        'per_page':  pag.per_page,
-        'next_url':  url_for(endpoint, page=pag.page+1, per_page=pag.per_page, _external=True, **kwargs) if pag.has_next else None,
-        'prev_url':  url_for(endpoint, page=pag.page-1, per_page=pag.per_page, _external=True, **kwargs) if pag.has_prev else None
+        'items':     items,
+        'total':     total,
+        'pages':     math.ceil(total / per_page) if total is not None else None,
+        'page':      page,
+        'per_page':  per_page,
+        'next_url':  url_for(endpoint, page=page+1, per_page=per_page, _external=True, **kwargs) if has_next else None,
+        'prev_url':  url_for(endpoint, page=page-1, per_page=per_page, _external=True, **kwargs) if page > 1 else None
     }
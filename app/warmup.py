@@ -0,0 +1,92 @@
+"""
+Startup work for the production server (gunicorn.conf.py, wsgi.py).
+
+With preload_app the master imports wsgi.py, which runs create_app() and
+warm(). Whatever warm() builds is shared with every forked worker through
+copy-on-write:
+  * configured mappers,
+  * SQLAlchemy's compiled-statement cache for the hot queries,
+  * the availability index and timeline snapshot,
+  * the JSON provider.
+
+warm() then closes its database connections, because sockets must not be
+shared across fork. Each worker calls post_fork(). That drops any pooled
+connections it inherited, opens DB_POOL_WARM fresh ones per engine, and
+starts the background threads (availability listener, outbox dispatcher)
+that can't survive a fork.
+
+Each phase's duration is exported as app_startup_seconds{phase=...} on
+/metrics. The first request a worker serves is recorded there too.
+"""
+import logging
+import time
+
+import sqlalchemy as sa
+from sqlalchemy.orm import configure_mappers
+
+from app import availability, metrics, outbox
+from app.extensions import db
+from app.models import Car, Rental, User
+from app.timeline import timeline
+
+log = logging.getLogger(__name__)
+
+
+def _prime_queries():
+    # one row each, so the statements are compiled and cached on the engine
+    Car.listing_query().order_by(Car.id).limit(1).all()
+    Rental.listing_query().filter(Rental.merchant_id == 0) \
+        .order_by(Rental.start_date, Rental.id).limit(1).all()
+    User.query.filter_by(username="").first()
+
+
+def warm(app):
+    """Build shared state before forking; safe to call without a database."""
+    started = time.perf_counter()
+    configure_mappers()
+    with app.app_context():
+        app.json.dumps({"warm": True})
+        try:
+            _prime_queries()
+            timeline.current()
+        except sa.exc.SQLAlchemyError:
+            log.warning("warmup queries failed; continuing cold", exc_info=True)
+        finally:
+            db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()   # no sockets into the fork
+    metrics.record_startup("warmup", time.perf_counter() - started)
+
+
+def warm_pools(app, connections):
+    """Open up to `connections` pooled connections per engine and return them to the pool."""
+    with app.app_context():
+        for engine in db.engines.values():
+            held = []
+            try:
+                for _ in range(connections):
+                    held.append(engine.connect())
+            except sa.exc.SQLAlchemyError:
+                log.warning("could not pre-open connections for %s", engine.url, exc_info=True)
+            finally:
+                for conn in held:
+                    conn.close()
+
+
+def post_fork(app):
+    """Per-worker setup right after fork (gunicorn post_fork hook)."""
+    started = time.perf_counter()
+    with app.app_context():
+        for engine in db.engines.values():
+            # the parent's connections stay the parent's: forget them, don't close them
+            engine.dispose(close=False)
+    warm_pools(app, app.config["DB_POOL_WARM"])
+    start_background_threads(app)
+    metrics.record_startup("worker_boot", time.perf_counter() - started)
+
+
+def start_background_threads(app):
+    if availability.index.notify:
+        availability.listen(app)
+    if app.config["OUTBOX_DISPATCH_IN_PROCESS"]:
+        outbox.start(app)
@@ -0,0 +1 @@
+"""Load, stress and micro-benchmarks for the car rental API."""
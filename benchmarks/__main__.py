@@ -0,0 +1,140 @@
+"""
+Benchmark runner.
+
+    python -m benchmarks load  --database sqlite:///bench.db --create-schema \\
+        --scale small --clients 1 --duration 30 --out base.json
+    python -m benchmarks micro --database postgresql://... --scale small --out micro.json
+    python -m benchmarks startup --database postgresql://... --path /cars/cars \\
+        --auth user1:synthetic --out startup.json
+    python -m benchmarks compare base.json new.json --threshold 10
+
+`load` and `micro` wipe and reseed the target database first (skip that with
+--no-seed to reuse the previous dataset); never point them at real data.
+`startup` launches gunicorn (gunicorn.conf.py) several times against an
+existing database and reports time to ready plus first and warm request
+latency. `compare` exits with status 1 if any latency percentile, startup
+time, rps or ops/s figure got worse by more than --threshold percent.
+"""
+import argparse
+import os
+import sys
+
+from benchmarks import report
+
+
+def _parser():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    sub    = parser.add_subparsers(dest="command", required=True)
+
+    for name in ("load", "micro"):
+        p = sub.add_parser(name)
+        p.add_argument("--database", help="DATABASE_URL to benchmark (default: $DATABASE_URL)")
+        p.add_argument("--create-schema", action="store_true",
+                       help="db.create_all() first (SQLite stand-in; use migrations on Postgres)")
+        p.add_argument("--no-seed", action="store_true", help="reuse the data already loaded")
+        p.add_argument("--scale", default="tiny", choices=("tiny", "small", "medium", "large"))
+        for count in ("users", "merchants", "cars", "rentals"):
+            p.add_argument(f"--{count}", type=int, help=f"override the scale's {count}")
+        p.add_argument("--seed", type=int, default=42)
+        p.add_argument("--cache", action="store_true",
+                       help="keep the response cache on (off by default so reads hit the database)")
+        p.add_argument("--out", help="write results as JSON here")
+        if name == "load":
+            p.add_argument("--clients", type=int, default=4,
+                           help="concurrent client threads (use 1 on SQLite)")
+            p.add_argument("--duration", type=float, default=20.0)
+            p.add_argument("--warmup", type=float, default=2.0)
+        else:
+            p.add_argument("--min-time", type=float, default=0.5, help="seconds per benchmark")
+
+    p = sub.add_parser("startup")
+    p.add_argument("--database", help="DATABASE_URL to serve (default: $DATABASE_URL)")
+    p.add_argument("--path", default="/health/pool", help="request timed after startup")
+    p.add_argument("--auth", help="user:password for Basic auth on --path")
+    p.add_argument("--runs", type=int, default=3)
+    p.add_argument("--workers", type=int, default=1)
+    p.add_argument("--port", type=int, default=5099)
+    p.add_argument("--out", help="write results as JSON here")
+
+    p = sub.add_parser("compare")
+    p.add_argument("base")
+    p.add_argument("new")
+    p.add_argument("--threshold", type=float, default=10.0, help="allowed regression, percent")
+    return parser
+
+
+def _setup(args):
+    # config is read at import time, so the environment must be set first
+    if args.database:
+        os.environ["DATABASE_URL"] = args.database
+    if not args.cache:
+        os.environ["RESPONSE_CACHE_BACKEND"] = "none"
+    # the workload signs its own bearer tokens; any key will do for a throwaway database
+    os.environ.setdefault("SECRET_KEY", "benchmark-only")
+    # every simulated client shares a few accounts and one address: measure the
+    # app, not the rate limiter
+    os.environ["RATE_LIMIT_BACKEND"] = "none"
+
+    from app import create_app
+    from app.extensions import db
+    from benchmarks import dataset
+
+    app    = create_app()
+    counts = dict(dataset.SCALES[args.scale])
+    for name in counts:
+        if getattr(args, name) is not None:
+            counts[name] = getattr(args, name)
+
+    with app.app_context():
+        if args.create_schema:
+            db.create_all()
+        if args.no_seed:
+            layout = dataset.layout(**counts)
+        else:
+            layout = dataset.load(**counts, seed=args.seed)
+        dialect = db.engine.dialect.name
+    params = {**counts, "seed": args.seed, "dialect": dialect, "cache": args.cache}
+    return app, layout, params
+
+
+def main(argv=None):
+    args = _parser().parse_args(argv)
+
+    if args.command == "compare":
+        regressions = report.compare(args.base, args.new, args.threshold)
+        print(f"{len(regressions)} regression(s) over {args.threshold}%")
+        return 1 if regressions else 0
+
+    if args.command == "startup":
+        from benchmarks import startup
+        results = startup.run(args.database, path=args.path, auth=args.auth, runs=args.runs,
+                              port=args.port, workers=args.workers)
+        report.print_table(results, report.STARTUP_METRICS)
+        if args.out:
+            params = {"path": args.path, "runs": args.runs, "workers": args.workers}
+            report.save(args.out, "startup", params, results)
+            print(f"results written to {args.out}")
+        return 0
+
+    app, layout, params = _setup(args)
+    if args.command == "load":
+        from benchmarks import load
+        params.update(clients=args.clients, duration=args.duration, warmup=args.warmup)
+        samples, wall = load.run(app, layout, clients=args.clients, duration=args.duration,
+                                 warmup=args.warmup, seed=args.seed)
+        results = report.summarize(samples, wall)
+        report.print_table(results, ("count", "errors", "rps", "p50_ms", "p95_ms", "p99_ms"))
+    else:
+        from benchmarks import micro
+        params.update(min_time=args.min_time)
+        results = micro.run(app, layout, min_time=args.min_time)
+        report.print_table(results, ("us_per_op", "cpu_us_per_op", "peak_kb", "ops_per_s", "runs"))
+
+    if args.out:
+        report.save(args.out, args.command, params, results)
+        print(f"results written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
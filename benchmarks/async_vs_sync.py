@@ -0,0 +1,111 @@
+"""
+Side-by-side throughput of the sync (Flask/WSGI) and async (app.asgi) servers.
+
+Start both against the same database, one worker each, with the response
+cache off so the listings really hit Postgres, e.g.
+
+    export RESPONSE_CACHE_BACKEND=none
+    gunicorn -w 1 --threads 8 -b :5000 'app:create_app()'
+    uvicorn app.asgi:app --workers 1 --port 5001
+
+then run
+
+    python -m benchmarks.async_vs_sync --user alice:alice123 \\
+        --sync http://localhost:5000 --async http://localhost:5001
+
+Each target gets the same closed-loop workload: --concurrency clients issuing
+GET requests against --path for --duration seconds with a bearer token.
+"""
+import argparse
+import base64
+import json
+import statistics
+import threading
+import time
+from http.client import HTTPConnection
+from urllib.parse import urlsplit
+
+
+def _login(base, user):
+    parts = urlsplit(base)
+    conn  = HTTPConnection(parts.hostname, parts.port)
+    creds = base64.b64encode(user.encode()).decode()
+    conn.request("POST", "/auth/login", headers={"Authorization": f"Basic {creds}"})
+    resp = conn.getresponse()
+    body = json.loads(resp.read())
+    if resp.status != 200:
+        raise SystemExit(f"login failed against {base}: {body}")
+    return body["token"]
+
+
+def run(base, token, paths, concurrency, duration):
+    """Closed-loop load; returns req/s, error count and latency percentiles (ms)."""
+    parts     = urlsplit(base)
+    deadline  = time.perf_counter() + duration
+    latencies = []
+    errors    = [0]
+    lock      = threading.Lock()
+
+    def client(n):
+        conn    = HTTPConnection(parts.hostname, parts.port)
+        headers = {"Authorization": f"Bearer {token}"}
+        mine, i = [], n
+        while time.perf_counter() < deadline:
+            path = paths[i % len(paths)]
+            i   += 1
+            t0   = time.perf_counter()
+            conn.request("GET", path, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+            mine.append(time.perf_counter() - t0)
+            if resp.status >= 400:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    q = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+    return {
+        "requests": len(latencies),
+        "errors":   errors[0],
+        "rps":      round(len(latencies) / elapsed, 1),
+        "p50_ms":   round(q[49] * 1000, 2),
+        "p95_ms":   round(q[94] * 1000, 2),
+        "p99_ms":   round(q[98] * 1000, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare sync and async server throughput.")
+    parser.add_argument("--sync",  dest="sync_url",  default="http://localhost:5000")
+    parser.add_argument("--async", dest="async_url", default="http://localhost:5001")
+    parser.add_argument("--user", required=True, help="username:password used to get a token")
+    parser.add_argument("--path", action="append",
+                        help="GET path to hit (repeatable); default: car listings")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=15.0)
+    args = parser.parse_args(argv)
+    paths = args.path or ["/cars/cars?per_page=20&count=none", "/cars/cars?after=&per_page=50"]
+
+    results = {}
+    for name, base in (("sync", args.sync_url), ("async", args.async_url)):
+        token = _login(base, args.user)
+        results[name] = run(base, token, paths, args.concurrency, args.duration)
+
+    print(f"{'server':<8}" + "".join(f"{k:>10}" for k in results["sync"]))
+    for name, r in results.items():
+        print(f"{name:<8}" + "".join(f"{v:>10}" for v in r.values()))
+    if results["sync"]["rps"]:
+        print(f"async/sync throughput: {results['async']['rps'] / results['sync']['rps']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
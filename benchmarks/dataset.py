@@ -0,0 +1,113 @@
+"""Deterministic benchmark dataset, loaded with batched executemany inserts."""
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import sqlalchemy as sa
+from werkzeug.security import generate_password_hash
+
+from app.extensions import db
+from app.models import Car, Rental, User
+
+SCALES = {
+    "tiny":   dict(users=200,     merchants=10,   cars=400,     rentals=2_000),
+    "small":  dict(users=2_000,   merchants=40,   cars=4_000,   rentals=40_000),
+    "medium": dict(users=20_000,  merchants=200,  cars=40_000,  rentals=400_000),
+    "large":  dict(users=200_000, merchants=1000, cars=200_000, rentals=4_000_000),
+}
+
+PASSWORD = "bench"
+MODELS   = ["Toyota Corolla", "Honda Civic", "Ford Focus", "Chevy Malibu", "VW Golf",
+            "Kia Rio", "Hyundai Elantra", "Mazda 3", "Nissan Sentra", "Renault Clio"]
+
+
+def _insert(table, rows, batch):
+    for i in range(0, len(rows), batch):
+        db.session.execute(sa.insert(table), rows[i:i + batch])
+
+
+def _reset_sequences(tables):
+    if db.engine.dialect.name != "postgresql":
+        return
+    for table in tables:
+        db.session.execute(sa.text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"COALESCE((SELECT max(id) FROM {table}), 0) + 1, false)"
+        ))
+
+
+def layout(users, merchants, cars, rentals=None, active_fraction=0.05):
+    """Ids and credentials the load runner needs; derived from the counts alone."""
+    user_ids = range(merchants + 1, users + 1)
+    active   = min(int(cars * active_fraction), len(user_ids) // 2)
+    return {
+        "max_car_id": cars,
+        "merchants":  [f"bench_m{i}" for i in range(1, merchants + 1)],
+        "free_users": list(user_ids[active:]),
+        "free_cars":  list(range(active + 1, cars + 1)),
+        "password":   PASSWORD,
+    }
+
+
+def load(users, merchants, cars, rentals, seed=42, active_fraction=0.05, batch=5000):
+    """
+    Wipe every table and load a dataset that depends only on the arguments.
+
+    Merchants get ids 1..merchants, regular users the ids after that. The first
+    `active` cars each have one open rental held by the first `active` users;
+    everything else is free, so the load runner can churn rentals on the
+    highest-numbered users and cars. Returns that layout (see layout()).
+    """
+    rng    = random.Random(seed)
+    pwhash = generate_password_hash(PASSWORD)   # one real hash, shared by everyone
+    now    = datetime(2025, 1, 1)
+
+    for table in reversed(db.metadata.sorted_tables):
+        db.session.execute(sa.delete(table))
+
+    user_rows = [
+        {"id": i, "username": f"bench_m{i}" if i <= merchants else f"bench_u{i}",
+         "password": pwhash, "role": "merchant" if i <= merchants else "user"}
+        for i in range(1, users + 1)
+    ]
+    _insert(User.__table__, user_rows, batch)
+
+    rates = [Decimal(rng.randrange(2500, 15000)) / 100 for _ in range(cars)]
+    car_rows = [
+        {"id": i, "model": rng.choice(MODELS), "plate": f"B-{i:08d}",
+         "daily_rate": rates[i - 1], "merchant_id": 1 + int(merchants * rng.random() ** 2)}
+        for i in range(1, cars + 1)
+    ]
+    _insert(Car.__table__, car_rows, batch)
+
+    user_ids = range(merchants + 1, users + 1)
+    active   = min(int(cars * active_fraction), len(user_ids) // 2)
+    rental_rows = []
+    for i in range(1, rentals + 1):   # closed history, flushed batch by batch
+        car   = rng.randrange(1, cars + 1)
+        start = now - timedelta(days=rng.uniform(15, 365))
+        days  = rng.randrange(0, 14)
+        end   = start + timedelta(days=days, hours=rng.uniform(0, 23))
+        rental_rows.append({
+            "id": i, "user_id": rng.choice(user_ids), "car_id": car,
+            "merchant_id": car_rows[car - 1]["merchant_id"],
+            "start_date": start, "end_date": end,
+            "fee": (days + 1) * rates[car - 1],
+        })
+        if len(rental_rows) == batch:
+            _insert(Rental.__table__, rental_rows, batch)
+            rental_rows = []
+    for n in range(active):
+        car = n + 1
+        rental_rows.append({
+            "id": rentals + n + 1, "user_id": user_ids[n], "car_id": car,
+            "merchant_id": car_rows[car - 1]["merchant_id"],
+            "start_date": now - timedelta(hours=rng.uniform(1, 72)),
+            "end_date": None, "fee": None,
+        })
+    _insert(Rental.__table__, rental_rows, batch)
+
+    _reset_sequences(["users", "cars", "rentals"])
+    db.session.commit()
+
+    return layout(users, merchants, cars, rentals, active_fraction)
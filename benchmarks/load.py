@@ -0,0 +1,129 @@
+"""Scripted mixed workload against the in-process app, timed per endpoint."""
+import base64
+import random
+import threading
+import time
+
+from flask import url_for
+
+from app.auth import TokenUser, issue_token
+from app.utils import encode_cursor
+
+# operation -> relative weight in the mix
+MIX = {
+    "login":                   1,
+    "list_cars":               2,
+    "list_cars_deep_offset":   2,
+    "list_cars_deep_cursor":   2,
+    "rental_churn":            2,
+    "merchant_rentals_self":   2,
+}
+
+
+class Workload:
+    """Builds paths and credentials once; each client thread then replays ops."""
+
+    def __init__(self, app, layout, per_page=20):
+        self.app      = app
+        self.layout   = layout
+        self.per_page = per_page
+        deep_page     = max(layout["max_car_id"] // per_page - 1, 1)
+        with app.test_request_context():
+            self.paths = {
+                "login":   url_for("auth.login"),
+                "list_cars": url_for("cars.list_cars", per_page=per_page),
+                "list_cars_deep_offset": url_for(
+                    "cars.list_cars", page=deep_page, per_page=per_page),
+                "list_cars_deep_cursor": url_for(
+                    "cars.list_cars", per_page=per_page,
+                    after=encode_cursor([layout["max_car_id"] - per_page])),
+                "create_rental": url_for("rentals.create_rental"),
+                "merchant_rentals_self": url_for(
+                    "rentals.merchant_rentals_self", per_page=per_page),
+            }
+            self.merchant_tokens = [
+                issue_token(TokenUser(i + 1, name, "merchant"))
+                for i, name in enumerate(layout["merchants"])
+            ]
+
+    def client_state(self, n, clients):
+        """Per-thread user, token and private slice of free cars for churn."""
+        users = self.layout["free_users"]
+        cars  = self.layout["free_cars"][n::clients]
+        uid   = users[-1 - n]
+        with self.app.app_context():
+            token = issue_token(TokenUser(uid, f"bench_u{uid}", "user"))
+        basic = base64.b64encode(f"bench_u{uid}:{self.layout['password']}".encode()).decode()
+        return {"uid": uid, "token": token, "basic": basic, "cars": cars, "next_car": 0}
+
+    def run_op(self, op, client, state, rng):
+        """Run one operation; returns [(endpoint, seconds, ok), ...]."""
+        bearer = {"Authorization": f"Bearer {state['token']}"}
+        if op == "login":
+            return [self._timed("login", client.post, self.paths["login"],
+                                headers={"Authorization": f"Basic {state['basic']}"})]
+        if op.startswith("list_cars"):
+            return [self._timed(op, client.get, self.paths[op], headers=bearer)]
+        if op == "merchant_rentals_self":
+            token = rng.choice(self.merchant_tokens)
+            return [self._timed(op, client.get, self.paths[op],
+                                headers={"Authorization": f"Bearer {token}"})]
+        if op == "rental_churn":
+            car = state["cars"][state["next_car"] % len(state["cars"])]
+            state["next_car"] += 1
+            name, took, ok, resp = self._timed(
+                "create_rental", client.post, self.paths["create_rental"],
+                json={"car_id": car}, headers=bearer, keep=True)
+            out = [(name, took, ok)]
+            if ok:
+                with self.app.test_request_context():
+                    path = url_for("rentals.return_rental", rid=resp.get_json()["id"])
+                out.append(self._timed("return_rental", client.put, path, headers=bearer))
+            return out
+        raise ValueError(op)
+
+    @staticmethod
+    def _timed(name, call, path, keep=False, **kwargs):
+        started = time.perf_counter()
+        resp    = call(path, **kwargs)
+        took    = time.perf_counter() - started
+        ok      = resp.status_code < 400
+        return (name, took, ok, resp) if keep else (name, took, ok)
+
+
+def run(app, layout, clients=1, duration=20.0, warmup=2.0, seed=42, mix=MIX):
+    """
+    Closed-loop run: `clients` threads pick ops from `mix` (seeded per thread)
+    until `duration` seconds have passed; the first `warmup` seconds are not
+    recorded. Returns {endpoint: [(seconds, ok), ...]} and the measured wall time.
+    """
+    workload = Workload(app, layout)
+    ops, weights = list(mix), list(mix.values())
+    samples  = {}
+    lock     = threading.Lock()
+    start    = time.perf_counter()
+    record_from = start + warmup
+    deadline    = record_from + duration
+
+    def client(n):
+        rng   = random.Random(seed * 1000 + n)
+        state = workload.client_state(n, clients)
+        mine  = []
+        with app.test_client() as c:
+            while True:
+                now = time.perf_counter()
+                if now >= deadline:
+                    break
+                for name, took, ok in workload.run_op(rng.choices(ops, weights)[0], c, state, rng):
+                    if now >= record_from:
+                        mine.append((name, took, ok))
+        with lock:
+            for name, took, ok in mine:
+                samples.setdefault(name, []).append((took, ok))
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return samples, duration
@@ -0,0 +1,114 @@
+"""Micro-benchmarks for the pagination helper, listing serialization and the rental model."""
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from flask.json.provider import DefaultJSONProvider
+
+from app.fastjson import OrjsonProvider, orjson
+from app.models import Car, Rental
+from app.utils import encode_cursor, paginate_query
+
+
+def _bench(fn, min_time=0.5, min_runs=5):
+    """Call fn repeatedly for at least min_time seconds; returns wall and CPU µs per call."""
+    fn()   # warm caches / compiled statement cache
+    runs = 0
+    started, cpu_started = time.perf_counter(), time.process_time()
+    while True:
+        fn()
+        runs   += 1
+        elapsed = time.perf_counter() - started
+        if runs >= min_runs and elapsed >= min_time:
+            cpu = time.process_time() - cpu_started
+            return elapsed / runs * 1e6, cpu / runs * 1e6, runs
+
+
+def _peak_kb(fn):
+    """Peak Python heap allocated during one call."""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def _paginate_cases(layout, per_page=20):
+    deep_page = max(layout["max_car_id"] // per_page - 1, 1)
+    deep_id   = max(layout["max_car_id"] - per_page, 0)
+    return {
+        "paginate_query_page1":       {"per_page": per_page},
+        "paginate_query_deep_offset": {"page": deep_page, "per_page": per_page},
+        "paginate_query_deep_cursor": {"after": encode_cursor([deep_id]), "per_page": per_page},
+    }
+
+
+def _listing_cases(app):
+    """
+    One 100-row page of cars and of a merchant's rentals, built and encoded
+    the old way (ORM objects, to_dict, Flask's encoder) and the current way
+    (column rows, row_to_dict, orjson when installed).
+    """
+    default = DefaultJSONProvider(app)
+    fast    = OrjsonProvider(app) if orjson is not None else None
+
+    def encode(provider, page):
+        return provider.dumps_bytes(page) if provider is fast else provider.dumps(page).encode()
+
+    def page(endpoint, query, serializer, keyset, provider):
+        def run():
+            with app.test_request_context(query_string={"per_page": 100}):
+                encode(provider, paginate_query(query(), endpoint,
+                                                serializer=serializer, keyset=keyset))
+        return run
+
+    by_merchant = Rental.merchant_id == 1
+    keyset      = (Rental.start_date, Rental.id)
+    cases = {
+        "cars_page_orm": page("cars.list_cars", lambda: Car.query,
+                              Car.to_dict, None, default),
+        "cars_page_rows": page("cars.list_cars", Car.listing_query,
+                               Car.row_to_dict, None, fast or default),
+        "rentals_page_orm": page("rentals.merchant_rentals_self",
+                                 lambda: Rental.query.filter(by_merchant),
+                                 Rental.to_dict, keyset, default),
+        "rentals_page_rows": page("rentals.merchant_rentals_self",
+                                  lambda: Rental.listing_query().filter(by_merchant),
+                                  Rental.row_to_dict, keyset, fast or default),
+    }
+    return cases
+
+
+def run(app, layout, min_time=0.5):
+    """Returns {name: {"us_per_op", "cpu_us_per_op", "ops_per_s", "runs"[, "peak_kb"]}}."""
+    results = {}
+
+    def record(name, fn, memory=False):
+        us, cpu, runs = _bench(fn, min_time)
+        results[name] = {"us_per_op": round(us, 2), "cpu_us_per_op": round(cpu, 2),
+                         "ops_per_s": round(1e6 / us, 1), "runs": runs}
+        if memory:
+            results[name]["peak_kb"] = round(_peak_kb(fn), 1)
+
+    for name, args in _paginate_cases(layout).items():
+        def page(args=args):
+            with app.test_request_context("/cars/cars", query_string=args):
+                paginate_query(Car.listing_query(), "cars.list_cars", serializer=Car.row_to_dict)
+        record(name, page)
+
+    # ORM objects + Flask encoder vs column rows + orjson, per page
+    for name, fn in _listing_cases(app).items():
+        record(name, fn, memory=True)
+
+    # transient objects: no database round trips, just the Python cost
+    car    = Car(id=1, model="Bench", plate="B-1", daily_rate=Decimal("49.90"), merchant_id=1)
+    start  = datetime(2025, 1, 1, 9, 30)
+    rental = Rental(id=1, user_id=2, merchant_id=1, car_id=1, car=car,
+                    start_date=start, end_date=start + timedelta(days=3, hours=4),
+                    fee=Decimal("199.60"))
+    with app.app_context():
+        record("rental_to_dict", rental.to_dict)
+        record("calculate_fee", rental.calculate_fee)
+    return results
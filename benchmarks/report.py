@@ -0,0 +1,87 @@
+"""Summaries, JSON result files and run-to-run comparison."""
+import json
+import platform
+import statistics
+import subprocess
+from datetime import datetime, timezone
+
+METRICS       = ("rps", "p50_ms", "p95_ms", "p99_ms")
+MICRO_METRICS = ("us_per_op", "cpu_us_per_op", "peak_kb", "ops_per_s")
+STARTUP_METRICS = ("ready_ms", "first_request_ms", "warm_request_ms")
+
+
+def summarize(samples, wall_seconds):
+    """{endpoint: [(seconds, ok), ...]} -> per-endpoint throughput and percentiles."""
+    out = {}
+    for name, rows in sorted(samples.items()):
+        times = sorted(t for t, _ in rows)
+        q = statistics.quantiles(times, n=100, method="inclusive") if len(times) > 1 else times * 99
+        out[name] = {
+            "count":   len(times),
+            "errors":  sum(1 for _, ok in rows if not ok),
+            "rps":     round(len(times) / wall_seconds, 2),
+            "mean_ms": round(statistics.fmean(times) * 1000, 3),
+            "p50_ms":  round(q[49] * 1000, 3),
+            "p95_ms":  round(q[94] * 1000, 3),
+            "p99_ms":  round(q[98] * 1000, 3),
+        }
+    return out
+
+
+def _git_rev():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save(path, kind, params, results):
+    doc = {
+        "kind":    kind,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "git":     _git_rev(),
+        "python":  platform.python_version(),
+        "params":  params,
+        "results": results,
+    }
+    with open(path, "w") as fh:
+        json.dump(doc, fh, indent=2, sort_keys=True)
+    return doc
+
+
+def print_table(results, columns):
+    width = max([len(n) for n in results] + [8])
+    print(f"{'':<{width}}" + "".join(f"{c:>12}" for c in columns))
+    for name, row in results.items():
+        print(f"{name:<{width}}" + "".join(f"{row.get(c, ''):>12}" for c in columns))
+
+
+def compare(base_path, new_path, threshold):
+    """
+    Print per-metric change from base to new; return the regressions.
+
+    Latencies, CPU time and memory regress when they grow, rps and ops/s
+    when they drop, by more than `threshold` percent.
+    """
+    with open(base_path) as fh:
+        base = json.load(fh)["results"]
+    with open(new_path) as fh:
+        new = json.load(fh)["results"]
+
+    regressions = []
+    for name in sorted(set(base) & set(new)):
+        for metric, old in base[name].items():
+            value = new[name].get(metric)
+            if not isinstance(old, (int, float)) or not isinstance(value, (int, float)) or not old:
+                continue
+            change = (value - old) / old * 100
+            higher_is_better = metric in ("rps", "ops_per_s")
+            worse = -change if higher_is_better else change
+            flag  = ""
+            if metric in METRICS + MICRO_METRICS + STARTUP_METRICS and worse > threshold:
+                flag = "  REGRESSION"
+                regressions.append((name, metric, old, value))
+            print(f"{name:<28}{metric:<12}{old:>12}{value:>12}{change:>+9.1f}%{flag}")
+    return regressions
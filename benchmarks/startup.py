@@ -0,0 +1,64 @@
+"""Cold start of the production server: time to ready, first and warm request latency."""
+import base64
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _get(url, headers):
+    started = time.perf_counter()
+    with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=30) as resp:
+        resp.read()
+    return time.perf_counter() - started
+
+
+def _once(env, port, path, headers, timeout, warm_requests):
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        # ready: the cheapest route answers (no auth, no queries)
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError(f"gunicorn exited with {proc.returncode}")
+            if time.perf_counter() - started > timeout:
+                raise RuntimeError(f"not ready after {timeout}s")
+            try:
+                _get(base + "/health/pool", {})
+                break
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.02)
+        ready = time.perf_counter() - started
+        first = _get(base + path, headers)
+        warm  = [_get(base + path, headers) for _ in range(warm_requests)]
+        return {"ready_ms": ready * 1000, "first_request_ms": first * 1000,
+                "warm_request_ms": statistics.median(warm) * 1000}
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(30)
+
+
+def run(database, path="/health/pool", auth=None, runs=3, port=5099, workers=1,
+        timeout=60.0, warm_requests=20):
+    """Start gunicorn `runs` times; returns {path: median of each figure}."""
+    env = {**os.environ, "BIND": f"127.0.0.1:{port}", "WEB_CONCURRENCY": str(workers),
+           "GUNICORN_ACCESSLOG": "", "RATE_LIMIT_BACKEND": "none"}
+    if database:
+        env["DATABASE_URL"] = database
+    headers = {}
+    if auth:
+        headers["Authorization"] = "Basic " + base64.b64encode(auth.encode()).decode()
+
+    samples = [_once(env, port, path, headers, timeout, warm_requests) for _ in range(runs)]
+    return {path: {key: round(statistics.median(s[key] for s in samples), 2)
+                   for key in samples[0]}}
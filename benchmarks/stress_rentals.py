@@ -0,0 +1,107 @@
+"""
+Concurrency stress test for rental creation.
+
+Fires many parallel bookings at a single car (and many parallel bookings by a
+single user) and checks that exactly one wins and every other request gets the
+documented 400 error, never a 500 and never a double booking.
+
+    python -m benchmarks.stress_rentals --bookings 300 --workers 64
+
+Runs in-process against DATABASE_URL, which must already be migrated. It creates
+its own merchant, cars and users and removes them afterwards.
+tests/test_rental_concurrency.py runs it against TEST_DATABASE_URL.
+"""
+import argparse
+import sys
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import url_for
+from werkzeug.security import generate_password_hash
+
+from app import create_app
+from app.auth import issue_token
+from app.extensions import db
+from app.models import Car, Rental, User
+
+
+def _book(app, path, token, car_id):
+    with app.test_client() as client:
+        resp = client.post(path, json={"car_id": car_id},
+                           headers={"Authorization": f"Bearer {token}"})
+        body = resp.get_json(silent=True) or {}
+        return resp.status_code, body.get("error")
+
+
+def _report(name, outcomes, expected_error):
+    counts = Counter(outcomes)
+    print(f"{name}: {dict(counts)}")
+    won    = counts[(201, None)]
+    lost   = counts[(400, expected_error)]
+    ok     = won == 1 and won + lost == len(outcomes)
+    if not ok:
+        print(f"  FAIL: expected one 201 and {len(outcomes) - 1} x 400 '{expected_error}'")
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--bookings", type=int, default=300, help="parallel bookings per scenario")
+    parser.add_argument("--workers",  type=int, default=64,  help="client threads")
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    tag = uuid.uuid4().hex[:8]
+    n   = args.bookings
+
+    # 1) fixtures: one merchant, n cars, n + 1 users (one shared cheap hash)
+    with app.app_context():
+        pw       = generate_password_hash("stress", method="pbkdf2:sha256:1")
+        merchant = User(username=f"stress_m_{tag}", password=pw, role="merchant")
+        users    = [User(username=f"stress_u_{tag}_{i}", password=pw, role="user") for i in range(n + 1)]
+        db.session.add(merchant)
+        db.session.add_all(users)
+        db.session.flush()
+        cars = [Car(model="Stress", plate=f"S{tag}{i}", daily_rate=10, merchant_id=merchant.id)
+                for i in range(n)]
+        db.session.add_all(cars)
+        db.session.commit()
+
+        merchant_id = merchant.id
+        user_ids = [u.id for u in users]
+        car_ids  = [c.id for c in cars]
+        tokens   = [issue_token(u) for u in users]
+        with app.test_request_context():
+            path = url_for("rentals.create_rental")
+
+    ok = True
+    try:
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            # 2) n different users race for the same car
+            outcomes = list(pool.map(lambda t: _book(app, path, t, car_ids[0]), tokens[:n]))
+            ok &= _report("one car, many users", outcomes, "car busy")
+
+            # 3) one fresh user races for the other cars
+            outcomes = list(pool.map(lambda c: _book(app, path, tokens[n], c), car_ids[1:]))
+            ok &= _report("one user, many cars", outcomes, "already have active")
+
+        with app.app_context():
+            open_for_car = Rental.query.filter_by(car_id=car_ids[0], end_date=None).count()
+            open_for_user = Rental.query.filter_by(user_id=user_ids[-1], end_date=None).count()
+            print(f"open rentals: car={open_for_car} user={open_for_user}")
+            ok &= open_for_car == 1 and open_for_user == 1
+    finally:
+        # 4) clean up everything this run created
+        with app.app_context():
+            Rental.query.filter(Rental.user_id.in_(user_ids)).delete(synchronize_session=False)
+            Car.query.filter(Car.id.in_(car_ids)).delete(synchronize_session=False)
+            User.query.filter(User.id.in_(user_ids + [merchant_id])).delete(synchronize_session=False)
+            db.session.commit()
+
+    print("OK" if ok else "FAILED")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
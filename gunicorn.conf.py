@@ -0,0 +1,56 @@
+"""
+gunicorn settings for production:
+
+    gunicorn -c gunicorn.conf.py
+
+The app is loaded and warmed once in the master (preload_app; see
+app/warmup.py), then forked. Workers default to 2 x CPUs + 1, using the CPUs
+this process may actually run on. Each worker serves GUNICORN_THREADS
+requests at a time, so keep DB_POOL_SIZE + DB_MAX_OVERFLOW at or above the
+thread count, and workers x (DB_POOL_SIZE + DB_MAX_OVERFLOW) within the
+database's max_connections.
+"""
+import os
+import time
+
+_started = time.perf_counter()
+
+# listener / dispatcher threads start per worker in post_fork, not in the master
+os.environ.setdefault("START_BACKGROUND_THREADS", "0")
+
+
+def _cpus():
+    try:
+        return len(os.sched_getaffinity(0))   # honours cpusets (containers)
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+wsgi_app     = "wsgi:app"
+bind         = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '5000')}")
+workers      = int(os.getenv("WEB_CONCURRENCY", str(2 * _cpus() + 1)))
+threads      = int(os.getenv("GUNICORN_THREADS", "4"))
+worker_class = "gthread" if threads > 1 else "sync"
+preload_app  = True
+
+timeout             = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout    = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive           = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# recycle workers now and then, staggered so they don't all restart at once
+max_requests        = int(os.getenv("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.getenv("GUNICORN_ACCESSLOG", "-") or None   # empty: no access log
+errorlog  = "-"
+
+
+def when_ready(server):
+    server.log.info("master ready in %.2fs (%d workers x %d threads)",
+                    time.perf_counter() - _started, workers, threads)
+
+
+def post_fork(server, worker):
+    from app import warmup
+    from wsgi import app   # already imported by the master (preload_app)
+
+    warmup.post_fork(app)
@@ -0,0 +1,31 @@
+"""active rental unique indexes
+
+Revision ID: 3c1f0a7d9b21
+Revises: 96ef79afbc32
+Create Date: 2025-07-20 10:12:44.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1f0a7d9b21'
+down_revision = '96ef79afbc32'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # one open rental per car / per user, enforced by the database
+    op.create_index('uq_rentals_active_car', 'rentals', ['car_id'], unique=True,
+                    postgresql_where=sa.text('end_date IS NULL'),
+                    sqlite_where=sa.text('end_date IS NULL'))
+    op.create_index('uq_rentals_active_user', 'rentals', ['user_id'], unique=True,
+                    postgresql_where=sa.text('end_date IS NULL'),
+                    sqlite_where=sa.text('end_date IS NULL'))
+
+
+def downgrade():
+    op.drop_index('uq_rentals_active_user', table_name='rentals')
+    op.drop_index('uq_rentals_active_car', table_name='rentals')
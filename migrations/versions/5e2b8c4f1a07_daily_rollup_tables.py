@@ -0,0 +1,46 @@
+"""daily rollup tables
+
+Revision ID: 5e2b8c4f1a07
+Revises: 3c1f0a7d9b21
+Create Date: 2025-07-24 16:41:05.772913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e2b8c4f1a07'
+down_revision = '3c1f0a7d9b21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('merchant_daily_stats',
+    sa.Column('merchant_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('revenue', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('rentals', sa.Integer(), nullable=False),
+    sa.Column('rented_seconds', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['merchant_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('merchant_id', 'day')
+    )
+    op.create_table('car_daily_stats',
+    sa.Column('car_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('merchant_id', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('rentals', sa.Integer(), nullable=False),
+    sa.Column('rented_seconds', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['merchant_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('car_id', 'day')
+    )
+    op.create_index('ix_car_daily_stats_merchant_day', 'car_daily_stats',
+                    ['merchant_id', 'day'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_car_daily_stats_merchant_day', table_name='car_daily_stats')
+    op.drop_table('car_daily_stats')
+    op.drop_table('merchant_daily_stats')
@@ -0,0 +1,29 @@
+"""car search indexes
+
+Revision ID: 8a4d6e0b3f52
+Revises: 5e2b8c4f1a07
+Create Date: 2025-07-28 09:03:27.140551
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4d6e0b3f52'
+down_revision = '5e2b8c4f1a07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_cars_model_trgm', 'cars', ['model'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'model': 'gin_trgm_ops'})
+    op.create_index('ix_cars_daily_rate', 'cars', ['daily_rate'], unique=False)
+    op.create_index('ix_cars_merchant_rate', 'cars', ['merchant_id', 'daily_rate'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_cars_merchant_rate', table_name='cars')
+    op.drop_index('ix_cars_daily_rate', table_name='cars')
+    op.drop_index('ix_cars_model_trgm', table_name='cars')
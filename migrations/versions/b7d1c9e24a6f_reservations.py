@@ -0,0 +1,47 @@
+"""reservations
+
+Revision ID: b7d1c9e24a6f
+Revises: 8a4d6e0b3f52
+Create Date: 2025-08-04 11:12:48.305117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d1c9e24a6f'
+down_revision = '8a4d6e0b3f52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # GiST needs btree_gist for the plain "car_id WITH =" part
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.create_table('reservations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('car_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('merchant_id', sa.Integer(), nullable=False),
+    sa.Column('start_at', sa.DateTime(), nullable=False),
+    sa.Column('end_at', sa.DateTime(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.CheckConstraint('end_at > start_at', name='ck_reservations_period'),
+    sa.ForeignKeyConstraint(['car_id'], ['cars.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['merchant_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute(
+        "ALTER TABLE reservations ADD CONSTRAINT ex_reservations_car_period "
+        "EXCLUDE USING gist (car_id WITH =, tsrange(start_at, end_at, '[)') WITH &&)"
+    )
+    op.create_index('ix_reservations_user_start', 'reservations', ['user_id', 'start_at'], unique=False)
+    op.create_index('ix_reservations_end', 'reservations', ['end_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_reservations_end', table_name='reservations')
+    op.drop_index('ix_reservations_user_start', table_name='reservations')
+    op.drop_table('reservations')
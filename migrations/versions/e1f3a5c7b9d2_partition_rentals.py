@@ -0,0 +1,164 @@
+"""partition rentals by month
+
+Revision ID: e1f3a5c7b9d2
+Revises: d4a8e2f61c93
+Create Date: 2025-08-18 14:03:12.551907
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1f3a5c7b9d2'
+down_revision = 'd4a8e2f61c93'
+branch_labels = None
+depends_on = None
+
+COLUMNS = 'id, user_id, car_id, merchant_id, start_date, end_date, fee'
+AHEAD   = 3   # months of empty partitions created past the current one
+
+
+def _add_months(month, n):
+    years, index = divmod(month.month - 1 + n, 12)
+    return datetime(month.year + years, index + 1, 1)
+
+
+def _track_active_rentals():
+    # the partial unique indexes can't exist on a partitioned table (they'd
+    # have to include start_date), so open rentals are mirrored here instead
+    op.create_table('active_rentals',
+    sa.Column('rental_id', sa.Integer(), nullable=False),
+    sa.Column('car_id', sa.Integer(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('rental_id'),
+    sa.UniqueConstraint('car_id', name='uq_rentals_active_car'),
+    sa.UniqueConstraint('user_id', name='uq_rentals_active_user')
+    )
+    op.execute("""
+        CREATE FUNCTION rentals_track_active() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.end_date IS NULL THEN
+                DELETE FROM active_rentals WHERE rental_id = OLD.id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.end_date IS NULL THEN
+                INSERT INTO active_rentals (rental_id, car_id, user_id)
+                VALUES (NEW.id, NEW.car_id, NEW.user_id);
+            END IF;
+            RETURN NULL;
+        END $$
+    """)
+    op.execute(
+        "CREATE TRIGGER trg_rentals_track_active "
+        "AFTER INSERT OR UPDATE OF end_date, car_id, user_id OR DELETE ON rentals "
+        "FOR EACH ROW EXECUTE FUNCTION rentals_track_active()"
+    )
+
+
+def upgrade():
+    op.create_table('rental_archives',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('partition_name', sa.String(length=63), nullable=False),
+    sa.Column('range_start', sa.DateTime(), nullable=False),
+    sa.Column('range_end', sa.DateTime(), nullable=False),
+    sa.Column('path', sa.String(length=1024), nullable=False),
+    sa.Column('rows', sa.BigInteger(), nullable=False),
+    sa.Column('bytes', sa.BigInteger(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('partition_name')
+    )
+    op.create_index(op.f('ix_rental_archives_range_start'), 'rental_archives', ['range_start'], unique=False)
+
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql':
+        return   # SQLite keeps the plain table and its partial unique indexes
+
+    # 1) move the old table aside; the new one takes over its sequence
+    op.execute('ALTER TABLE rentals RENAME TO rentals_unpartitioned')
+    op.execute('ALTER INDEX rentals_pkey RENAME TO rentals_unpartitioned_pkey')
+    op.drop_index('uq_rentals_active_user', table_name='rentals_unpartitioned')
+    op.drop_index('uq_rentals_active_car', table_name='rentals_unpartitioned')
+
+    op.execute("""
+        CREATE TABLE rentals (
+            id          integer      NOT NULL DEFAULT nextval('rentals_id_seq'),
+            user_id     integer      NOT NULL REFERENCES users (id),
+            car_id      integer      REFERENCES cars (id),
+            merchant_id integer      NOT NULL REFERENCES users (id),
+            start_date  timestamp    NOT NULL,
+            end_date    timestamp,
+            fee         numeric(10, 2),
+            PRIMARY KEY (id, start_date)
+        ) PARTITION BY RANGE (start_date)
+    """)
+    op.execute('ALTER SEQUENCE rentals_id_seq OWNED BY rentals.id')
+    op.execute('CREATE TABLE rentals_default PARTITION OF rentals DEFAULT')
+
+    # 2) one partition per month from the oldest rental to AHEAD months out
+    oldest = conn.execute(sa.text('SELECT min(start_date) FROM rentals_unpartitioned')).scalar()
+    now    = datetime.utcnow()
+    month  = datetime((oldest or now).year, (oldest or now).month, 1)
+    last   = _add_months(datetime(now.year, now.month, 1), AHEAD)
+    while month <= last:
+        nxt = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE rentals_p{month:%Y_%m} PARTITION OF rentals "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{nxt:%Y-%m-%d}')"
+        )
+        month = nxt
+
+    # 3) open rentals are served from these partial indexes (availability
+    # warm-up, timeline loads, create_rental's error path)
+    op.execute('CREATE INDEX ix_rentals_open_car ON rentals (car_id) WHERE end_date IS NULL')
+    op.execute('CREATE INDEX ix_rentals_open_user ON rentals (user_id) WHERE end_date IS NULL')
+
+    # 4) copy, then enforce one open rental per car / user from here on
+    op.execute(
+        f"INSERT INTO rentals ({COLUMNS}) "
+        f"SELECT id, user_id, car_id, merchant_id, COALESCE(start_date, now() AT TIME ZONE 'utc'), "
+        f"end_date, fee FROM rentals_unpartitioned"
+    )
+    _track_active_rentals()
+    op.execute(
+        "INSERT INTO active_rentals (rental_id, car_id, user_id) "
+        "SELECT id, car_id, user_id FROM rentals WHERE end_date IS NULL"
+    )
+    op.execute('DROP TABLE rentals_unpartitioned')
+    op.execute('ANALYZE rentals')
+
+
+def downgrade():
+    conn = op.get_bind()
+    if conn.dialect.name == 'postgresql':
+        # rentals already archived to Parquet are not brought back
+        op.execute('DROP TRIGGER trg_rentals_track_active ON rentals')
+        op.execute('DROP FUNCTION rentals_track_active()')
+        op.drop_table('active_rentals')
+        op.execute('ALTER TABLE rentals RENAME TO rentals_partitioned')
+        op.create_table('rentals',
+        sa.Column('id', sa.Integer(), server_default=sa.text("nextval('rentals_id_seq')"), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('car_id', sa.Integer(), nullable=True),
+        sa.Column('merchant_id', sa.Integer(), nullable=False),
+        sa.Column('start_date', sa.DateTime(), nullable=True),
+        sa.Column('end_date', sa.DateTime(), nullable=True),
+        sa.Column('fee', sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.ForeignKeyConstraint(['car_id'], ['cars.id'], ),
+        sa.ForeignKeyConstraint(['merchant_id'], ['users.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id', name='rentals_unpartitioned_pkey')
+        )
+        op.execute(f"INSERT INTO rentals ({COLUMNS}) SELECT {COLUMNS} FROM rentals_partitioned")
+        op.execute('ALTER SEQUENCE rentals_id_seq OWNED BY rentals.id')
+        op.execute('DROP TABLE rentals_partitioned')
+        op.execute('ALTER INDEX rentals_unpartitioned_pkey RENAME TO rentals_pkey')
+        op.create_index('uq_rentals_active_car', 'rentals', ['car_id'], unique=True,
+                        postgresql_where=sa.text('end_date IS NULL'))
+        op.create_index('uq_rentals_active_user', 'rentals', ['user_id'], unique=True,
+                        postgresql_where=sa.text('end_date IS NULL'))
+
+    op.drop_index(op.f('ix_rental_archives_range_start'), table_name='rental_archives')
+    op.drop_table('rental_archives')
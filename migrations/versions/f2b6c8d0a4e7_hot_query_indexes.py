@@ -0,0 +1,40 @@
+"""hot query indexes
+
+Revision ID: f2b6c8d0a4e7
+Revises: e1f3a5c7b9d2
+Create Date: 2026-10-18 10:12:45.903114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b6c8d0a4e7'
+down_revision = 'e1f3a5c7b9d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # keyset listings: WHERE merchant_id/user_id = ? ORDER BY start_date, id
+    op.create_index('ix_rentals_merchant_start', 'rentals',
+                    ['merchant_id', 'start_date', 'id'], unique=False)
+    op.create_index('ix_rentals_user_start', 'rentals',
+                    ['user_id', 'start_date', 'id'], unique=False)
+    # detaching rentals from deleted cars, and the FK check when a car is deleted
+    op.create_index('ix_rentals_car_id', 'rentals', ['car_id'], unique=False)
+    # fee recomputation and rollup rebuilds select closed rentals by end_date
+    op.create_index('ix_rentals_closed_end', 'rentals', ['end_date'], unique=False,
+                    postgresql_where=sa.text('end_date IS NOT NULL'),
+                    sqlite_where=sa.text('end_date IS NOT NULL'))
+    # GET /cars/merchants/<id>/cars pages by id within a merchant
+    op.create_index('ix_cars_merchant_id', 'cars', ['merchant_id', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_cars_merchant_id', table_name='cars')
+    op.drop_index('ix_rentals_closed_end', table_name='rentals')
+    op.drop_index('ix_rentals_car_id', table_name='rentals')
+    op.drop_index('ix_rentals_user_start', table_name='rentals')
+    op.drop_index('ix_rentals_merchant_start', table_name='rentals')
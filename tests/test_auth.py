@@ -0,0 +1,55 @@
+"""Bearer tokens (app.auth): issue, verify, revoke and key rotation."""
+import pytest
+
+pytest.importorskip("flask_sqlalchemy")
+
+from app.auth import TokenUser, issue_token, revoke_token, verify_token   # noqa: E402
+
+USER = TokenUser(7, "alice", "user")
+TTL  = 900
+
+
+def test_issued_token_verifies():
+    token = issue_token(USER, ["k1"])
+    assert verify_token(token, ["k1"], TTL) == USER
+
+
+def test_tampered_or_foreign_token_is_rejected():
+    token = issue_token(USER, ["k1"])
+    tampered = ("A" if token[0] != "A" else "B") + token[1:]
+    assert verify_token(tampered, ["k1"], TTL) is None
+    assert verify_token(token, ["other"], TTL) is None
+    assert verify_token(token, [], TTL) is None
+
+
+def test_expired_token_is_rejected():
+    token = issue_token(USER, ["k1"])
+    assert verify_token(token, ["k1"], -1) is None
+
+
+def test_revoked_token_is_rejected():
+    token, other = issue_token(USER, ["k1"]), issue_token(USER, ["k1"])
+    assert revoke_token(token, ["k1"], TTL)
+    assert verify_token(token, ["k1"], TTL) is None
+    assert verify_token(other, ["k1"], TTL) == USER   # revocation is per token (jti)
+    assert not revoke_token("garbage", ["k1"], TTL)
+
+
+def test_key_rotation_keeps_old_tokens_valid():
+    old = issue_token(USER, ["k1"])
+    new = issue_token(USER, ["k1", "k2"])   # newest last: signs with k2
+    assert verify_token(old, ["k1", "k2"], TTL) == USER
+    assert verify_token(new, ["k1", "k2"], TTL) == USER
+    assert verify_token(new, ["k1"], TTL) is None   # k2 tokens need k2
+    assert verify_token(old, ["k2"], TTL) is None   # retiring k1 retires its tokens
+
+
+def test_issue_without_keys_fails(app):
+    with app.app_context():
+        saved = app.config["AUTH_TOKEN_SECRETS"]
+        app.config["AUTH_TOKEN_SECRETS"] = []
+        try:
+            with pytest.raises(RuntimeError):
+                issue_token(USER)
+        finally:
+            app.config["AUTH_TOKEN_SECRETS"] = saved
@@ -0,0 +1,129 @@
+"""
+The availability index stays in sync with writers that bypass the ORM.
+
+Each Core writer has to report its changes with availability.record(); these
+tests fail when one doesn't.
+"""
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("flask_sqlalchemy")
+
+
+def _state(index, car_ids):
+    """(merchant, busy, open rental) per car, as the index has them."""
+    return [(index.merchant[c], index.busy[c], index.rental[c]) if c < len(index.busy)
+            else (0, 0, 0) for c in car_ids]
+
+
+def _in_sync(index, car_ids):
+    """True if the index agrees with one warmed from the database now."""
+    from app.availability import AvailabilityIndex
+
+    fresh = AvailabilityIndex()
+    fresh.warm()
+    return _state(index, car_ids) == _state(fresh, car_ids) and index.busy_set == fresh.busy_set
+
+
+def _rent(client, headers, car_id):
+    return client.post("/rentals/rentals", headers=headers, json={"car_id": car_id})
+
+
+def test_returned_car_can_be_rented_again(client, make_user, make_car, availability_index):
+    merchant, _ = make_user("merchant")
+    car_id      = make_car(merchant)
+    _, first    = make_user()
+    _, second   = make_user()
+
+    rental = _rent(client, first, car_id)
+    assert rental.status_code == 201
+    assert availability_index.open_rental(car_id) == rental.get_json()["id"]
+
+    resp = client.put(f"/rentals/{rental.get_json()['id']}/return", headers=first)
+    assert resp.status_code == 200
+    assert availability_index.open_rental(car_id) is None
+    assert car_id not in availability_index.busy_ids()
+
+    assert _rent(client, second, car_id).status_code == 201
+    assert _in_sync(availability_index, [car_id])
+
+
+def test_bulk_imported_cars_are_indexed(client, make_user, availability_index):
+    from app.models import Car
+
+    _, headers = make_user("merchant")
+    body = "".join(f'{{"model": "Golf", "plate": "BULK-{i}", "daily_rate": 40}}\n' for i in range(3))
+    resp = client.post("/cars/cars/bulk", headers=headers, data=body,
+                       content_type="application/x-ndjson")
+    assert resp.get_json()["inserted"] == 3
+    car_ids = [c.id for c in Car.query]
+    assert all(merchant for merchant, _, _ in _state(availability_index, car_ids))
+    assert _in_sync(availability_index, car_ids)
+
+
+def test_retired_cars_leave_the_index(client, make_user, make_car, availability_index):
+    from app.fleet import retire_cars
+
+    merchant, _ = make_user("merchant")
+    car_ids     = [make_car(merchant), make_car(merchant)]
+    _, user     = make_user()
+    assert _rent(client, user, car_ids[0]).status_code == 201
+
+    result = retire_cars(merchant.id, car_ids)
+    assert result["rentals_closed"] == 1
+    assert _state(availability_index, car_ids) == [(0, 0, 0), (0, 0, 0)]
+    assert _in_sync(availability_index, car_ids)
+
+
+def test_fee_recompute_leaves_the_index_alone(client, make_user, make_car, availability_index):
+    pytest.importorskip("numpy")
+    from app.extensions import db
+    from app.fees import recompute_fees
+    from app.models import Car
+
+    merchant, _ = make_user("merchant")
+    busy, freed = make_car(merchant), make_car(merchant)
+    _, renter   = make_user()
+    _, returner = make_user()
+    assert _rent(client, renter, busy).status_code == 201
+    rental = _rent(client, returner, freed).get_json()["id"]
+    assert client.put(f"/rentals/{rental}/return", headers=returner).status_code == 200
+
+    db.session.get(Car, freed).daily_rate = 99
+    db.session.commit()
+    assert recompute_fees(merchant_id=merchant.id)["changed"] == 1
+    assert availability_index.open_rental(busy) is not None
+    assert availability_index.open_rental(freed) is None
+    assert _in_sync(availability_index, [busy, freed])
+
+
+def test_partition_maintenance_leaves_the_index_alone(pg_app, tmp_path, make_user, make_car,
+                                                      availability_index):
+    pytest.importorskip("pyarrow")
+    from app.extensions import db
+    from app.models import Rental
+    from app.partitions import (add_months, archive_partition, ensure_partitions, month_start,
+                                partition_name)
+
+    merchant, _ = make_user("merchant")
+    old_car, new_car = make_car(merchant), make_car(merchant)
+    user, _ = make_user()
+    old = datetime(2001, 3, 10)
+    new = datetime(2098, 6, 1)   # no partition yet: lands in rentals_default
+    db.session.add_all([
+        Rental(user_id=user.id, car_id=old_car, merchant_id=merchant.id,
+               start_date=old, end_date=old.replace(day=12), fee=100),
+        Rental(user_id=user.id, car_id=new_car, merchant_id=merchant.id, start_date=new),
+    ])
+    db.session.commit()
+
+    # moves the open rental out of the default partition (DELETE + INSERT)
+    ensure_partitions(new, add_months(month_start(new), 1))
+    ensure_partitions(old, add_months(month_start(old), 1))
+    db.session.commit()
+    lo = month_start(old)
+    assert archive_partition(partition_name(lo), lo, add_months(lo, 1), str(tmp_path)) is not None
+
+    assert availability_index.open_rental(new_car) is not None
+    assert _in_sync(availability_index, [old_car, new_car])
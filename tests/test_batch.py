@@ -0,0 +1,37 @@
+"""POST /batch with atomic=true: all steps commit together, or none do."""
+import pytest
+
+pytest.importorskip("flask_sqlalchemy")
+
+
+def _plates():
+    from app.models import Car
+    return sorted(plate for (plate,) in Car.query.with_entities(Car.plate))
+
+
+def _create(plate):
+    return {"method": "POST", "path": "/cars/cars",
+            "body": {"model": "Golf", "plate": plate, "daily_rate": 40}}
+
+
+def test_atomic_batch_commits_every_step(client, make_user):
+    _, headers = make_user("merchant")
+    resp = client.post("/batch", headers=headers,
+                       json={"atomic": True, "requests": [_create("A-1"), _create("A-2")]})
+    assert resp.status_code == 200
+    assert resp.get_json()["committed"] is True
+    assert [r["status"] for r in resp.get_json()["responses"]] == [201, 201]
+    assert _plates() == ["A-1", "A-2"]
+
+
+def test_atomic_batch_rolls_back_every_step_on_failure(client, make_user):
+    _, headers = make_user("merchant")
+    resp = client.post("/batch", headers=headers, json={
+        "atomic": True,
+        "requests": [_create("B-1"), _create("B-2"), _create("B-1"), _create("B-3")],
+    })
+    body = resp.get_json()
+    assert resp.status_code == 200
+    assert body["committed"] is False
+    assert [r["status"] for r in body["responses"]] == [201, 201, 400, None]
+    assert _plates() == []
@@ -0,0 +1,54 @@
+"""Keyset cursors (app.utils): round trip, and tampered cursors are rejected."""
+import base64
+import json
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("flask_sqlalchemy")
+
+from app.models import Rental   # noqa: E402
+from app.utils import decode_cursor, encode_cursor   # noqa: E402
+
+KEYSET = (Rental.start_date, Rental.id)
+
+
+def _raw(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("values", [
+    [datetime(2025, 1, 31, 23, 59, 59, 999999), 1],
+    [datetime(2001, 5, 3), 2 ** 40],
+])
+def test_round_trip(values):
+    cursor = encode_cursor(values)
+    assert "=" not in cursor and "/" not in cursor and "+" not in cursor
+    assert decode_cursor(cursor, KEYSET) == values
+
+
+def test_single_column_round_trip():
+    assert decode_cursor(encode_cursor([42]), (Rental.id,)) == [42]
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    _raw({"start_date": "2025-01-01", "id": 1}),   # not a list
+    _raw(["2025-01-01T00:00:00"]),                 # too few values
+    _raw(["2025-01-01T00:00:00", 1, 2]),           # too many
+    _raw(["yesterday", 1]),                        # bad timestamp
+    _raw([20250101, 1]),                           # timestamp of the wrong type
+    _raw(["2025-01-01T00:00:00", "1 OR 1=1"]),     # id of the wrong type
+    _raw(["2025-01-01T00:00:00", True]),
+    encode_cursor([datetime(2025, 1, 1), 1])[:-3],   # truncated
+])
+def test_tampered_cursor_is_rejected(cursor):
+    assert decode_cursor(cursor, KEYSET) is None
+
+
+def test_listing_answers_400_to_a_tampered_cursor(client, make_user):
+    user, headers = make_user()
+    resp = client.get(f"/rentals/users/{user.id}/rentals",
+                      query_string={"after": _raw(["2025-01-01T00:00:00", "x"])}, headers=headers)
+    assert resp.status_code == 400
+    assert resp.get_json()["error"] == "invalid cursor"
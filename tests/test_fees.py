@@ -0,0 +1,59 @@
+"""The vectorised fee engine (app.fees) against Rental.calculate_fee."""
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("flask_sqlalchemy")
+np = pytest.importorskip("numpy")
+
+from app.fees import fee_cents, fee_sql   # noqa: E402
+from app.models import Car, Rental   # noqa: E402
+
+ONE_DAY = timedelta(days=1)
+TICK    = timedelta(microseconds=1)
+
+
+def _cases(n, seed=42):
+    """(start, end, rate_cents): random spans, plus spans right at day boundaries."""
+    rng, cases = random.Random(seed), []
+    for _ in range(n):
+        start = datetime(2000, 1, 1) + timedelta(seconds=rng.uniform(0, 30 * 365 * 86400))
+        start = start.replace(microsecond=rng.randrange(1_000_000))
+        if rng.random() < 0.5:
+            end = start + timedelta(seconds=rng.uniform(0, 60 * 86400))
+        else:
+            end = start + rng.randrange(0, 60) * ONE_DAY + rng.choice((-TICK, 0 * TICK, TICK))
+            end = max(end, start)
+        cases.append((start, end, rng.randrange(1, 1_000_000)))
+    return cases
+
+
+def _expected(start, end, rate_cents):
+    car    = Car(daily_rate=rate_cents / 100)
+    rental = Rental(start_date=start, end_date=end, car=car)
+    return round(rental.calculate_fee() * 100)
+
+
+def test_fee_cents_matches_calculate_fee():
+    cases = _cases(20_000)
+    starts, ends, rates = zip(*cases)
+    got = fee_cents(np.array(starts, dtype="datetime64[us]"),
+                    np.array(ends, dtype="datetime64[us]"),
+                    np.array(rates, dtype=np.int64))
+    mismatches = [(c, int(g)) for c, g in zip(cases, got) if int(g) != _expected(*c)]
+    assert mismatches == []
+
+
+def test_fee_sql_matches_calculate_fee(ctx):
+    import sqlalchemy as sa
+
+    from app.extensions import db
+
+    dialect = db.engine.dialect.name
+    for start, end, rate_cents in _cases(2_000, seed=7):
+        fee = db.session.execute(sa.select(fee_sql(
+            sa.literal(start, sa.DateTime), sa.literal(end, sa.DateTime),
+            sa.literal(rate_cents, sa.Integer), dialect,
+        ))).scalar()
+        assert fee == _expected(start, end, rate_cents), (start, end)
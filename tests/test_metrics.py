@@ -0,0 +1,28 @@
+"""GET /metrics: Prometheus types of the exported series."""
+import pytest
+
+pytest.importorskip("flask_sqlalchemy")
+
+
+def _types(text):
+    return dict(line.split()[2:4] for line in text.splitlines() if line.startswith("# TYPE "))
+
+
+def test_pool_counters_and_gauges(client):
+    types = _types(client.get("/metrics").get_data(as_text=True))
+    assert types["db_pool_checkouts_total"] == "counter"
+    assert types["db_pool_timeouts_total"] == "counter"
+    assert types["db_pool_checked_out"] == "gauge"
+    assert types["db_pool_size"] == "gauge"
+    assert "db_pool_checkouts" not in types
+
+
+def test_unhandled_errors_are_counted(app, client, monkeypatch):
+    def boom():
+        raise RuntimeError("boom")
+
+    monkeypatch.setitem(app.view_functions, "ops.pool_health", boom)
+    with pytest.raises(RuntimeError):
+        client.get("/health/pool")
+    text = client.get("/metrics").get_data(as_text=True)
+    assert 'http_requests_total{endpoint="ops.pool_health",method="GET",status="500"} 1' in text
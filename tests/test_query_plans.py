@@ -0,0 +1,33 @@
+"""
+The hot routes' query plans (app.plans) against a tiny benchmark dataset:
+every case must stay clear of sequential scans on the guarded tables and
+within its cost budget.
+"""
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("flask_sqlalchemy")
+
+from app import plans   # noqa: E402
+from app.cache import response_cache   # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def ids(pg_app):
+    from benchmarks.dataset import SCALES, load
+
+    with pg_app.app_context():
+        load(**SCALES["tiny"])
+        yield plans._sample_ids()
+
+
+@pytest.fixture
+def uncached(monkeypatch):
+    monkeypatch.setattr(response_cache, "backend", None)   # every case must reach its handler
+
+
+@pytest.mark.parametrize("case", plans.CASES, ids=lambda c: f"{c.method} {c.path}")
+def test_plan(pg_app, ids, uncached, case):
+    with pg_app.app_context():
+        findings, problems = plans.check_case(case, ids)
+    assert not problems, "\n".join(problems)
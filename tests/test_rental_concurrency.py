@@ -0,0 +1,15 @@
+"""
+Parallel bookings of one car, and by one user, on PostgreSQL: exactly one
+wins and the rest get the documented 400 (benchmarks.stress_rentals).
+"""
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("flask_sqlalchemy")
+
+from benchmarks import stress_rentals   # noqa: E402
+
+
+def test_parallel_bookings(pg_app):
+    # stays under DB_CONCURRENCY_LIMIT, so no booking is shed with 503
+    assert stress_rentals.main(["--bookings", "100", "--workers", "12"]) == 0
@@ -0,0 +1,6 @@
+# wsgi.py (project root): production entry point, see gunicorn.conf.py
+from app import create_app
+from app import warmup
+
+app = create_app()
+warmup.warm(app)